@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+#
+# this file is part of the SDCA project (team 11)
+#
+
+"""
+Benchmark of the Celery backend against the local one
+
+Builds the premier and matrix workloads of benchmark.py on this host
+only, with Celery workers of ``cores`` processes going through a
+local Redis server (start one with ``redis-server --save ''``), and
+with the local backend and as many processes. Prints a CSV line with
+the wall time of the master for each backend, each run being repeated
+``--runs`` times:
+
+    python bench_backends.py [-w premier,matrix] [-c 1,4] [--runs 3]
+                             > backends.csv
+"""
+
+import csv
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from argparse import ArgumentParser
+from time import time
+
+from benchmark import SRC, WORKLOADS, environment, start_workers
+
+# The columns of the CSV output
+COLUMNS = ('workload', 'backend', 'cores', 'run', 'times')
+
+def run_master(directory, target, master_args, env):
+    """Runs the master in ``directory``, returns its wall time."""
+    start = time()
+    subprocess.check_call([sys.executable, os.path.join(SRC, 'master.py'),
+                           '-B'] + master_args + [target], cwd=directory,
+                          env=env, stdout=open(os.devnull, 'w'))
+    return time() - start
+
+def measure(workload, backend, cores, args):
+    """Builds ``workload`` ``args.runs`` times with ``backend`` and
+       ``cores`` processes, returns the wall time of each run."""
+    directory = tempfile.mkdtemp(prefix='dmake-%s-' % workload)
+    env = environment(args)
+    worker = None
+    try:
+        with open(os.path.join(directory, 'master_node'), 'w') as stream:
+            stream.write('localhost\n')
+        prepare, target = WORKLOADS[workload]
+        prepare(directory, args)
+        if backend == 'celery':
+            worker = start_workers(directory, cores, env)
+            master_args = []
+        else:
+            master_args = ['--backend', 'local', '-j', str(cores)]
+        return [run_master(directory, target, master_args, env)
+                for _ in range(args.runs)]
+    finally:
+        if worker is not None:
+            worker.terminate()
+            worker.wait()
+        shutil.rmtree(directory)
+
+def main():
+    """Runs the benchmark and prints the results."""
+    parser = ArgumentParser(description='Distributed make backends')
+    parser.add_argument('-w', '--workloads', default='premier,matrix',
+                        help='the workloads, among ' + ', '.join(WORKLOADS))
+    parser.add_argument('-c', '--cores', default='1,4',
+                        help='the numbers of processes')
+    parser.add_argument('--runs', type=int, default=3,
+                        help='the number of builds of each workload')
+    parser.add_argument('--tasks', type=int, default=100,
+                        help='the number of tasks of the synthetic DAGs')
+    parser.add_argument('--duration', default='0.01',
+                        help='the duration of the synthetic tasks')
+    parser.add_argument('--premier-limit', type=int, default=2000000,
+                        help='the largest number premier looks at')
+    parser.add_argument('--matrix-blocks', type=int, default=4,
+                        help='the number of blocks per matrix side')
+    parser.add_argument('--matrix-size', type=int, default=20,
+                        help='the size of the blocks of the matrices')
+    args = parser.parse_args()
+    # Read by environment()
+    args.eager = False
+    args.local_children = False
+
+    writer = csv.writer(sys.stdout)
+    writer.writerow(COLUMNS)
+    for workload in args.workloads.split(','):
+        for cores in [int(cores) for cores in args.cores.split(',')]:
+            for backend in ('celery', 'local'):
+                for run, wall_time in enumerate(measure(workload, backend,
+                                                        cores, args)):
+                    writer.writerow([workload, backend, cores, run,
+                                     wall_time])
+                    sys.stdout.flush()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+#
+# this file is part of the SDCA project (team 11)
+#
+
+"""
+Benchmark of the cycle detection on large generated DAGs
+
+Compares the depth first search of makeparse with the previous check,
+which only looked for cycles of one or two targets with list lookups.
+Each DAG has ``targets`` targets depending on ``fanout`` random older
+targets. Prints a CSV with the times, in seconds:
+
+    python bench_cycles.py [fanout] > cycles.csv
+"""
+
+import os
+import random
+import sys
+from time import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from makeparse import Parser
+
+# The sizes of the DAGs, in number of targets
+SIZES = (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6)
+
+def build_dag(targets, fanout, seed=0):
+    """Returns a parser holding a random DAG of ``targets`` targets."""
+    generator = random.Random(seed)
+    parser = Parser()
+    tasks = [parser._get_task_from_target('t%d' % index)
+             for index in range(targets)]
+    for index in range(1, targets):
+        for _ in range(fanout):
+            tasks[index].dependencies.append(tasks[generator.randrange(index)])
+    return parser
+
+def legacy_check(parser):
+    """The previous check, on every task."""
+    for task in parser._target_to_task.values():
+        if task.dependencies and (task in task.dependencies or any(
+                task in dep.dependencies for dep in task.dependencies)):
+            return True
+    return False
+
+def measure(check, parser):
+    """Returns the time ``check`` takes on ``parser``."""
+    start = time()
+    check(parser)
+    return time() - start
+
+def main(fanout):
+    """Prints the times of both checks on DAGs of every size."""
+    print 'targets,edges,legacy,dfs'
+    for targets in SIZES:
+        parser = build_dag(targets, fanout)
+        print '%d,%d,%f,%f' % (targets, (targets - 1) * fanout,
+                               measure(legacy_check, parser),
+                               measure(Parser._find_cycle, parser))
+        sys.stdout.flush()
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 8)
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+#
+# this file is part of the SDCA project (team 11)
+#
+
+"""
+Benchmark of the memory and pickling cost of the task graphs
+
+Builds layered DAGs of ``targets`` targets depending on ``fanout``
+random targets of the previous layer, as the previous tasks (with a
+``__dict__``), as the current tasks (with ``__slots__``) and as a
+build plan (compressed sparse rows). Prints a CSV with the memory
+taken by each graph, in kilobytes, the time to build it and the time
+to serialize and read it back (pickle for the tasks, as Celery sends
+them, ``dumps`` and ``loads`` for the plan), in seconds:
+
+    python bench_graph.py [fanout] > graph.csv
+"""
+
+import cPickle as pickle
+import os
+import random
+import resource
+import sys
+import threading
+from time import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from makeparse import Task
+from plan import BuildPlan
+
+# The sizes of the DAGs, in number of targets
+SIZES = (10 ** 4, 10 ** 5, 5 * 10 ** 5)
+
+# The number of layers of the DAGs
+LAYERS = 50
+
+# The stack of the thread pickling the tasks, in bytes
+STACK_SIZE = 1024 ** 3
+
+class LegacyTask(object):
+    """The previous task, with a __dict__."""
+    def __init__(self, node_id):
+        self.target = None
+        self.dependencies = []
+        self.command = None
+        self.children = []
+        self.priority = 0
+        self.duration = None
+        self.inputs = []
+        self._node_id = node_id
+
+def layered_dag(targets, fanout, seed=0):
+    """Returns the indexes of the dependencies of each target."""
+    generator = random.Random(seed)
+    width = max(targets // LAYERS, 1)
+    dependencies = []
+    for index in range(targets):
+        start = (index // width - 1) * width
+        if start < 0:
+            dependencies.append([])
+        else:
+            dependencies.append(sorted(set(
+                generator.randrange(start, start + width)
+                for _ in range(fanout))))
+    return dependencies
+
+def build_tasks(task_class, dependencies):
+    """Returns the tasks of ``task_class`` of the DAG."""
+    tasks = []
+    for index, deps in enumerate(dependencies):
+        task = task_class(index)
+        task.target = intern('t%d' % index)
+        task.command = 'touch t%d' % index
+        task.dependencies = [tasks[dep] for dep in deps]
+        for dep in task.dependencies:
+            dep.children.append(task)
+        tasks.append(task)
+    return tasks
+
+def build_plan(dependencies):
+    """Returns the build plan of the DAG."""
+    return BuildPlan([intern('t%d' % index)
+                      for index in range(len(dependencies))],
+                     ['touch t%d' % index
+                      for index in range(len(dependencies))],
+                     dependencies)
+
+def round_trip(graph):
+    """Serializes ``graph`` and reads it back."""
+    if isinstance(graph, BuildPlan):
+        BuildPlan.loads(graph.dumps())
+        return
+    # Pickle follows the dependencies and the children of each task
+    # recursively, give it a deep enough stack
+    sys.setrecursionlimit(10 ** 7)
+    threading.stack_size(STACK_SIZE)
+    thread = threading.Thread(target=lambda: pickle.loads(
+        pickle.dumps(graph, 2)))
+    thread.start()
+    thread.join()
+
+def measure(build, dependencies):
+    """Returns the memory, build time and round trip time of the graph
+       built by ``build``, measured in a child process so that the
+       memory of a graph is not reused by the next one."""
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_end)
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time()
+        graph = build(dependencies)
+        built = time()
+        memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+        round_trip(graph)
+        os.write(write_end, '%d,%f,%f' % (memory, built - start,
+                                          time() - built))
+        os._exit(0)
+    os.close(write_end)
+    result = os.read(read_end, 1024)
+    os.close(read_end)
+    os.waitpid(pid, 0)
+    return result
+
+def main(fanout):
+    """Prints the costs of the three graphs for every size."""
+    print ('targets,edges,legacy_kb,legacy_build,legacy_pickle,'
+           'slots_kb,slots_build,slots_pickle,plan_kb,plan_build,plan_dumps')
+    for targets in SIZES:
+        dependencies = layered_dag(targets, fanout)
+        edges = sum(len(deps) for deps in dependencies)
+        print '%d,%d,%s,%s,%s' % (
+            targets, edges,
+            measure(lambda deps: build_tasks(LegacyTask, deps), dependencies),
+            measure(lambda deps: build_tasks(Task, deps), dependencies),
+            measure(build_plan, dependencies))
+        sys.stdout.flush()
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2)
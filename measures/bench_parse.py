@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+#
+# this file is part of the SDCA project (team 11)
+#
+
+"""
+Benchmark of the Makefile parser on synthetic Makefiles
+
+Compares the streaming parser of makeparse with the previous one,
+which read the whole Makefile with ``readlines()`` and logged every
+line at INFO level. Prints a CSV with the parsing times, in seconds:
+
+    python bench_parse.py [targets ...] > parse.csv
+"""
+
+import logging
+import os
+import sys
+import tempfile
+from time import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from makeparse import Parser, LOGGER
+
+# The sizes of the Makefiles, in number of targets
+DEFAULT_SIZES = (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6)
+
+def write_makefile(stream, targets):
+    """Writes a Makefile of ``targets`` targets to ``stream``: an
+       aggregation target, and targets depending on the two previous
+       ones and on a source file."""
+    stream.write('all: %s\n\tcat %s > all\n\n'
+                 % ('t%d' % (targets - 1), 't%d' % (targets - 1)))
+    for index in range(1, targets):
+        deps = ' '.join('t%d' % dep for dep in (index - 1, index - 2)
+                        if dep > 0)
+        stream.write('# target %d\nt%d: src%d.c %s\n\tcc src%d.c -o t%d\n\n'
+                     % (index, index, index, deps, index, index))
+
+def legacy_parse(parser, input_file):
+    """The parsing loop of the previous parser."""
+    parser._root_task.dependencies = []
+    parser._target_to_task = {'[ROOT]' : parser._root_task}
+    parser._targets = set()
+    LOGGER.info('Reading Makefile')
+    makefile_lines = input_file.readlines()
+    makefile_lines = [line for line in makefile_lines
+                      if not (line == '\n' or line.startswith('#'))]
+    index = 0
+    while index < len(makefile_lines):
+        current_line = makefile_lines[index]
+        LOGGER.info('Analyzing %s', current_line)
+        current_recipe = current_line.split(':')
+        current_target = current_recipe[0].strip()
+        LOGGER.info('Adding target %s to the known targets', current_target)
+        parser._targets.add(current_target)
+        LOGGER.info('Creating task for target %s', current_target)
+        current_task = parser._get_task_from_target(current_target)
+        if index == 0:
+            parser._root_task.dependencies.append(current_task)
+        for dependency in current_recipe[1].strip().split():
+            LOGGER.info('Creating dependency task %s', dependency)
+            dependency_task = parser._get_task_from_target(dependency)
+            LOGGER.info('Adding dependency %s for target %s',
+                        dependency, current_target)
+            current_task.dependencies.append(dependency_task)
+        index += 1
+        if index >= len(makefile_lines):
+            break
+        cmd = makefile_lines[index]
+        if cmd.startswith('\t'):
+            cmd = cmd.lstrip('\t').rstrip('\n')
+            LOGGER.info('Adding command %s for target %s',
+                        cmd, current_target)
+            current_task.command = cmd
+            index += 1
+    LOGGER.info('Checking for cyclic targets')
+    for task in parser._target_to_task.values():
+        if task.dependencies and (task in task.dependencies or any(
+                task in dep.dependencies for dep in task.dependencies)):
+            raise ValueError('Cyclic target ' + task.target)
+
+def streaming_parse(parser, input_file):
+    """The parsing of the current parser."""
+    parser.parse_makefile(input_file)
+
+def measure(parse, path):
+    """Returns the time ``parse`` takes to parse the Makefile ``path``."""
+    with open(path) as input_file:
+        parser = Parser()
+        start = time()
+        parse(parser, input_file)
+        return time() - start
+
+def main(sizes):
+    """Prints the parsing times of the Makefiles of ``sizes`` targets."""
+    # As in production, INFO messages are not displayed
+    logging.basicConfig(level=logging.WARNING)
+    print 'targets,legacy,streaming'
+    for targets in sizes:
+        handle, path = tempfile.mkstemp(suffix='.mk')
+        try:
+            with os.fdopen(handle, 'w') as stream:
+                write_makefile(stream, targets)
+            print '%d,%f,%f' % (targets, measure(legacy_parse, path),
+                                measure(streaming_parse, path))
+            sys.stdout.flush()
+        finally:
+            os.remove(path)
+
+if __name__ == '__main__':
+    main([int(size) for size in sys.argv[1:]] or DEFAULT_SIZES)
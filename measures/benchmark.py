@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+#
+# this file is part of the SDCA project (team 11)
+#
+
+"""
+Scaling benchmark of distributed make
+
+Builds each workload with 1, 2, ... local Celery workers, against a
+local Redis server used both as the broker and as the database (start
+one with ``redis-server --save ''``), or in eager mode where the master
+runs every task itself, one after the other. The eager mode still
+needs the Redis server, for the counters, the leases and the traces.
+For each run it prints a CSV line with the makespan, the speedup and
+the efficiency relative to the smallest number of workers, the mean
+scheduling overhead per task and the bytes of inputs read locally and
+remotely, taken from the traces of the build. The ``cores`` and
+``times`` columns are the ones plot.R reads.
+
+    python benchmark.py [-w premier,matrix,wide] [-c 1,2,4] [--eager]
+                        [-l] [-o results.json] > results.csv
+
+The workloads are the premier and matrix test Makefiles, scaled down,
+and synthetic DAGs of ``--tasks`` tasks of ``--duration`` seconds:
+wide (independent tasks), deep (a chain), diamond (one task, many
+tasks depending on it, one task depending on them) and random. With
+``-l`` the workers run the ready child on the critical path of their
+tasks themselves (``DMAKE_LOCAL_CHILDREN``), compare the runs with and
+without it on chains such as premier -> list*.txt -> list.txt.
+"""
+
+import csv
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+from argparse import ArgumentParser, FileType
+from time import sleep
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(HERE, '..', 'src')
+MAKEFILES = os.path.join(HERE, '..', 'test', 'makefiles')
+
+sys.path.append(SRC)
+
+from buildkeys import BuildKeys
+from redis import Redis
+from tracing import Tracer, input_locality, scheduling_overhead
+
+# The Redis database used as broker
+BROKER_URL = 'redis://localhost/3'
+
+# The columns of the CSV output
+COLUMNS = ('workload', 'local_children', 'cores', 'times', 'speedup',
+           'efficiency', 'tasks', 'queue_wait', 'counter_wait', 'dispatch',
+           'local_bytes', 'remote_bytes')
+
+def prepare_premier(directory, args):
+    """Copies the premier Makefile, with a lower limit."""
+    shutil.copy(os.path.join(MAKEFILES, 'premier', 'premier.c'), directory)
+    with open(os.path.join(MAKEFILES, 'premier', 'Makefile')) as stream:
+        makefile = stream.read()
+    with open(os.path.join(directory, 'Makefile'), 'w') as stream:
+        stream.write(makefile.replace('200000000', str(args.premier_limit)))
+
+def prepare_matrix(directory, args):
+    """Generates the matrix Makefile and its two input matrices."""
+    matrix = os.path.join(MAKEFILES, 'matrix')
+    size = str(args.matrix_size * args.matrix_blocks)
+    with open(os.path.join(directory, 'Makefile'), 'w') as stream:
+        subprocess.check_call(['perl', os.path.join(matrix,
+                                                    'generate_makefile.pl'),
+                               str(args.matrix_blocks)], stdout=stream)
+    for name in ('a', 'b'):
+        with open(os.path.join(directory, name), 'w') as stream:
+            subprocess.check_call(['perl', os.path.join(matrix,
+                                                        'random_matrix.pl'),
+                                   size, size], stdout=stream)
+
+def synthetic_dag(shape, tasks, seed=0):
+    """Returns the dependencies of each task of a synthetic DAG, the
+       first task being the final one."""
+    if shape == 'wide':
+        return [range(1, tasks)] + [[] for _ in range(1, tasks)]
+    if shape == 'deep':
+        return [[index + 1] for index in range(tasks - 1)] + [[]]
+    if shape == 'diamond':
+        return [range(1, tasks - 1)] + [[tasks - 1]
+                                        for _ in range(1, tasks - 1)] + [[]]
+    generator = random.Random(seed)
+    dependencies = [[] for _ in range(tasks)]
+    for index in range(1, tasks - 1):
+        for _ in range(generator.randint(1, 3)):
+            dependencies[index].append(generator.randrange(index + 1, tasks))
+    # The final task depends on the tasks nothing depends on
+    needed = set(dep for deps in dependencies for dep in deps)
+    dependencies[0] = [index for index in range(1, tasks)
+                       if index not in needed]
+    return [sorted(set(deps)) for deps in dependencies]
+
+def prepare_synthetic(shape):
+    """Returns the function writing the Makefile of a synthetic DAG."""
+    def prepare(directory, args):
+        """Writes a Makefile of ``args.tasks`` tasks shaped as ``shape``,
+           each one sleeping ``args.duration`` seconds."""
+        with open(os.path.join(directory, 'Makefile'), 'w') as stream:
+            for index, deps in enumerate(synthetic_dag(shape, args.tasks)):
+                stream.write('t%d: %s\n\tsleep %s ; touch t%d\n\n'
+                             % (index, ' '.join('t%d' % dep for dep in deps),
+                                args.duration, index))
+    return prepare
+
+# The function preparing each workload, and the target to build
+WORKLOADS = {
+    'premier': (prepare_premier, 'list.txt'),
+    'matrix': (prepare_matrix, 'c'),
+    'wide': (prepare_synthetic('wide'), 't0'),
+    'deep': (prepare_synthetic('deep'), 't0'),
+    'diamond': (prepare_synthetic('diamond'), 't0'),
+    'random': (prepare_synthetic('random'), 't0'),
+}
+
+def environment(args):
+    """Returns the environment of the master and the workers."""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([SRC, env.get('PYTHONPATH', '')])
+    env['PATH'] = os.pathsep.join([os.path.join(MAKEFILES, 'matrix'),
+                                   env['PATH']])
+    env['DMAKE_BROKER_URL'] = BROKER_URL
+    if args.eager:
+        env['DMAKE_EAGER'] = '1'
+    if args.local_children:
+        env['DMAKE_LOCAL_CHILDREN'] = '1'
+    return env
+
+def start_workers(directory, cores, env):
+    """Starts a Celery worker of ``cores`` processes in ``directory``
+       and waits until it answers."""
+    worker = subprocess.Popen([sys.executable, '-m', 'celery', 'worker',
+                               '-A', 'work', '-c', str(cores), '-l',
+                               'warning', '--without-gossip',
+                               '--without-mingle'],
+                              cwd=directory, env=env)
+    for _ in range(60):
+        if subprocess.call([sys.executable, '-m', 'celery', '-A', 'work',
+                            'status'], cwd=directory, env=env,
+                           stdout=open(os.devnull, 'w'),
+                           stderr=subprocess.STDOUT) == 0:
+            return worker
+        sleep(1)
+    worker.terminate()
+    raise RuntimeError('The workers did not start')
+
+def run_build(directory, target, master_args, env):
+    """Runs the master in ``directory``, returns the build id."""
+    output = subprocess.check_output([sys.executable,
+                                      os.path.join(SRC, 'master.py'), '-B']
+                                     + master_args + [target],
+                                     cwd=directory, env=env)
+    for line in output.splitlines():
+        if line.startswith('Build '):
+            return line.split()[1]
+    raise RuntimeError('No build id in the output of the master')
+
+def measure(workload, cores, args):
+    """Builds ``workload`` with ``cores`` worker processes, returns its
+       makespan, number of tasks, scheduling overhead and bytes of
+       inputs read locally and remotely."""
+    directory = tempfile.mkdtemp(prefix='dmake-%s-' % workload)
+    env = environment(args)
+    worker = None
+    try:
+        with open(os.path.join(directory, 'master_node'), 'w') as stream:
+            stream.write('localhost\n')
+        prepare, target = WORKLOADS[workload]
+        prepare(directory, args)
+        if not args.eager:
+            worker = start_workers(directory, cores, env)
+        keys = BuildKeys(run_build(directory, target, args.master_args, env))
+    finally:
+        if worker is not None:
+            worker.terminate()
+            worker.wait()
+        shutil.rmtree(directory)
+    red = Redis()
+    makespan = float(red.get(keys.end_time)) - float(red.get(keys.start_time))
+    records = Tracer(red, 0).load(keys)
+    locality = input_locality(records)
+    return makespan, len(records), dict(scheduling_overhead(records),
+                                        local_bytes=locality['local'],
+                                        remote_bytes=locality['remote'])
+
+def main():
+    """Runs the benchmark and prints the results."""
+    parser = ArgumentParser(description='Distributed make benchmark')
+    parser.add_argument('-w', '--workloads', default='premier,matrix,wide,'
+                        'deep,diamond,random',
+                        help='the workloads, among ' + ', '.join(WORKLOADS))
+    parser.add_argument('-c', '--cores', default='1,2,4',
+                        help='the numbers of worker processes')
+    parser.add_argument('--eager', action='store_true',
+                        help='run the tasks in the master, no workers (the '
+                        'Redis server is still needed)')
+    parser.add_argument('-l', '--local-children', action='store_true',
+                        help='let the workers run a ready child themselves')
+    parser.add_argument('--tasks', type=int, default=100,
+                        help='the number of tasks of the synthetic DAGs')
+    parser.add_argument('--duration', default='0.01',
+                        help='the duration of the synthetic tasks')
+    parser.add_argument('--premier-limit', type=int, default=2000000,
+                        help='the largest number premier looks at')
+    parser.add_argument('--matrix-blocks', type=int, default=4,
+                        help='the number of blocks per matrix side')
+    parser.add_argument('--matrix-size', type=int, default=20,
+                        help='the size of the blocks of the matrices')
+    parser.add_argument('--master-args', default='',
+                        help='extra options of master.py, e.g. "-c"')
+    parser.add_argument('-o', '--output', type=FileType('w'),
+                        help='also write the results as JSON')
+    args = parser.parse_args()
+    args.master_args = args.master_args.split()
+    cores_list = [1] if args.eager else \
+                 [int(cores) for cores in args.cores.split(',')]
+
+    writer = csv.writer(sys.stdout)
+    writer.writerow(COLUMNS)
+    results = []
+    for workload in args.workloads.split(','):
+        reference = None
+        for cores in cores_list:
+            makespan, tasks, overhead = measure(workload, cores, args)
+            if reference is None:
+                reference = makespan
+            speedup = reference / makespan
+            result = dict(overhead, workload=workload, cores=cores,
+                          local_children=int(args.local_children),
+                          times=makespan, speedup=speedup,
+                          efficiency=speedup * cores_list[0] / cores,
+                          tasks=tasks)
+            results.append(result)
+            writer.writerow([result[column] for column in COLUMNS])
+            sys.stdout.flush()
+    if args.output:
+        json.dump(results, args.output, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+#
+# this file is part of the SDCA project (team 11)
+#
+
+"""
+This module names the Redis keys of a build
+
+Every key of a build is prefixed by its id, so that several builds can
+share the same Redis server. The keys expire after ``BUILD_TTL``
+seconds instead of being flushed by the next build.
+"""
+
+from uuid import uuid4
+
+# The time the keys of a build are kept, in seconds
+BUILD_TTL = 7 * 24 * 3600
+
+# The id of the last build started, for result.py
+LAST_BUILD = "last_build"
+
+def new_build_id():
+    """Returns a new, unique, build id."""
+    return uuid4().hex
+
+class BuildKeys(object):
+    """
+    The names of the keys of a build.
+
+    Attributes:
+       build_id(str): the id of the build.
+       start_time(str): the start time of the build.
+       end_time(str): the end time of the build.
+       task_num(str): the number of tasks left.
+       end_list(str): the list the master waits on.
+       plan(str): the build plan.
+       traces(str): the records of the tasks run.
+       phases(str): the durations of the phases of the master.
+       outputs(str): the host and size of each target built.
+       queued(str): the number of tasks waiting in each host queue.
+       events(str): the channel of the events of the build.
+       stopped(str): set when the build is stopped.
+       leases(str): the leases of the tasks running.
+       running(str): when each task started.
+       committed(str): the copy of each target which won.
+       routed(str): the host queue each task was sent to, until it
+       starts.
+    """
+    def __init__(self, build_id):
+        self.build_id = build_id
+        prefix = "build:" + build_id + ":"
+        self.start_time = prefix + "start_time"
+        self.end_time = prefix + "end_time"
+        self.task_num = prefix + "task_num"
+        self.end_list = prefix + "endlist"
+        self.plan = prefix + "plan"
+        self.traces = prefix + "traces"
+        self.phases = prefix + "phases"
+        self.outputs = prefix + "outputs"
+        self.queued = prefix + "queued"
+        self.events = prefix + "events"
+        self.stopped = prefix + "stopped"
+        self.leases = prefix + "leases"
+        self.running = prefix + "running"
+        self.committed = prefix + "committed"
+        self.routed = prefix + "routed"
+        self._sem_prefix = prefix + "sem:"
+
+    def sem(self, target):
+        """Returns the name of the dependency counter of ``target``."""
+        return self._sem_prefix + target
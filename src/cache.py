@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+#
+# this file is part of the SDCA project (team 11)
+#
+
+"""
+This module contains a content addressed cache of the built targets
+
+The key of a target is the hash of its command, of the content of its
+inputs and of some environment variables: two targets with the same
+key produce the same file, whatever the build or the branch. The files
+are stored in a directory, the least recently used ones are evicted
+when the directory grows over its maximum size. Each worker keeps a
+running total of the size of the directory, which may be on NFS: it is
+only walked when the total goes over the maximum size, and every
+RESIZE_STORES files stored to count the files of the other workers.
+"""
+
+import os
+from hashlib import sha1
+from shutil import copyfile, copymode
+from uptodate import file_hash
+
+# The number of files stored before the size of the directory is read
+# again, the other workers store files too
+RESIZE_STORES = 100
+
+class ResultCache(object):
+    """
+    A directory of built targets indexed by their key.
+
+    Attributes:
+       directory(str): the directory storing the files.
+       max_size(int): the maximum size of the directory, in bytes.
+       environment(tuple(str)): the environment variables that are
+       part of the keys.
+       hits(int): the number of targets found in the cache.
+       misses(int): the number of targets not found in the cache.
+       _size(int): the size of the directory, as far as this process
+       knows, None until it is read.
+       _stores(int): the number of files stored since it was read.
+    """
+    def __init__(self, directory, max_size, environment=()):
+        self.directory = directory
+        self.max_size = max_size
+        self.environment = environment
+        self.hits = 0
+        self.misses = 0
+        self._size = None
+        self._stores = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def key(self, command, inputs):
+        """Returns the key of a target built by ``command`` from the
+           files ``inputs``."""
+        digest = sha1()
+        digest.update(command)
+        for path in sorted(inputs):
+            digest.update('\0%s\0%s' % (path, file_hash(path)))
+        for name in self.environment:
+            digest.update('\0%s=%s' % (name, os.environ.get(name, '')))
+        return digest.hexdigest()
+
+    def fetch(self, key, target):
+        """Copies the file cached under ``key`` to ``target``. Returns
+           True on a hit, False on a miss."""
+        path = self._path(key)
+        try:
+            # The modification time of a file is the time of its last use
+            os.utime(path, None)
+            _atomic_copy(path, target)
+        except (OSError, IOError):
+            # Never cached, or evicted by another worker
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def store(self, key, target):
+        """Caches the file ``target`` under ``key``, if it exists."""
+        if not os.path.isfile(target):
+            return
+        path = self._path(key)
+        if not os.path.isdir(os.path.dirname(path)):
+            try:
+                os.makedirs(os.path.dirname(path))
+            except OSError:
+                # Created by another worker in the meantime
+                pass
+        stored = os.path.isfile(path)
+        _atomic_copy(target, path)
+        self._stores += 1
+        if self._size is None or self._stores >= RESIZE_STORES:
+            self.evict()
+            return
+        if not stored:
+            self._size += os.path.getsize(path)
+        if self._size > self.max_size:
+            self.evict()
+
+    def size(self):
+        """Returns the size of the cached files, in bytes."""
+        return sum(os.path.getsize(path) for path in self._files())
+
+    def evict(self):
+        """Removes the least recently used files until the cache fits
+           in ``max_size``, and counts the size of the directory
+           again."""
+        files = []
+        total = 0
+        for path in self._files():
+            stat = os.stat(path)
+            files.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        files.sort()
+        for _, size, path in files:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # Evicted by another worker
+                pass
+            total -= size
+        self._size = total
+        self._stores = 0
+
+    def _path(self, key):
+        """Returns the path of the file cached under ``key``."""
+        return os.path.join(self.directory, key[:2], key)
+
+    def _files(self):
+        """Yields the paths of the cached files."""
+        for directory, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith('.tmp'):
+                    yield os.path.join(directory, name)
+
+def _atomic_copy(source, destination):
+    """Copies ``source`` to ``destination``, readers of
+       ``destination`` never see a partial file."""
+    temporary = '%s.%d.tmp' % (destination, os.getpid())
+    copyfile(source, temporary)
+    copymode(source, temporary)
+    os.rename(temporary, destination)
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+#
+# this file is part of the SDCA project (team 11)
+#
+
+"""
+The backend running the tasks on Celery workers
+
+The tasks are sent through the broker to the workers of every node,
+which share the dependency counters, the leases and the traces of the
+build in Redis. The master follows the build through the events the
+workers publish, sends again the tasks lost with their worker and a
+copy of the tasks lagging behind.
+"""
+
+from buildkeys import BuildKeys, BUILD_TTL, LAST_BUILD, new_build_id
+from celeryconfig import LEASE_HEARTBEAT, LEASE_RETRIES, LEASE_TIME, \
+                         SPECULATION_FACTOR, SPECULATION_MIN
+from events import BuildEvents, BuildMonitor, DONE, FAILED
+from leases import expired_leases, parse_lease, NO_OWNER
+from plan import BuildPlan
+from speculation import is_waiting, rewrite_command, stragglers
+from tracing import Tracer
+from work import send_tasks, send_plan_tasks, resend_task, \
+                 resend_plan_task, RED, HISTORY, DURATIONS, LEASES, \
+                 SPECULATION
+from time import time
+import json
+
+def _reclaim(events, keys, resend):
+    """
+    Sends again the tasks whose lease expired, their worker being lost,
+    with ``resend(target, attempt)``, and fails the ones which were
+    sent too many times. The tasks waiting in a queue are not lost.
+    """
+    for target, lease in expired_leases(LEASES.load(keys), time()):
+        attempt = LEASES.reclaim(keys, target, lease, LEASE_RETRIES + 1)
+        _, _, owner = parse_lease(lease)
+        if attempt > 0:
+            print "*** '%s' lost on %s, sent again" % (target, owner)
+            resend(target, attempt)
+        elif attempt < 0:
+            events.failed(keys, target, owner, None,
+                          "lost %d times" % (LEASE_RETRIES + 1))
+
+def _requeue(keys, nodes, resend):
+    """
+    Sends again to the shared queue, with ``resend(target, 1)``, the
+    ready tasks waiting in the queue of a host whose workers were not
+    seen for a lease time
+    """
+    routed = LEASES.load_routed(keys)
+    if not routed:
+        return
+    seen = LEASES.hosts()
+    now = time()
+    for target, host in sorted(routed.items()):
+        if now - seen.get(host, 0.0) <= LEASE_TIME or target not in nodes:
+            continue
+        if LEASES.requeue(keys, target, [dep.target for dep
+                                         in nodes[target].dependencies]):
+            print "*** '%s' lost in the queue of %s, sent again" \
+                  % (target, host)
+            resend(target, 1)
+
+def _speculate(keys, monitor, nodes, durations, copied, resend):
+    """
+    Sends a backup copy of the tasks lagging behind their ``durations``
+    at the last build with ``resend(target, 0, True)`` if no task waits
+    in the queues, once per task: ``copied`` holds the targets already
+    copied. A target never built is not copied.
+    """
+    running = dict((target, parse_lease(lease)[2])
+                   for target, lease in LEASES.load(keys).items())
+    running = set(target for target, owner in running.items()
+                  if owner != NO_OWNER)
+    # The ready tasks are all running, some workers are idle: the
+    # tasks left which are not ready wait for the running ones
+    if not running or is_waiting(nodes, monitor.finished,
+                                 running.union(monitor.failed)):
+        return
+    started = SPECULATION.running(keys)
+    started = dict((target, started[target]) for target in running
+                   if target in started and target not in copied
+                   and nodes[target].command is not None
+                   and rewrite_command(nodes[target].command, target,
+                                       target) is not None)
+    for target in stragglers(started, durations, time(),
+                             SPECULATION_FACTOR, SPECULATION_MIN):
+        print "*** '%s' lagging behind, backup copy sent" % target
+        copied.add(target)
+        resend(target, 0, True)
+
+def _wait(events, keys, pubsub, monitor, nodes, durations, resend):
+    """
+    Prints the progress of the build from its events until it is over,
+    stops it on the first failure unless ``monitor`` keeps going, sends
+    again the tasks lost with their worker and a copy of the tasks
+    lagging behind their ``durations`` at the last build with
+    ``resend``
+    """
+    checked = time()
+    copied = set()
+    while not monitor.is_over():
+        if time() - checked > LEASE_HEARTBEAT:
+            _reclaim(events, keys, resend)
+            _requeue(keys, nodes, resend)
+            if SPECULATION_FACTOR is not None:
+                _speculate(keys, monitor, nodes, durations, copied,
+                           resend)
+            checked = time()
+        message = pubsub.get_message(timeout=1.0)
+        if message is None:
+            # Nothing for a while, make sure no event was missed
+            left = RED.get(keys.task_num)
+            if left is not None:
+                monitor.handle({'type': DONE, 'left': int(left)})
+            continue
+        event = json.loads(message['data'])
+        if event['type'] == DONE:
+            for target in event['targets']:
+                print "[%d/%d] '%s' done" % (monitor.total - event['left'],
+                                             monitor.total, target)
+        elif event['type'] == FAILED:
+            print "*** '%s' failed on %s: %s" % (event['target'],
+                                                 event['worker'],
+                                                 event['error'])
+            if not monitor.keep_going:
+                events.stop(keys)
+        monitor.handle(event)
+    pubsub.close()
+    if monitor.skipped:
+        print "%d targets not built because of the errors." \
+              % len(monitor.skipped)
+
+class CeleryBackend(object):
+    """
+    Runs the tasks of a build on the Celery workers.
+
+    Attributes:
+       history(Redis): what is learnt from one build for the next ones.
+       build_id(str): the id of the build.
+       _args(Namespace): the options of the master.
+       _keys(BuildKeys): the keys of the build.
+       _tracer(Tracer): records the phases of the master.
+    """
+    def __init__(self, args):
+        self.history = HISTORY
+        self._args = args
+        # Every key of the build is prefixed by its id, so that builds
+        # running at the same time do not share anything
+        self.build_id = new_build_id()
+        self._keys = BuildKeys(self.build_id)
+        print "Build %s" % self.build_id
+        RED.set(LAST_BUILD, self.build_id)
+
+        # Initialize the start_time and the end_time (for the measures)
+        RED.set(self._keys.start_time, time(), ex=BUILD_TTL)
+        RED.set(self._keys.end_time, time(), ex=BUILD_TTL)
+        self._tracer = Tracer(RED, BUILD_TTL)
+
+    def phase(self, phase, since):
+        """Records the duration of a ``phase`` of the master, which
+           began at ``since``, and returns the current time."""
+        now = time()
+        self._tracer.record_phase(self._keys, phase, now - since)
+        return now
+
+    def durations(self):
+        """Returns the duration of each target at its last build."""
+        return dict((target, float(duration)) for target, duration
+                    in HISTORY.hgetall(DURATIONS).items())
+
+    def run(self, dep_tree, leaves, mark):
+        """Sends the ``leaves`` of ``dep_tree``, the others are sent by
+           the workers, and waits for the end of the build unless the
+           master is asynchronous. Returns the exit status."""
+        args = self._args
+        build_id = self.build_id
+        keys = self._keys
+        RED.set(keys.task_num, dep_tree.nodes_num, ex=BUILD_TTL)
+        nodes = dict((node.target, node) for node in dep_tree.nodes)
+        # Subscribe before the first task is sent, not to miss any event
+        events = BuildEvents(RED, BUILD_TTL)
+        if not args.async:
+            pubsub = events.subscribe(keys)
+        if args.compact:
+            # Publish the tree once, the workers fetch it on their
+            # first task and only get indexes in the messages
+            plan = BuildPlan.from_tree(dep_tree)
+            RED.set(keys.plan, plan.dumps(), ex=BUILD_TTL)
+            index_of = dict((node, index)
+                            for index, node in enumerate(dep_tree.nodes))
+            send_plan_tasks(build_id, plan,
+                            [index_of[leaf] for leaf in leaves])
+            resend = lambda target, attempt, backup=False: resend_plan_task(
+                build_id, plan, index_of[nodes[target]], attempt, backup)
+        else:
+            send_tasks(build_id, leaves)
+            resend = lambda target, attempt, backup=False: resend_task(
+                build_id, nodes[target], attempt, backup)
+        mark = self.phase('dispatch', mark)
+        if args.async:
+            return 0
+        # Wait for the last task to be done or the first one to fail
+        monitor = BuildMonitor(dict((node.target,
+                                     [child.target
+                                      for child in node.children])
+                                    for node in dep_tree.nodes),
+                               dep_tree.nodes_num, args.keep_going)
+        # Not the expected durations of the nodes, a target never built
+        # lasts the mean of the others there
+        durations = {} if SPECULATION_FACTOR is None else self.durations()
+        _wait(events, keys, pubsub, monitor, nodes, durations, resend)
+        self.phase('wait', mark)
+        return monitor.exit_status()
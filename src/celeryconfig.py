@@ -6,11 +6,88 @@ This file is used by this package to configure both the master
 and the slave processes
 """
 
+import os
+from kombu import Queue
+
 with open("master_node", 'r') as stream:
     MASTER_NODE = stream.read().strip()
 
-# Broker
-BROKER_URL = "amqp://" + MASTER_NODE
+# Broker, ``DMAKE_BROKER_URL`` replaces RabbitMQ (for instance by
+# "redis://localhost/3" for the benchmarks in measures)
+BROKER_URL = os.environ.get("DMAKE_BROKER_URL", "amqp://" + MASTER_NODE)
+
+# Run the tasks in the process sending them, without broker nor
+# workers, if ``DMAKE_EAGER`` is 1
+CELERY_ALWAYS_EAGER = os.environ.get("DMAKE_EAGER") == "1"
+CELERY_EAGER_PROPAGATES_EXCEPTIONS = True
 
 # Backend
 CELERY_RESULT_BACKEND = "redis://" + MASTER_NODE + "/1"
+
+# Priority queue, the tasks on the critical path of the build are
+# sent with the highest priorities (see schedule.py)
+CELERY_DEFAULT_QUEUE = "dmake"
+CELERY_QUEUES = (
+    Queue("dmake", routing_key="dmake",
+          queue_arguments={"x-max-priority": 10}),
+)
+# Do not let a worker reserve the low priority tasks in advance: with
+# the messages acknowledged once their task is done, each process only
+# holds the task it runs, otherwise it takes the next one as soon as it
+# starts. A task whose worker dies is then delivered again by the
+# broker, the dependency counters and the leases (see leases.py) keep
+# it from running twice.
+CELERYD_PREFETCH_MULTIPLIER = 1
+CELERY_ACKS_LATE = True
+
+# Send each task to the queue of the host which built most of its
+# inputs (see locality.py), unless LOCALITY_MAX_QUEUED tasks already
+# wait in it, in which case the task goes to the shared queue
+LOCALITY = True
+LOCALITY_MAX_QUEUED = 4
+
+# The tasks which lasted BATCH_MAX_DURATION seconds or less at their
+# last build are sent together, up to BATCH_SIZE tasks and BATCH_TIME
+# seconds per message (see schedule.py), BATCH_SIZE = 1 disables it
+BATCH_MAX_DURATION = 0.05
+BATCH_SIZE = 32
+BATCH_TIME = 0.5
+
+# A worker keeps the child on the critical path of each task it runs
+# and runs it right away if it is ready, instead of sending it through
+# the broker, if ``DMAKE_LOCAL_CHILDREN`` is 1
+LOCAL_CHILDREN = os.environ.get("DMAKE_LOCAL_CHILDREN") == "1"
+
+# A worker holds a lease of LEASE_TIME seconds on each task it runs,
+# renewed every LEASE_HEARTBEAT seconds (see leases.py). The master
+# sends a task whose lease expired again, LEASE_RETRIES times at most
+LEASE_TIME = 60
+LEASE_HEARTBEAT = 10
+LEASE_RETRIES = 2
+
+# A command is killed if it runs more than TIMEOUT_FACTOR times the
+# duration of its target at the last build, and at least TIMEOUT_MIN
+# seconds, None for no time limit. A target never built has no limit
+TIMEOUT_FACTOR = None
+TIMEOUT_MIN = 60
+
+# Near the end of a build, when no task waits in the queues, the
+# master sends a backup copy of the tasks running for more than
+# SPECULATION_FACTOR times their duration at the last build, and at
+# least SPECULATION_MIN seconds (see speculation.py), None to disable
+SPECULATION_FACTOR = None
+SPECULATION_MIN = 30
+
+# The pools of tokens of this host, e.g. {"license": 2}, the tasks
+# declare what they need in the file given to ``master.py --resources``
+# (see resources.py). A task whose resources are not free on the host
+# it reaches is sent again after RESOURCES_RETRY seconds
+WORKER_TOKENS = {}
+RESOURCES_RETRY = 2
+
+# Result cache shared by the workers (see cache.py), None to disable
+CACHE_DIR = None
+# Maximum size of the result cache, in bytes
+CACHE_SIZE = 10 * 1024 ** 3
+# Environment variables the targets depend on
+CACHE_ENVIRONMENT = ("PATH", "LANG")
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+#
+# this file is part of the SDCA project (team 11)
+#
+
+"""
+This module contains the counters shared by the slave nodes
+
+Every update is a Lua script run by Redis itself, so it is atomic and
+costs a single round trip: no lock is needed around the counters.
+"""
+
+import json
+
+# KEYS[1]: set when the build is stopped
+# KEYS[2...]: the counters of the tasks
+# ARGV[1]: the time to live of the counters, in seconds
+# ARGV[2...]: the number of dependencies of each task
+#
+# The counter of a task is created the first time one of its
+# dependencies is done, and decremented each time. Returns the number
+# of dependencies left of each task: 0 means the caller was the last
+# one. Returns nothing once the build is stopped, no task is ready.
+DEPENDENCIES_DONE = """
+local left = {}
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return left
+end
+for i = 2, #KEYS do
+    if redis.call('EXISTS', KEYS[i]) == 0 then
+        redis.call('SET', KEYS[i], ARGV[i], 'EX', ARGV[1])
+    end
+    left[i - 1] = redis.call('DECR', KEYS[i])
+end
+return left
+"""
+
+# KEYS[1]: the number of tasks left in the build
+# KEYS[2]: the end time of the build
+# KEYS[3]: the list the master is waiting on
+# ARGV[1]: the current time
+# ARGV[2]: the time to live of the keys, in seconds
+# ARGV[3]: the number of tasks done
+# ARGV[4]: the targets of the tasks done, as a JSON list
+# ARGV[5]: the channel of the events of the build
+#
+# Publishes a done event (see events.py). Returns the number of tasks
+# left: 0 means the build just ended, and the master was signaled.
+TASK_DONE = """
+local left = redis.call('DECRBY', KEYS[1], ARGV[3])
+redis.call('PUBLISH', ARGV[5], '{"type":"done","left":' .. left ..
+           ',"targets":' .. ARGV[4] .. '}')
+if left == 0 then
+    redis.call('SET', KEYS[2], ARGV[1], 'EX', ARGV[2])
+    redis.call('RPUSH', KEYS[3], 0)
+    redis.call('EXPIRE', KEYS[3], ARGV[2])
+end
+return left
+"""
+
+class Counters(object):
+    """
+    Dependency and build counters stored in Redis.
+
+    Attributes:
+       ttl(int): the time to live of the keys, in seconds.
+       _dependencies_done(Script): the script decrementing task
+       counters.
+       _task_done(Script): the script decrementing the build counter.
+    """
+    def __init__(self, red, ttl):
+        self.ttl = ttl
+        self._dependencies_done = red.register_script(DEPENDENCIES_DONE)
+        self._task_done = red.register_script(TASK_DONE)
+
+    def dependencies_done(self, stopped, sem_names, dependencies_nums):
+        """Decrements the counters ``sem_names`` of tasks with
+           ``dependencies_nums`` dependencies, in a single round trip.
+           Returns, for each task, True if its last dependency is
+           done, False otherwise or if ``stopped`` is set."""
+        left = self._dependencies_done(keys=[stopped] + list(sem_names),
+                                       args=[self.ttl] +
+                                       [num or 1 for num
+                                        in dependencies_nums])
+        if not left:
+            return [False] * len(sem_names)
+        return [num == 0 for num in left]
+
+    def task_done(self, task_num, end_time, end_list, now, targets,
+                  channel):
+        """Decrements the number of tasks left ``task_num`` by the
+           number of ``targets`` done, and announces them on
+           ``channel``. When the last one is done, sets ``end_time`` to
+           ``now`` and pushes on ``end_list``. Returns True if the build
+           ended, False otherwise."""
+        return self._task_done(keys=[task_num, end_time, end_list],
+                               args=[now, self.ttl, len(targets),
+                                     json.dumps(targets), channel]) == 0
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+#
+# this file is part of the SDCA project (team 11)
+#
+
+"""
+This module stores the edges of a graph in compressed sparse rows
+
+The neighbours of all the nodes are kept one after the other in a
+single array of integers, and a second array holds where the
+neighbours of each node start. Instead of a Python list per node and
+an object per edge, a graph costs a few bytes per edge and per node,
+and is serialized as two flat lists.
+"""
+
+from array import array
+
+# The type code of the arrays, signed longs
+TYPECODE = 'l'
+
+class Adjacency(object):
+    """
+    The neighbours of each node of a graph, nodes being numbered from
+    0, as compressed sparse rows. ``adjacency[node]`` is an array of
+    the neighbours of ``node``.
+
+    Attributes:
+       offsets(array): where the neighbours of each node start in
+       ``edges``, followed by the number of edges.
+       edges(array): the neighbours of all the nodes.
+    """
+    __slots__ = ('offsets', 'edges')
+
+    def __init__(self, offsets, edges):
+        self.offsets = array(TYPECODE, offsets)
+        self.edges = array(TYPECODE, edges)
+
+    @classmethod
+    def from_lists(cls, lists):
+        """Builds the adjacency of the neighbours ``lists`` of each
+           node."""
+        offsets = array(TYPECODE, [0])
+        edges = array(TYPECODE)
+        for neighbours in lists:
+            edges.extend(neighbours)
+            offsets.append(len(edges))
+        return cls(offsets, edges)
+
+    def transposed(self):
+        """Returns the adjacency of the reversed edges, in O(V+E)."""
+        nodes = len(self)
+        counts = [0] * (nodes + 1)
+        for neighbour in self.edges:
+            counts[neighbour + 1] += 1
+        for node in xrange(nodes):
+            counts[node + 1] += counts[node]
+        edges = [0] * len(self.edges)
+        position = counts[:-1]
+        for node in xrange(nodes):
+            for edge in xrange(self.offsets[node], self.offsets[node + 1]):
+                neighbour = self.edges[edge]
+                edges[position[neighbour]] = node
+                position[neighbour] += 1
+        return Adjacency(counts, edges)
+
+    def isolated(self):
+        """Returns the nodes without neighbours."""
+        offsets = self.offsets
+        return [node for node in xrange(len(self))
+                if offsets[node] == offsets[node + 1]]
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, node):
+        if not 0 <= node < len(self):
+            raise IndexError('No node ' + str(node))
+        return self.edges[self.offsets[node]:self.offsets[node + 1]]
+
+    def __iter__(self):
+        for node in xrange(len(self)):
+            yield self.edges[self.offsets[node]:self.offsets[node + 1]]
+
+    def __eq__(self, other):
+        return isinstance(other, Adjacency) \
+               and self.offsets == other.offsets and self.edges == other.edges
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def dumps(self):
+        """Returns the adjacency as a dict of two lists, for JSON."""
+        return {'offsets': self.offsets.tolist(),
+                'edges': self.edges.tolist()}
+
+    @classmethod
+    def loads(cls, table):
+        """Builds an adjacency from the output of ``dumps``."""
+        return cls(table['offsets'], table['edges'])
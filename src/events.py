@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+#
+# this file is part of the SDCA project (team 11)
+#
+
+"""
+This module tells the master what happens to the tasks of a build
+
+The workers publish an event on the Redis channel of the build each
+time tasks are done (see counters.py) or one fails. The master
+subscribes to it before sending the first task, prints the progress
+of the build as the events arrive and returns as soon as the last
+task is done, or the first one failed. The events are JSON objects:
+
+    {"type": "done", "targets": [...], "left": tasks left}
+    {"type": "failed", "target": ..., "worker": ..., "exit_code": ...,
+     "error": ...}
+
+When the build is stopped, the workers do not run the tasks they
+receive any more (see counters.py). Otherwise, like ``make -k``, the
+build goes on until every task not depending on a failed one is done.
+"""
+
+import json
+
+DONE = "done"
+FAILED = "failed"
+
+class BuildEvents(object):
+    """
+    Publishes and receives the events of the builds.
+
+    Attributes:
+       ttl(int): the time to live of the keys, in seconds.
+       _red(Redis): the database the events go through.
+    """
+    def __init__(self, red, ttl):
+        self.ttl = ttl
+        self._red = red
+
+    def failed(self, keys, target, worker, exit_code, error):
+        """Announces that ``target`` failed on ``worker``."""
+        self._red.publish(keys.events, json.dumps({
+            'type': FAILED, 'target': target, 'worker': worker,
+            'exit_code': exit_code, 'error': error}))
+
+    def stop(self, keys):
+        """Stops the build: the tasks not started yet are not run."""
+        self._red.set(keys.stopped, 1, ex=self.ttl)
+
+    def subscribe(self, keys):
+        """Returns a subscription to the events of the build."""
+        pubsub = self._red.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(keys.events)
+        return pubsub
+
+class BuildMonitor(object):
+    """
+    Follows the progress of a build from its events.
+
+    Attributes:
+       total(int): the number of tasks of the build.
+       done(int): the number of tasks done.
+       finished(set(str)): the targets done, as far as the events
+       received tell.
+       failed(dict(str, str)): the error of each failed target.
+       skipped(set(str)): the targets depending on a failed one.
+       keep_going(bool): whether the build goes on after a failure.
+       _children(dict(str, list(str))): the targets depending on each
+       target.
+    """
+    def __init__(self, children, total, keep_going):
+        self.total = total
+        self.done = 0
+        self.finished = set()
+        self.failed = {}
+        self.skipped = set()
+        self.keep_going = keep_going
+        self._children = children
+
+    def handle(self, event):
+        """Updates the progress with ``event``. Returns True if the
+           build is over, False otherwise."""
+        if event['type'] == DONE:
+            # The events may arrive in any order
+            self.done = max(self.done, self.total - event['left'])
+            self.finished.update(event.get('targets', ()))
+        elif event['type'] == FAILED:
+            self.failed[event['target']] = event['error']
+            self._skip(event['target'])
+        return self.is_over()
+
+    def _skip(self, target):
+        """Skips every target depending on ``target``."""
+        stack = list(self._children.get(target, ()))
+        while stack:
+            child = stack.pop()
+            if child not in self.skipped:
+                self.skipped.add(child)
+                stack.extend(self._children.get(child, ()))
+
+    def left(self):
+        """Returns the number of tasks still to run or running."""
+        return self.total - self.done - len(self.failed) - len(self.skipped)
+
+    def is_over(self):
+        """Returns True if no task of the build is left to run."""
+        if self.failed and not self.keep_going:
+            return True
+        return self.left() <= 0
+
+    def exit_status(self):
+        """Returns the exit status of the master, 2 like make if a task
+           failed."""
+        return 2 if self.failed else 0
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+#
+# this file is part of the SDCA project (team 11)
+#
+
+"""
+This module runs the commands of the tasks on the slave nodes
+
+Most commands are a program and its arguments: they are run directly,
+without a shell. The commands that need one (pipes, redirections,
+variables, globs...) are sent to a shell started once per worker
+process, which forks a subshell for each of them instead of starting
+a new ``/bin/sh``. The output of the commands is kept in bounded
+buffers and returned with their exit code and duration. The commands
+run in their own process group, so that a command running for too
+long can be killed with the processes it started.
+"""
+
+import os
+import shlex
+import signal
+from subprocess import Popen, PIPE, STDOUT
+from time import time
+from uuid import uuid4
+
+# The characters only a shell can interpret
+SHELL_CHARS = frozenset('|&;<>()$`*?[]{}~\n')
+
+# The builtins of the shell, they are not programs
+SHELL_BUILTINS = frozenset(['cd', 'export', 'set', 'unset', 'source', '.',
+                            'exit', 'exec', 'eval', 'alias', 'umask',
+                            'ulimit', 'test', '[', 'true', 'false', 'echo',
+                            'printf', 'read', 'wait', 'trap', 'shift', ':',
+                            'command', 'type', 'hash'])
+
+# Size of the output buffer of each command, in bytes
+BUFFER_SIZE = 64 * 1024
+
+def split_command(command):
+    """Returns the arguments of ``command``, None if it needs a
+       shell."""
+    if any(char in SHELL_CHARS for char in command):
+        return None
+    try:
+        argv = shlex.split(command)
+    except ValueError:
+        # Unbalanced quotes, let the shell report it
+        return None
+    if not argv or '=' in argv[0] or argv[0] in SHELL_BUILTINS \
+       or any(arg.startswith('#') for arg in argv):
+        return None
+    return argv
+
+class OutputBuffer(object):
+    """
+    Keeps the last bytes written to it.
+
+    Attributes:
+       size(int): the number of bytes written.
+       _max_size(int): the number of bytes kept.
+       _chunks(list(str)): the bytes kept.
+       _kept(int): the number of bytes in ``_chunks``.
+    """
+    def __init__(self, max_size=BUFFER_SIZE):
+        self.size = 0
+        self._max_size = max_size
+        self._chunks = []
+        self._kept = 0
+
+    def write(self, data):
+        """Appends ``data`` to the buffer."""
+        self.size += len(data)
+        # Only the end of a chunk larger than the buffer is kept
+        data = data[-self._max_size:]
+        self._chunks.append(data)
+        self._kept += len(data)
+        while self._kept - len(self._chunks[0]) >= self._max_size:
+            self._kept -= len(self._chunks.pop(0))
+
+    def getvalue(self):
+        """Returns the last ``_max_size`` bytes written."""
+        return ''.join(self._chunks)[-self._max_size:]
+
+class CommandResult(object):
+    """
+    The outcome of a command.
+
+    Attributes:
+       command(str): the command.
+       exit_code(int): its exit code.
+       duration(float): the time it took, in seconds.
+       output(str): the end of its output (stdout and stderr).
+       output_size(int): the size of its whole output, in bytes.
+       shell(bool): True if it was run by the shell.
+    """
+    def __init__(self, command, exit_code, duration, output, output_size,
+                 shell):
+        self.command = command
+        self.exit_code = exit_code
+        self.duration = duration
+        self.output = output
+        self.output_size = output_size
+        self.shell = shell
+
+    def as_dict(self):
+        """Returns the result as a dict, to be sent back by Celery."""
+        return {'command': self.command,
+                'exit_code': self.exit_code,
+                'duration': self.duration,
+                'output': self.output,
+                'output_size': self.output_size,
+                'shell': self.shell}
+
+class Shell(object):
+    """
+    A ``/bin/sh`` process running commands read on its stdin.
+
+    Every command runs in a subshell, so that ``cd`` or variables do
+    not leak from one command to the next, and is followed by a marker
+    line holding its exit code.
+
+    Attributes:
+       _process(Popen): the shell process.
+       _marker(str): the beginning of the marker lines.
+    """
+    def __init__(self):
+        self._process = None
+        self._marker = '__dmake_%s__' % uuid4().hex
+
+    def run(self, command, output):
+        """Runs ``command``, writes its output in ``output`` and
+           returns its exit code."""
+        if self._process is None or self._process.poll() is not None:
+            self._process = Popen(['/bin/sh'], bufsize=-1, stdin=PIPE,
+                                  stdout=PIPE, stderr=STDOUT, close_fds=True,
+                                  preexec_fn=os.setsid)
+        self._process.stdin.write("(\n%s\n) </dev/null 2>&1\n"
+                                  "printf '\\n%s %%d\\n' $?\n"
+                                  % (command, self._marker))
+        self._process.stdin.flush()
+        # The marker is preceded by a newline which is not part of the
+        # output of the command
+        pending = ''
+        for line in iter(self._process.stdout.readline, ''):
+            if line.startswith(self._marker):
+                output.write(pending[:-1])
+                return int(line.split()[1])
+            output.write(pending)
+            pending = line
+        # The shell died, the next command will start a new one
+        output.write(pending)
+        self._process = None
+        return 127
+
+    def kill(self):
+        """Kills the shell and the command it runs, the next command
+           starts a new shell."""
+        _kill(self._process)
+
+    def close(self):
+        """Stops the shell."""
+        if self._process is not None and self._process.poll() is None:
+            self._process.stdin.close()
+            self._process.wait()
+        self._process = None
+
+class Executor(object):
+    """
+    Runs commands, with a shell only when they need one.
+
+    Attributes:
+       buffer_size(int): the number of bytes of output kept for each
+       command.
+       _shell(Shell): the shell of this executor.
+       _process(Popen): the program running without the shell, None if
+       there is none.
+    """
+    def __init__(self, buffer_size=BUFFER_SIZE):
+        self.buffer_size = buffer_size
+        self._shell = Shell()
+        self._process = None
+
+    def run(self, command):
+        """Runs ``command`` and returns its CommandResult."""
+        output = OutputBuffer(self.buffer_size)
+        argv = split_command(command)
+        start = time()
+        if argv is None:
+            exit_code = self._shell.run(command, output)
+        else:
+            exit_code = self._spawn(argv, output)
+        return CommandResult(command, exit_code, time() - start,
+                             output.getvalue(), output.size, argv is None)
+
+    def _spawn(self, argv, output):
+        """Runs the program ``argv``, writes its output in ``output``
+           and returns its exit code."""
+        try:
+            self._process = Popen(argv, stdout=PIPE, stderr=STDOUT,
+                                  close_fds=True, preexec_fn=os.setsid)
+        except OSError as error:
+            output.write('%s: %s\n' % (argv[0], error.strerror))
+            return 127
+        try:
+            for chunk in iter(lambda: self._process.stdout.read(4096), ''):
+                output.write(chunk)
+            return self._process.wait()
+        finally:
+            self._process = None
+
+    def kill(self):
+        """Kills the command running, from another thread."""
+        process = self._process
+        if process is not None:
+            _kill(process)
+        else:
+            self._shell.kill()
+
+    def close(self):
+        """Stops the shell of this executor."""
+        self._shell.close()
+
+def _kill(process):
+    """Kills ``process`` and its process group, if it runs."""
+    if process is None or process.poll() is not None:
+        return
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except OSError:
+        # It just ended
+        pass
+
+# The executor of the current process, a forked process gets its own
+_EXECUTORS = {}
+
+def get_executor():
+    """Returns the executor of the current process."""
+    pid = os.getpid()
+    if pid not in _EXECUTORS:
+        _EXECUTORS.clear()
+        _EXECUTORS[pid] = Executor()
+    return _EXECUTORS[pid]
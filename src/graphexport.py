@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+#
+# this file is part of the SDCA project (team 11)
+#
+
+"""
+This module exports the dependency graph of a Makefile
+
+The graph is written to a file object one node or one edge at a time,
+as DOT, as a JSON adjacency list or as GraphML, so that the output of
+a large graph is never held in memory. The nodes can be colored by
+what happened to them in a build and by their duration at their last
+run, to find the bottlenecks of the scheduling:
+
+    python graphexport.py [-f Makefile] [--format dot|json|graphml]
+                          [--color] [-b build_id] [-o graph.dot]
+"""
+
+import json
+import sys
+from argparse import ArgumentParser, FileType
+from makeparse import Parser
+from xml.sax.saxutils import escape
+
+# The color of the nodes of each state
+STATE_COLORS = {
+    'built': 'green',
+    'cached': 'blue',
+    'failed': 'red',
+    'not run': 'grey',
+}
+
+class GraphStyle(object):
+    """
+    What the nodes of an exported graph are colored by.
+
+    Attributes:
+       states(dict(str, str)): the state of each target in a build,
+       among the keys of ``STATE_COLORS``.
+       durations(dict(str, float)): the duration of each target at its
+       last run, in seconds.
+       _longest(float): the longest of the durations.
+    """
+    def __init__(self, states=None, durations=None):
+        self.states = states or {}
+        self.durations = durations or {}
+        self._longest = max(self.durations.values() or [0.0])
+
+    def state(self, target):
+        """Returns the state of ``target``, 'not run' if unknown."""
+        return self.states.get(target, 'not run')
+
+    def color(self, target):
+        """Returns the color of ``target``, from its state."""
+        return STATE_COLORS[self.state(target)]
+
+    def fill(self, target):
+        """Returns the fill color of ``target`` as a DOT HSV color:
+           the longer its duration the more saturated the red."""
+        if not self._longest:
+            return '0.000 0.000 1.000'
+        return '0.000 %.3f 1.000' % (self.durations.get(target, 0.0)
+                                     / self._longest)
+
+def _dot_label(target):
+    """Returns ``target`` quoted for DOT."""
+    return '"%s"' % target.replace('\\', '\\\\').replace('"', '\\"')
+
+def write_dot(tasks, stream, style=None):
+    """Writes the graph of ``tasks``, a list of all the tasks of a
+       Makefile, to ``stream`` for dot. Without a ``style`` every node
+       is green."""
+    stream.write('digraph G {\n')
+    for task in tasks:
+        if style is None:
+            stream.write('%s[label=%s color="green"];\n'
+                         % (task.get_dot_node(), _dot_label(task.target)))
+        else:
+            stream.write('%s[label=%s color="%s" style="filled" '
+                         'fillcolor="%s"];\n'
+                         % (task.get_dot_node(), _dot_label(task.target),
+                            style.color(task.target),
+                            style.fill(task.target)))
+    for task in tasks:
+        for dep in task.dependencies:
+            stream.write('%s -> %s;\n' % (dep.get_dot_node(),
+                                          task.get_dot_node()))
+    stream.write('}')
+
+def write_json(tasks, stream, style=None):
+    """Writes the graph of ``tasks`` to ``stream`` as a JSON adjacency
+       list: a list of nodes with their id, target and dependency ids,
+       and with their state and duration if there is a ``style``."""
+    stream.write('{"nodes": [')
+    separator = '\n'
+    for task in tasks:
+        node = {'id': task.get_dot_node(), 'target': task.target,
+                'dependencies': [dep.get_dot_node()
+                                 for dep in task.dependencies]}
+        if style is not None:
+            node['state'] = style.state(task.target)
+            node['duration'] = style.durations.get(task.target)
+        stream.write(separator)
+        stream.write(json.dumps(node, sort_keys=True))
+        separator = ',\n'
+    stream.write('\n]}')
+
+def write_graphml(tasks, stream, style=None):
+    """Writes the graph of ``tasks`` to ``stream`` as GraphML, with the
+       state and the duration of the nodes if there is a ``style``."""
+    stream.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                 '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+                 '<key id="target" for="node" attr.name="target" '
+                 'attr.type="string"/>\n'
+                 '<key id="state" for="node" attr.name="state" '
+                 'attr.type="string"/>\n'
+                 '<key id="duration" for="node" attr.name="duration" '
+                 'attr.type="double"/>\n'
+                 '<graph id="G" edgedefault="directed">\n')
+    for task in tasks:
+        stream.write('<node id="%s"><data key="target">%s</data>'
+                     % (task.get_dot_node(), escape(task.target)))
+        if style is not None:
+            stream.write('<data key="state">%s</data>'
+                         % style.state(task.target))
+            if task.target in style.durations:
+                stream.write('<data key="duration">%f</data>'
+                             % style.durations[task.target])
+        stream.write('</node>\n')
+    for task in tasks:
+        for dep in task.dependencies:
+            stream.write('<edge source="%s" target="%s"/>\n'
+                         % (dep.get_dot_node(), task.get_dot_node()))
+    stream.write('</graph>\n</graphml>\n')
+
+# The writer of each format
+WRITERS = {
+    'dot': write_dot,
+    'json': write_json,
+    'graphml': write_graphml,
+}
+
+def build_states(records):
+    """Returns the state of each target from the ``records`` of a
+       build (see tracing.py)."""
+    states = {}
+    for record in records:
+        if record['exit_code'] or record['finished'] is None:
+            states[record['target']] = 'failed'
+        elif record['cached']:
+            states[record['target']] = 'cached'
+        else:
+            states[record['target']] = 'built'
+    return states
+
+def main():
+    """Exports the dependency graph of a Makefile."""
+    parser = ArgumentParser(description='Distributed make graph export')
+    parser.add_argument('-f', '--file', dest='makefile', default='Makefile',
+                        type=FileType('r'), help='the Makefile to export')
+    parser.add_argument('--format', choices=sorted(WRITERS), default='dot',
+                        help='the format of the graph')
+    parser.add_argument('--color', action='store_true',
+                        help='color the nodes by state and duration')
+    parser.add_argument('-b', '--build',
+                        help='the build whose states are used '
+                        '(default: last)')
+    parser.add_argument('-o', '--output', type=FileType('w'),
+                        default=sys.stdout, help='the file to write')
+    args = parser.parse_args()
+
+    makefile_parser = Parser()
+    makefile_parser.parse_makefile(args.makefile)
+    style = None
+    if args.color:
+        # Imported here, reading the configuration needs a master_node
+        # file, which the plain export does not
+        from buildkeys import BuildKeys, BUILD_TTL, LAST_BUILD
+        from tracing import Tracer
+        from work import RED, HISTORY, DURATIONS
+        keys = BuildKeys(args.build or RED.get(LAST_BUILD))
+        durations = dict((target, float(duration)) for target, duration
+                         in HISTORY.hgetall(DURATIONS).items())
+        style = GraphStyle(build_states(Tracer(RED, BUILD_TTL).load(keys)),
+                           durations)
+    WRITERS[args.format](makefile_parser.get_tasks(), args.output, style)
+
+if __name__ == '__main__':
+    main()
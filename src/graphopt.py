@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+#
+# this file is part of the SDCA project (team 11)
+#
+
+"""
+This module simplifies the dependency graph before it is sent
+
+Every task of the tree costs a message, round trips to Redis and a
+fan-out of its children, even the targets without recipe which only
+group other targets (like the ``partN`` of the recursive blender
+Makefiles). They are removed and their dependencies wired straight to
+the targets depending on them, only the target asked for is kept even
+without recipe.
+
+The transitive reduction also drops the dependencies implied by
+another one: if ``a`` depends on ``b`` and ``c`` and ``b`` already
+depends on ``c``, ``a`` only waits for ``b``. The inputs of the tasks
+are not changed, only the order in which they are run.
+"""
+
+def is_recipeless(task):
+    """Returns True if ``task`` is a rule grouping its dependencies,
+       without command."""
+    return bool(task.dependencies) and not task.command
+
+def collapse_recipeless(root):
+    """
+    Replaces, in the tasks reached from ``root``, every dependency
+    without recipe by its own dependencies, recursively
+
+    Returns the number of tasks and of edges removed from the graph.
+    """
+    # The dependencies of each target without recipe, once collapsed
+    expanded = {}
+    edges_before = 0
+    edges_after = 0
+    visited = set([root])
+    stack = [root]
+    while stack:
+        task = stack.pop()
+        edges_before += len(task.dependencies)
+        dependencies = []
+        seen = set()
+        for dep in task.dependencies:
+            if is_recipeless(dep):
+                replacement = _expand(dep, expanded)
+            else:
+                replacement = [dep]
+            for real_dep in replacement:
+                if real_dep in seen:
+                    continue
+                seen.add(real_dep)
+                dependencies.append(real_dep)
+                if real_dep not in visited:
+                    visited.add(real_dep)
+                    stack.append(real_dep)
+        task.dependencies = dependencies
+        edges_after += len(dependencies)
+    collapsed = [task for task in expanded if task not in visited]
+    edges_before += sum(len(task.dependencies) for task in collapsed)
+    return len(collapsed), edges_before - edges_after
+
+def _expand(group, expanded):
+    """Returns the dependencies of ``group``, a target without recipe,
+       through the other targets without recipe, and keeps the ones of
+       every group met in ``expanded``."""
+    # Iterative, the groups may be nested deeply
+    stack = [group]
+    on_stack = set(stack)
+    while stack:
+        current = stack[-1]
+        nested = [dep for dep in current.dependencies
+                  if is_recipeless(dep) and dep not in expanded
+                  and dep not in on_stack]
+        if nested:
+            stack.extend(nested)
+            on_stack.update(nested)
+            continue
+        stack.pop()
+        on_stack.discard(current)
+        if current in expanded:
+            continue
+        dependencies = []
+        seen = set()
+        for dep in current.dependencies:
+            for real_dep in expanded.get(dep, [dep]):
+                if real_dep not in seen:
+                    seen.add(real_dep)
+                    dependencies.append(real_dep)
+        expanded[current] = dependencies
+    return expanded[group]
+
+def transitive_reduction(nodes):
+    """
+    Drops the dependencies of ``nodes``, sorted so that every task
+    comes after its dependencies, implied by another dependency
+
+    The tasks reached by each task are kept as bits of an integer,
+    which takes up to a bit per pair of tasks. Returns the number of
+    edges removed.
+    """
+    index = dict((node, position) for position, node in enumerate(nodes))
+    # The tasks each task depends on, directly or not
+    reached = [0] * len(nodes)
+    removed = 0
+    for position, node in enumerate(nodes):
+        implied = 0
+        for dep in node.dependencies:
+            implied |= reached[index[dep]]
+        dependencies = [dep for dep in node.dependencies
+                        if not implied >> index[dep] & 1]
+        removed += len(node.dependencies) - len(dependencies)
+        node.dependencies = dependencies
+        for dep in dependencies:
+            implied |= 1 << index[dep]
+        reached[position] = implied
+    return removed
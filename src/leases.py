@@ -0,0 +1,396 @@
+# -*- coding: utf-8 -*-
+#
+# this file is part of the SDCA project (team 11)
+#
+
+"""
+This module detects the tasks lost with their worker
+
+A worker takes a lease on each task it is about to run, and renews
+it from a heartbeat thread while the task runs. If the worker dies,
+its leases are not renewed any more: the master takes back the
+expired leases and sends the tasks again, at most a few times. Each
+lease is a line of a Redis hash of the build:
+
+    target -> "attempt expires owner"
+
+where ``owner`` is "-" while the task waits in a queue. Only the
+leases of a worker are taken back: a task may wait in a busy queue
+for longer than a lease without anything being wrong. A task only
+runs and launches its children under a lease of its own: a worker
+which gets its task back after its lease was taken does not launch
+the children nor count the task as done, the next attempt does.
+
+A task waiting in the queue of a host (see locality.py) has no lease
+yet. The workers of each host record when they were last seen, and
+the master sends again to the shared queue the ready tasks sent to
+the queue of a host not seen for a lease time.
+"""
+
+from threading import Event, Thread
+from time import time
+
+# The owner of the leases of the tasks sent again, not started yet
+NO_OWNER = "-"
+
+# When the workers of each host were last seen, host -> time
+HOSTS = "hosts:seen"
+
+# KEYS[1]: the leases of the build
+# ARGV[1]: the owner of the leases
+# ARGV[2]: when the leases expire
+# ARGV[3]: the attempt the leases are taken for
+# ARGV[4]: the time to live of the leases, in seconds
+# ARGV[5...]: the targets
+#
+# A first attempt takes a lease nobody has, the next ones the lease
+# the master prepared for them. Returns 1 for each lease taken, 0
+# otherwise.
+ACQUIRE = """
+local taken = {}
+for i = 5, #ARGV do
+    local lease = redis.call('HGET', KEYS[1], ARGV[i])
+    local ok = 0
+    if not lease then
+        if ARGV[3] == '0' then
+            ok = 1
+        end
+    else
+        local attempt, expires, owner =
+            string.match(lease, '^(%d+) (%S+) (%S+)$')
+        if attempt == ARGV[3] and owner == '-' then
+            ok = 1
+        end
+    end
+    if ok == 1 then
+        redis.call('HSET', KEYS[1], ARGV[i],
+                   ARGV[3] .. ' ' .. ARGV[2] .. ' ' .. ARGV[1])
+    end
+    taken[i - 4] = ok
+end
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return taken
+"""
+
+# KEYS[1]: the leases of the build
+# ARGV[1]: the owner of the leases
+# ARGV[2]: when the leases expire, 0 to give them back
+# ARGV[3...]: the targets
+#
+# Returns 1 for each lease still held, 0 for the ones taken back.
+RENEW = """
+local held = {}
+for i = 3, #ARGV do
+    local lease = redis.call('HGET', KEYS[1], ARGV[i])
+    local ok = 0
+    if lease then
+        local attempt, expires, owner =
+            string.match(lease, '^(%d+) (%S+) (%S+)$')
+        if owner == ARGV[1] then
+            redis.call('HSET', KEYS[1], ARGV[i],
+                       attempt .. ' ' .. ARGV[2] .. ' ' .. owner)
+            ok = 1
+        end
+    end
+    held[i - 2] = ok
+end
+return held
+"""
+
+# KEYS[1]: the leases of the build
+# ARGV[1]: the owner of the lease
+# ARGV[2]: the target
+#
+# Returns 1 if the lease was still held, and drops it, 0 otherwise.
+COMPLETE = """
+local lease = redis.call('HGET', KEYS[1], ARGV[2])
+if lease and string.match(lease, '^%d+ %S+ (%S+)$') == ARGV[1] then
+    redis.call('HDEL', KEYS[1], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+# KEYS[1]: the leases of the build
+# ARGV[1]: the target
+# ARGV[2]: the expired lease, as read by the master
+# ARGV[3]: when the new lease expires
+# ARGV[4]: the number of attempts allowed
+#
+# Prepares the lease of the next attempt if the lease did not change
+# since it was read. Returns the next attempt, 0 if the lease changed
+# and -1 if no attempt is left, in which case the lease is dropped.
+RECLAIM = """
+local lease = redis.call('HGET', KEYS[1], ARGV[1])
+if lease ~= ARGV[2] then
+    return 0
+end
+local attempt = tonumber(string.match(lease, '^(%d+)')) + 1
+if attempt >= tonumber(ARGV[4]) then
+    redis.call('HDEL', KEYS[1], ARGV[1])
+    return -1
+end
+redis.call('HSET', KEYS[1], ARGV[1], attempt .. ' ' .. ARGV[3] .. ' -')
+return attempt
+"""
+
+# KEYS[1]: the leases of the build
+# KEYS[2]: the outputs of the build (see locality.py)
+# KEYS[3]: the host queue each task was sent to
+# ARGV[1]: the target
+# ARGV[2]: when the lease of the next attempt expires
+# ARGV[3...]: the targets the task depends on
+#
+# Prepares the lease of the attempt sending again a task lost in the
+# queue of a host if it was neither started nor built, and if all its
+# dependencies were built. The task is forgotten once it was started.
+# Returns 1 if the lease was prepared, 0 otherwise.
+REQUEUE = """
+if redis.call('HEXISTS', KEYS[1], ARGV[1]) == 1
+        or redis.call('HEXISTS', KEYS[2], ARGV[1]) == 1 then
+    redis.call('HDEL', KEYS[3], ARGV[1])
+    return 0
+end
+for i = 3, #ARGV do
+    if redis.call('HEXISTS', KEYS[2], ARGV[i]) == 0 then
+        return 0
+    end
+end
+redis.call('HSET', KEYS[1], ARGV[1], '1 ' .. ARGV[2] .. ' -')
+redis.call('HDEL', KEYS[3], ARGV[1])
+return 1
+"""
+
+def parse_lease(lease):
+    """Returns the attempt, the expiry time and the owner of a
+       ``lease``."""
+    attempt, expires, owner = lease.split(' ')
+    return int(attempt), float(expires), owner
+
+def expired_leases(leases, now):
+    """Returns the targets and the leases of ``leases``, a dict, held
+       by a worker which expired at ``now``. The tasks still waiting in
+       a queue are left out."""
+    expired = []
+    for target, lease in leases.items():
+        _, expires, owner = parse_lease(lease)
+        if expires < now and owner != NO_OWNER:
+            expired.append((target, lease))
+    return sorted(expired)
+
+def task_timeout(duration, factor, minimum):
+    """Returns the time a task which lasted ``duration`` seconds at its
+       last build may run, None for no limit, as for a target never
+       built."""
+    if factor is None or duration is None:
+        return None
+    return max(minimum, factor * duration)
+
+class Leases(object):
+    """
+    The leases of the tasks of the builds.
+
+    Attributes:
+       ttl(int): the time to live of the leases, in seconds.
+       lease_time(float): the time a lease lasts, in seconds.
+       _red(Redis): the database storing the leases.
+       _acquire(Script): the script taking leases.
+       _renew(Script): the script renewing leases.
+       _complete(Script): the script dropping a lease.
+       _reclaim(Script): the script preparing the next attempt.
+       _requeue(Script): the script preparing the attempt of a task
+       lost in a host queue.
+    """
+    def __init__(self, red, ttl, lease_time):
+        self.ttl = ttl
+        self.lease_time = lease_time
+        self._red = red
+        self._acquire = red.register_script(ACQUIRE)
+        self._renew = red.register_script(RENEW)
+        self._complete = red.register_script(COMPLETE)
+        self._reclaim = red.register_script(RECLAIM)
+        self._requeue = red.register_script(REQUEUE)
+
+    def acquire(self, keys, targets, owner, attempt):
+        """Takes the leases of ``targets`` for ``attempt``, returns
+           whether each one was taken."""
+        if not targets:
+            return []
+        taken = self._acquire(keys=[keys.leases],
+                              args=[owner, time() + self.lease_time,
+                                    attempt, self.ttl] + list(targets))
+        return [bool(ok) for ok in taken]
+
+    def renew(self, keys, targets, owner):
+        """Renews the leases of ``targets``, returns whether each one
+           is still held."""
+        if not targets:
+            return []
+        held = self._renew(keys=[keys.leases],
+                           args=[owner, time() + self.lease_time]
+                           + list(targets))
+        return [bool(ok) for ok in held]
+
+    def give_back(self, keys, target, owner):
+        """Lets the master send ``target`` again at once."""
+        self._renew(keys=[keys.leases], args=[owner, 0, target])
+
+    def complete(self, keys, target, owner):
+        """Drops the lease of ``target``, returns False if it was taken
+           back, in which case another attempt completes the task."""
+        return bool(self._complete(keys=[keys.leases],
+                                   args=[owner, target]))
+
+    def load(self, keys):
+        """Returns the leases of the build of ``keys``, as a dict."""
+        return self._red.hgetall(keys.leases)
+
+    def reclaim(self, keys, target, lease, attempts):
+        """Prepares the next attempt of ``target`` if its ``lease`` did
+           not change. Returns the next attempt, 0 if the lease changed
+           and -1 if the ``attempts`` are exhausted."""
+        return self._reclaim(keys=[keys.leases],
+                             args=[target, lease, time() + self.lease_time,
+                                   attempts])
+
+    def routed(self, keys, targets, host):
+        """Records that ``targets`` were sent to the queue of
+           ``host``."""
+        pipe = self._red.pipeline(transaction=False)
+        pipe.hmset(keys.routed, dict((target, host) for target in targets))
+        pipe.expire(keys.routed, self.ttl)
+        pipe.execute()
+
+    def load_routed(self, keys):
+        """Returns the host queue of each task sent to one and not
+           started yet, as far as the master knows."""
+        return self._red.hgetall(keys.routed)
+
+    def requeue(self, keys, target, dependencies):
+        """Prepares the attempt sending ``target``, lost in a host
+           queue, again if it is ready and was not started, returns
+           whether it was prepared."""
+        return bool(self._requeue(keys=[keys.leases, keys.outputs,
+                                        keys.routed],
+                                  args=[target, time() + self.lease_time]
+                                  + list(dependencies)))
+
+    def seen(self, host):
+        """Records that the workers of ``host`` are alive."""
+        self._red.hset(HOSTS, host, time())
+
+    def hosts(self):
+        """Returns when the workers of each host were last seen."""
+        return dict((host, float(seen)) for host, seen
+                    in self._red.hgetall(HOSTS).items())
+
+class HostHeartbeat(Thread):
+    """
+    Records every few seconds that the workers of a host are alive.
+
+    Attributes:
+       _leases(Leases): the leases.
+       _host(str): the host.
+       _interval(float): the time between two records, in seconds.
+       _stopped(Event): set to stop the thread.
+    """
+    def __init__(self, leases, host, interval):
+        Thread.__init__(self)
+        self.daemon = True
+        self._leases = leases
+        self._host = host
+        self._interval = interval
+        self._stopped = Event()
+
+    def run(self):
+        while True:
+            try:
+                self._leases.seen(self._host)
+            except Exception:
+                # Redis is away for a while, the master sends the tasks
+                # of the host again if it lasts
+                pass
+            if self._stopped.wait(self._interval):
+                return
+
+    def stop(self):
+        """Stops the thread."""
+        self._stopped.set()
+        self.join()
+
+class Heartbeat(Thread):
+    """
+    Renews the leases of a worker process while it runs its tasks,
+    and kills the commands running for too long or cancelled.
+
+    Attributes:
+       held(set(str)): the targets whose leases are held.
+       timed_out(bool): whether the current command was killed for
+       running too long.
+       cancelled(bool): whether the current command was killed because
+       it was cancelled.
+       _leases(Leases): the leases.
+       _keys(BuildKeys): the keys of the build.
+       _owner(str): the owner of the leases.
+       _interval(float): the time between two renewals, in seconds.
+       _executor(Executor): the executor running the commands.
+       _is_cancelled(function): returns whether the command of a target
+       must be stopped, None if it never is.
+       _target(str): the target of the current command.
+       _deadline(float): when the current task must be done, None if
+       it has no time limit.
+       _stopped(Event): set to stop the thread.
+    """
+    def __init__(self, leases, keys, owner, interval, executor,
+                 is_cancelled=None):
+        Thread.__init__(self)
+        self.daemon = True
+        self.held = set()
+        self.timed_out = False
+        self.cancelled = False
+        self._leases = leases
+        self._keys = keys
+        self._owner = owner
+        self._interval = interval
+        self._executor = executor
+        self._is_cancelled = is_cancelled
+        self._target = None
+        self._deadline = None
+        self._stopped = Event()
+
+    def limit(self, timeout, target=None):
+        """Limits the command of ``target`` starting now to ``timeout``
+           seconds, None for no limit."""
+        self.timed_out = False
+        self.cancelled = False
+        self._target = target
+        self._deadline = None if timeout is None else time() + timeout
+
+    def run(self):
+        while not self._stopped.wait(self._check_interval()):
+            if self._deadline is not None and time() > self._deadline:
+                self._deadline = None
+                self.timed_out = True
+                self._executor.kill()
+            target = self._target
+            if target is not None and self._is_cancelled is not None \
+                    and self._is_cancelled(target):
+                self._target = None
+                self.cancelled = True
+                self._executor.kill()
+            targets = list(self.held)
+            for target, held in zip(targets, self._leases.renew(
+                    self._keys, targets, self._owner)):
+                if not held:
+                    self.held.discard(target)
+
+    def _check_interval(self):
+        """Returns the time to wait before the next check."""
+        if self._deadline is None:
+            return self._interval
+        return max(min(self._interval, self._deadline - time()), 0.1)
+
+    def stop(self):
+        """Stops the thread."""
+        self._stopped.set()
+        self.join()
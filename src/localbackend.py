@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+#
+# this file is part of the SDCA project (team 11)
+#
+
+"""
+The backend running the tasks on this host only
+
+For small Makefiles, a message through the broker and the round trips
+to Redis cost more than the commands themselves. This backend runs the
+commands in a pool of processes of the master's host, each with its
+own executor (see executor.py), and keeps the dependency counters in
+the memory of the master: neither Celery, nor a broker, nor Redis is
+needed. The ready tasks wait in a heap, the ones on the critical path
+first, and only as many tasks as there are processes are handed to the
+pool at a time so that the priorities hold.
+
+The resources the tasks need (see resources.py) are counted the same
+way: a task takes a core of the pool unless it declares more, and the
+ready tasks whose resources are not free wait while the next ones in
+the heap, which fit, are run.
+"""
+
+import heapq
+from events import BuildMonitor, DONE, FAILED
+from executor import get_executor
+from multiprocessing import Pool, cpu_count
+from Queue import Queue
+from resources import fits, local_capacity
+from socket import gethostname
+from time import time
+
+def run_command(target, command):
+    """
+    Runs the parts of ``command`` building ``target`` one after the
+    other, in a process of the pool
+
+    Returns the target, the exit code of the part which failed (0 if
+    none did) and the error.
+    """
+    try:
+        executor = get_executor()
+        for part in command.split(';'):
+            if not part.strip():
+                continue
+            result = executor.run(part)
+            if result.exit_code != 0:
+                return (target, result.exit_code,
+                        "'%s' failed with code '%s'\n%s"
+                        % (part, result.exit_code, result.output))
+        return target, 0, None
+    except Exception as error:
+        # Sent back to the master, the pool would only log it
+        return target, None, str(error)
+
+class LocalBackend(object):
+    """
+    Runs the tasks of a build in a pool of processes of this host.
+
+    Attributes:
+       history(Redis): None, nothing is kept from one build to the
+       next one.
+       jobs(int): the number of processes running the commands.
+       _args(Namespace): the options of the master.
+    """
+    def __init__(self, args):
+        self.history = None
+        self.jobs = args.jobs or cpu_count()
+        self._args = args
+
+    def phase(self, phase, since):
+        """Returns the current time, the phases are not recorded."""
+        return time()
+
+    def durations(self):
+        """Returns no duration, the tasks are only prioritized by the
+           shape of the tree."""
+        return {}
+
+    def capacity(self, nodes):
+        """Returns what the tasks of ``nodes`` may use at the same time:
+           a core per process, the memory of the host and, as the pools
+           of tokens are only declared by the workers, the largest need
+           of a task for each pool."""
+        capacity = local_capacity({})
+        capacity['cores'] = self.jobs
+        for node in nodes:
+            for name, amount in (node.needs or {}).items():
+                if name not in ('cores', 'memory'):
+                    capacity[name] = max(capacity.get(name, 0), amount)
+        return capacity
+
+    def run(self, dep_tree, leaves, mark):
+        """Runs the tasks of ``dep_tree``, starting from its ``leaves``,
+           until the build is over. Returns the exit status."""
+        monitor = BuildMonitor(dict((node.target,
+                                     [child.target
+                                      for child in node.children])
+                                    for node in dep_tree.nodes),
+                               dep_tree.nodes_num, self._args.keep_going)
+        # The dependencies left of each task
+        left = dict(dep_tree.in_degree)
+        nodes = dict((node.target, node) for node in dep_tree.nodes)
+        capacity = self.capacity(dep_tree.nodes)
+        # What each task takes, a task larger than the host runs alone
+        needs = dict((node.target,
+                      dict((name, min(amount, capacity[name]))
+                           for name, amount in (node.needs
+                                                or {'cores': 1}).items()))
+                     for node in dep_tree.nodes)
+        used = {}
+        ready = []
+        for leaf in leaves:
+            heapq.heappush(ready, (-leaf.priority, leaf.target))
+        # The results of the pool, put by its thread
+        results = Queue()
+        running = 0
+        done = 0
+        hostname = gethostname()
+        pool = Pool(self.jobs)
+        try:
+            while not monitor.is_over():
+                # The tasks whose resources are not free, put back
+                waiting = []
+                while ready and running < self.jobs:
+                    entry = heapq.heappop(ready)
+                    target = entry[1]
+                    if not fits(needs[target], capacity, used):
+                        waiting.append(entry)
+                        continue
+                    for name, amount in needs[target].items():
+                        used[name] = used.get(name, 0) + amount
+                    node = nodes[target]
+                    if not node.command:
+                        # Only groups its dependencies
+                        results.put((target, 0, None))
+                    else:
+                        pool.apply_async(run_command,
+                                         (target, node.command),
+                                         callback=results.put)
+                    running += 1
+                for entry in waiting:
+                    heapq.heappush(ready, entry)
+                if not running:
+                    # Only the tasks depending on a failed one are left
+                    break
+                # A timeout lets the master be interrupted
+                target, exit_code, error = results.get(timeout=3600 * 24)
+                running -= 1
+                for name, amount in needs[target].items():
+                    used[name] -= amount
+                if exit_code != 0:
+                    print "*** '%s' failed on %s: %s" % (target, hostname,
+                                                         error)
+                    monitor.handle({'type': FAILED, 'target': target,
+                                    'worker': hostname,
+                                    'exit_code': exit_code, 'error': error})
+                    continue
+                done += 1
+                print "[%d/%d] '%s' done" % (done, monitor.total, target)
+                monitor.handle({'type': DONE, 'left': monitor.total - done,
+                                'targets': [target]})
+                for child in nodes[target].children:
+                    left[child] -= 1
+                    if not left[child]:
+                        heapq.heappush(ready, (-child.priority,
+                                               child.target))
+            pool.close()
+        finally:
+            # Stops the processes of the pool, a command still running
+            # after a failure is not waited for
+            pool.terminate()
+            pool.join()
+        if monitor.skipped:
+            print "%d targets not built because of the errors." \
+                  % len(monitor.skipped)
+        return monitor.exit_status()
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+#
+# this file is part of the SDCA project (team 11)
+#
+
+"""
+This module sends the tasks to the worker holding their inputs
+
+Every file goes through NFS, but a file written by a node stays in its
+page cache: a task run on the node which built its dependencies reads
+them locally instead of over the network. The workers record the
+target they built, with its size and their host, and each host
+consumes from its own queue besides the shared one. When a task
+launches its children, each child is sent to the queue of the host
+which built most of the bytes of its inputs, or to the shared queue
+if no input was built yet or if that host already has too many tasks
+waiting. The bytes of the inputs of each task read on the host which
+built them (local) or on another one (remote) are kept in its trace
+(see tracing.py), the source files of the Makefile are not counted.
+"""
+
+from kombu import Queue
+
+# The prefix of the queue of each host
+QUEUE_PREFIX = "dmake."
+
+# KEYS[1]: the outputs of the build, target -> "size host"
+# ARGV[1]: the time to live of the keys, in seconds
+# ARGV[2]: the host which built the target
+# ARGV[3]: the target
+# ARGV[4]: the size of the target, in bytes
+# ARGV[5...]: the inputs of the target
+#
+# Records the output, returns the bytes of the inputs read locally and
+# remotely.
+OUTPUT_DONE = """
+local local_bytes, remote_bytes = 0, 0
+for i = 5, #ARGV do
+    local output = redis.call('HGET', KEYS[1], ARGV[i])
+    if output then
+        local size, host = string.match(output, '^(%d+) (.*)$')
+        if host == ARGV[2] then
+            local_bytes = local_bytes + tonumber(size)
+        else
+            remote_bytes = remote_bytes + tonumber(size)
+        end
+    end
+end
+redis.call('HSET', KEYS[1], ARGV[3], ARGV[4] .. ' ' .. ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return {local_bytes, remote_bytes}
+"""
+
+def local_queue(host):
+    """Returns the queue of ``host``, declared the same way by the
+       workers consuming from it and by the tasks sending to it."""
+    name = QUEUE_PREFIX + host
+    return Queue(name, routing_key=name,
+                 queue_arguments={"x-max-priority": 10})
+
+def parse_output(output):
+    """Returns the size and the host of an ``output`` recorded by
+       ``Locality.output_done``."""
+    size, host = output.split(' ', 1)
+    return int(size), host
+
+def choose_host(outputs, queued, max_queued):
+    """Returns the host which built most of the bytes of ``outputs``,
+       the recorded outputs of the inputs of a task (None for the
+       inputs not built during the build).
+
+       Returns None, for the shared queue, if no input was built or if
+       that host has ``max_queued`` tasks or more waiting in its queue
+       according to ``queued``."""
+    sizes = {}
+    for output in outputs:
+        if output is None:
+            continue
+        size, host = parse_output(output)
+        sizes[host] = sizes.get(host, 0) + size
+    if not sizes:
+        return None
+    # Sorted so that the ties are broken the same way everywhere
+    host = max(sorted(sizes), key=sizes.get)
+    if queued.get(host, 0) >= max_queued:
+        return None
+    return host
+
+class Locality(object):
+    """
+    Where the targets of the builds were built.
+
+    Attributes:
+       ttl(int): the time to live of the keys, in seconds.
+       _red(Redis): the database storing the outputs.
+       _output_done(Script): the script recording an output.
+    """
+    def __init__(self, red, ttl):
+        self.ttl = ttl
+        self._red = red
+        self._output_done = red.register_script(OUTPUT_DONE)
+
+    def output_done(self, keys, target, host, size, inputs):
+        """Records that ``host`` built ``target`` of ``size`` bytes
+           from ``inputs``. Returns the bytes of the inputs read
+           locally and remotely."""
+        return self._output_done(keys=[keys.outputs],
+                                 args=[self.ttl, host, target, size]
+                                 + list(inputs))
+
+    def route(self, keys, inputs, max_queued):
+        """Returns the host to send each task to, given the ``inputs``
+           of each task, None for the shared queue, and counts the
+           tasks sent to each host. Costs two round trips at most."""
+        pipe = self._red.pipeline(transaction=False)
+        pipe.hgetall(keys.queued)
+        for task_inputs in inputs:
+            if task_inputs:
+                pipe.hmget(keys.outputs, task_inputs)
+        results = pipe.execute()
+        queued = dict((host, int(num)) for host, num in results[0].items())
+        outputs = iter(results[1:])
+        hosts = []
+        for task_inputs in inputs:
+            host = None
+            if task_inputs:
+                host = choose_host(next(outputs), queued, max_queued)
+            if host is not None:
+                queued[host] = queued.get(host, 0) + 1
+            hosts.append(host)
+        if any(host is not None for host in hosts):
+            pipe = self._red.pipeline(transaction=False)
+            for host in hosts:
+                if host is not None:
+                    pipe.hincrby(keys.queued, host, 1)
+            pipe.expire(keys.queued, self.ttl)
+            pipe.execute()
+        return hosts
+
+    def started(self, keys, host):
+        """Records that a task sent to the queue of ``host`` started."""
+        self._red.hincrby(keys.queued, host, -1)
@@ -6,6 +6,7 @@ and sort the tasks of the different targets in a Makefile.
 import sys
 import logging
 import logging.config
+from cStringIO import StringIO
 
 LOGGER = logging.getLogger(__name__)
 
@@ -23,14 +24,29 @@ class Task(object):
        target (str): name of the target in the Makefile.
        dependencies(list(Task)): list of all dependencies.
        command(str): the command to execute in order to fullfill the target.
+       priority(int): the Celery priority of the task.
+       duration(float): the expected duration of the task, in
+       seconds, None if unknown.
+       inputs(list(str)): the targets of all the dependencies, files
+       included.
+       needs(dict(str, int)): the resources the task needs, None if
+       it declares none (see resources.py).
        state(State): current state of the task.
        _id(State): used only to generate the graph for dot.
     """
+    # No __dict__ per task, the graphs may have millions of them
+    __slots__ = ('target', 'dependencies', 'command', 'children',
+                 'priority', 'duration', 'inputs', 'needs', '_node_id')
+
     def __init__(self, node_id):
         self.target = None
         self.dependencies = []
         self.command = None
         self.children = []
+        self.priority = 0
+        self.duration = None
+        self.inputs = []
+        self.needs = None
         self._node_id = node_id
 
     def __repr__(self):
@@ -46,6 +62,13 @@ class Task(object):
     def __ne__(self, other):
         return not self.__eq__(other)
 
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
     def is_file_dependency(self):
         """Returns True if this task represents a file, False otherwise."""
         return not self.dependencies and not self.command
@@ -83,6 +106,9 @@ class Parser(object):
 
     def parse_makefile(self, input_file=sys.stdin):
         """Parses the Makefile and Builds the tasks DAG.
+
+           The Makefile is read one line at a time, the target names
+           are interned and each line is only logged at debug level.
            Raises:
              ParseError: Raised when an error is encountered
              during the parsing."""
@@ -91,18 +117,22 @@ class Parser(object):
         self._root_task.dependencies = []
         self._target_to_task = {'[ROOT]' : self._root_task}
         self._targets = set()
-        LOGGER.info('Reading Makefile')
-        makefile_lines = input_file.readlines()
-        LOGGER.info('Discarding empty lines and comment lines')
-        makefile_lines = [line for line in makefile_lines
-                          if not (line == '\n' or line.startswith('#'))]
-        if len(makefile_lines) == 0:
-            LOGGER.error('Empty Makefile')
-            raise ParseError('Empty Makefile')
-        index = 0
-        while index < len(makefile_lines):
-            current_line = makefile_lines[index]
-            LOGGER.info('Analyzing %s', current_line)
+        debug = LOGGER.isEnabledFor(logging.DEBUG)
+        dependencies_num = 0
+        # The task of the last target, until its command is found
+        current_task = None
+        for current_line in _significant_lines(input_file):
+            if debug:
+                LOGGER.debug('Analyzing %s', current_line)
+            # get the command
+            if current_task is not None and current_line.startswith('\t'):
+                cmd = current_line.lstrip('\t').rstrip('\n')
+                if debug:
+                    LOGGER.debug('Adding command %s for target %s',
+                                 cmd, current_task.target)
+                current_task.command = cmd
+                current_task = None
+                continue
             if ':' not in current_line:
                 LOGGER.error('Missing : separator on line: %s', current_line)
                 raise ParseError('Missing : separator on line: ' + current_line)
@@ -111,8 +141,8 @@ class Parser(object):
                              current_line)
                 raise ParseError('Expected target, found command on line '
                                  + current_line)
-            current_recipe = current_line.split(':')
-            current_target = current_recipe[0].strip()
+            current_recipe = current_line.split(':', 2)
+            current_target = intern(current_recipe[0].strip())
             if not current_target:
                 LOGGER.error('No target found on %s', current_line)
                 raise ParseError('No target specified on line ' + current_line)
@@ -120,42 +150,34 @@ class Parser(object):
                 LOGGER.error('Target %s already declared', current_target)
                 raise ParseError('Target ' + current_target
                                  + ' already declared')
-            else:
-                LOGGER.info('Adding target %s to the known targets',
-                            current_target)
-                self._targets.add(current_target)
-            dependencies = current_recipe[1].strip()
-            LOGGER.info('Creating task for target %s', current_target)
+            self._targets.add(current_target)
             current_task = self._get_task_from_target(current_target)
             # first target has _root_task as parent
-            if index == 0:
-                LOGGER.info('Adding first target %s as child of %s',
-                            current_target, '[ROOT]')
+            if not self._root_task.dependencies:
+                if debug:
+                    LOGGER.debug('Adding first target %s as child of %s',
+                                 current_target, '[ROOT]')
                 self._root_task.dependencies.append(current_task)
-            for dependency in dependencies.split():
-                LOGGER.info('Creating dependency task %s', dependency)
-                dependency_task = self._get_task_from_target(dependency)
-                LOGGER.info('Adding dependency %s for target %s',
-                            dependency, current_target)
+            for dependency in current_recipe[1].split():
+                dependency_task = self._get_task_from_target(
+                    intern(dependency))
+                if debug:
+                    LOGGER.debug('Adding dependency %s for target %s',
+                                 dependency, current_target)
                 current_task.dependencies.append(dependency_task)
-            # go for the next line
-            index += 1
-            if index >= len(makefile_lines):
-                LOGGER.info('Finishing Makefile parsing')
-                break
-            # get the command
-            cmd = makefile_lines[index]
-            if cmd.startswith('\t'):
-                cmd = cmd.lstrip('\t').rstrip('\n')
-                LOGGER.info('Adding command %s for target %s',
-                            cmd, current_target)
-                current_task.command = cmd
-                index += 1
+                dependencies_num += 1
+        if not self._targets:
+            LOGGER.error('Empty Makefile')
+            raise ParseError('Empty Makefile')
+        LOGGER.info('Parsed %d targets and %d dependencies',
+                    len(self._targets), dependencies_num)
         LOGGER.info('Checking for cyclic targets')
-        for task in self._target_to_task.values():
-            if Parser._is_cyclically_dependent(task):
-                LOGGER.error('Cyclic target %s detected', task.target)
-                raise ParseError('Cyclic target ' + task.target + ' detected')
+        cycle = self._find_cycle()
+        if cycle is not None:
+            path = ' -> '.join(cycle)
+            LOGGER.error('Cyclic target %s detected: %s', cycle[0], path)
+            raise ParseError('Cyclic target ' + cycle[0] + ' detected: '
+                             + path)
 
     def get_task(self, target):
         """ Returns the task associated with a target."""
@@ -170,43 +192,51 @@ class Parser(object):
             raise ParseError('No task found for target: ' + target)
         return target_task
 
-    @staticmethod
-    def _is_cyclically_dependent(task):
-        """Returns True if task have dependency that depends on it,
-           False otherwise. Check only for simple cyclic dependency."""
-        if not task.dependencies:
-            return False
-        if task in task.dependencies:
-            return True
-        for dependency in task.dependencies:
-            if task in dependency.dependencies:
-                return True
-        return False
+    def _find_cycle(self):
+        """Returns the targets of a cycle of dependencies, the first
+           one repeated at the end, None if there is no cycle.
 
-    def get_dot_dependencies_tree(self):
-        """Builds a digraph of the DAG for dot."""
-        str_out = 'digraph G {\n'
-        # build vertex
-        for task in self._target_to_task.values():
-            if task == self._root_task:
-                continue
-            str_out += task.get_dot_node()
-            str_out += '[label=\"'
-            str_out += task.target
-            str_out += '\" color=\"'
-            str_out += 'green'
-            str_out += '\"];\n'
-        # build edges
-        for task in self._target_to_task.values():
-            if task == self._root_task:
+           Iterative depth first search: the tasks on the current
+           path are grey, the ones whose dependencies are all explored
+           are black. Reaching a grey task closes a cycle."""
+        grey, black = 1, 2
+        color = {}
+        for start in self._target_to_task.values():
+            if start in color:
                 continue
-            for child_task in task.dependencies:
-                str_out += child_task.get_dot_node()
-                str_out += ' -> '
-                str_out += task.get_dot_node()
-                str_out += ';\n'
-        str_out += '}'
-        return str_out
+            color[start] = grey
+            path = [start]
+            # The dependencies left to explore for each task of path
+            pending = [iter(start.dependencies)]
+            while pending:
+                for dep in pending[-1]:
+                    state = color.get(dep)
+                    if state is None:
+                        color[dep] = grey
+                        path.append(dep)
+                        pending.append(iter(dep.dependencies))
+                        break
+                    if state == grey:
+                        cycle = path[path.index(dep):] + [dep]
+                        return [task.target for task in cycle]
+                else:
+                    color[path.pop()] = black
+                    pending.pop()
+        return None
+
+    def get_tasks(self):
+        """Returns all the tasks of the Makefile, the files included."""
+        return [task for task in self._target_to_task.values()
+                if task is not self._root_task]
+
+    def get_dot_dependencies_tree(self):
+        """Builds a digraph of the DAG for dot, see graphexport to
+           write it to a file instead."""
+        # Imported here, graphexport imports this module
+        from graphexport import write_dot
+        stream = StringIO()
+        write_dot(self.get_tasks(), stream)
+        return stream.getvalue()
 
     def _get_task_from_target(self, target):
         """Returns the task associated with the target name,
@@ -221,6 +251,13 @@ class Parser(object):
             self._target_to_task[target] = task
             return task
 
+def _significant_lines(input_file):
+    """Yields the lines of ``input_file`` that are neither empty nor
+       comments."""
+    for line in input_file:
+        if not (line == '\n' or line.startswith('#')):
+            yield line
+
 def main():
     """Reads a makefile from stdin and prints dot commands."""
     parser = Parser()
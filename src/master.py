@@ -6,19 +6,37 @@
 """
 The master's code
 
-Divides the work into tasks and executes them with Celery
+Divides the work into tasks and executes them with Celery, or in
+processes of its own host with the local backend
 """
 
 from argparse import ArgumentParser, FileType
-from celery import group
+from graphopt import collapse_recipeless, transitive_reduction
 from os.path import exists
-from makeparse import Parser
-from work import run_task, RED, START_TIME, END_TIME, END_LIST, TASK_NUM
+from makeparse import Parser, Task
+from plan import BuildPlan
+from plancache import PlanCache, plan_key
+from resources import parse_resources, task_needs
+from schedule import compute_weights, compute_priorities, \
+                     estimate_durations
+from uptodate import MtimeChecker, HashChecker
 from time import time
+import sys
+
+# The directory of the trees of the Makefiles already parsed
+PLAN_CACHE_DIR = '.dmake/plans'
 
 class DepTree(object):
     """
     A dependency tree
+
+    Attributes:
+       nodes(list(Task)): the tasks of the tree, sorted so that every
+       task comes after its dependencies.
+       nodes_num(int): the number of tasks in the tree.
+       leaves(set(Task)): the tasks without any dependencies.
+       in_degree(dict(Task, int)): the number of dependencies of
+       each task.
     """
 
     def __init__(self, task):
@@ -30,37 +48,170 @@ class DepTree(object):
         dependencies are stored in the ``leaves`` attr of the tree.
         The attr ``children`` of the tasks we iterate on is set
         so that we can easily iterate on the tree nodes from the
-        leaves to the root.
+        leaves to the root. The attr ``inputs`` keeps the targets
+        of all the dependencies, including the files which are not
+        part of the tree.
+
+        Every task and every dependency is visited once, so that
+        tasks shared by several targets are neither counted nor
+        added as children more than once.
         """
         if task.is_file_dependency():
             raise RuntimeError("Cannot build a tree from a file dependency")
-        # The number of nodes in the tree
-        self.nodes_num = 0
 
         # Classical algorithm to iterate on a tree's nodes using
-        # a stack
+        # a stack, with a set of the tasks already seen
+        visited = set([task])
         stack = [task]
-        self.leaves = set()
+        reached = []
         while stack:
             node = stack.pop()
-            self.nodes_num += 1
-            node.dependencies = [dep for dep in node.dependencies
-                                 if not dep.is_file_dependency()]
+            reached.append(node)
+            dependencies = []
+            inputs = []
+            seen = set()
+            for dep in node.dependencies:
+                if dep in seen:
+                    continue
+                seen.add(dep)
+                inputs.append(dep.target)
+                if dep.is_file_dependency():
+                    continue
+                dependencies.append(dep)
+                if dep not in visited:
+                    visited.add(dep)
+                    stack.append(dep)
+            node.dependencies = dependencies
+            node.inputs = inputs
+        self._link(reached)
+
+    @classmethod
+    def from_plan(cls, plan):
+        """
+        Creates a DepTree from a BuildPlan, numbered from the leaves to
+        the root as the ``nodes`` of the DepTree it was made of
 
+        The tasks are created again, but the tree is neither walked nor
+        sorted: its leaves and in-degrees come from the plan.
+        """
+        nodes = [Task(index) for index in xrange(len(plan))]
+        # Lists are faster to slice than arrays
+        dep_offsets = plan.dependencies.offsets.tolist()
+        dep_edges = plan.dependencies.edges.tolist()
+        child_offsets = plan.children.offsets.tolist()
+        child_edges = plan.children.edges.tolist()
+        in_degree = {}
+        for index, node in enumerate(nodes):
+            node.target = plan.targets[index]
+            node.command = plan.commands[index]
+            node.inputs = plan.inputs[index]
+            start, end = dep_offsets[index], dep_offsets[index + 1]
+            node.dependencies = [nodes[dep] for dep in dep_edges[start:end]]
+            in_degree[node] = end - start
+            node.children = [nodes[child] for child in child_edges[
+                child_offsets[index]:child_offsets[index + 1]]]
+        tree = cls.__new__(cls)
+        tree.nodes = nodes
+        tree.nodes_num = len(nodes)
+        tree.leaves = set(nodes[leaf] for leaf in plan.leaves)
+        tree.in_degree = in_degree
+        return tree
+
+    def _link(self, reached):
+        """
+        Sets the children of the ``reached`` tasks and sorts them
+        from the leaves to the root
+        """
+        self.in_degree = {}
+        self.leaves = set()
+        for node in reached:
+            node.children = []
+        for node in reached:
+            self.in_degree[node] = len(node.dependencies)
             if not node.dependencies:
                 self.leaves.add(node)
-                continue
             for dep in node.dependencies:
                 dep.children.append(node)
-                stack.append(dep)
+
+        # Sort the tasks from the leaves to the root
+        left = dict(self.in_degree)
+        ready = list(self.leaves)
+        self.nodes = []
+        while ready:
+            node = ready.pop()
+            self.nodes.append(node)
+            for child in node.children:
+                left[child] -= 1
+                if not left[child]:
+                    ready.append(child)
+        self.nodes_num = len(self.nodes)
+
+    def prune(self, checker):
+        """
+        Removes the tasks that are up to date from the tree
+
+        A task is kept if one of its dependencies is kept, or if
+        ``checker`` tells its target is older than its inputs. A
+        task without command is only kept for its dependencies.
+        Returns the number of tasks removed.
+        """
+        stale = set()
+        for node in self.nodes:
+            if any(dep in stale for dep in node.dependencies):
+                stale.add(node)
+            elif node.command is not None and \
+                 not checker.is_up_to_date(node.target, node.inputs):
+                stale.add(node)
+
+        kept = [node for node in self.nodes if node in stale]
+        for node in kept:
+            # The dependencies that are up to date are done already
+            node.dependencies = [dep for dep in node.dependencies
+                                 if dep in stale]
+        removed = self.nodes_num - len(kept)
+        self._link(kept)
+        return removed
+
+    def reduce(self):
+        """
+        Drops the dependencies implied by another one (see graphopt.py)
+
+        Returns the number of dependencies removed.
+        """
+        removed = transitive_reduction(self.nodes)
+        self._link(self.nodes)
+        return removed
+
+def get_backend(args):
+    """
+    Returns the backend running the tasks chosen by ``args``
+
+    The backends are imported only when chosen, so that the local one
+    needs neither Celery nor Redis. A backend prepares the build when
+    it is created and provides ``history`` (the Redis database of the
+    previous builds, None if it has none), ``phase(phase, since)``,
+    ``durations()`` and ``run(dep_tree, leaves, mark)``, which returns
+    the exit status of the master.
+    """
+    if args.backend == 'local':
+        from localbackend import LocalBackend
+        return LocalBackend(args)
+    from celerybackend import CeleryBackend
+    return CeleryBackend(args)
+
+def _seekable(stream):
+    """Returns whether ``stream`` can be read again from its start, which
+       a pipe cannot."""
+    try:
+        stream.seek(0, 1)
+    except IOError:
+        return False
+    return True
 
 def main():
     """
     Runs a makefile on several nodes
     """
-    # Flush the database, from one execution to another
-    RED.flushdb()
-
     # The makefile to use in case none is provided
     default_makefile = None
     for makefile in ('GNU-makefile', 'makefile', 'Makefile'):
@@ -74,33 +225,111 @@ def main():
                         help='the file to use')
     parser.add_argument('-a', '--async', action='store_true',
                         help='do not wait for tasks completion')
+    parser.add_argument('-c', '--compact', action='store_true',
+                        help='publish the tree once and send task indexes')
+    parser.add_argument('-B', '--always-make', action='store_true',
+                        help='build all the targets, even up to date ones')
+    parser.add_argument('--hash', action='store_true',
+                        help='detect changed inputs with their content')
+    parser.add_argument('-k', '--keep-going', action='store_true',
+                        help='build what does not depend on a failed task')
+    parser.add_argument('--reduce', action='store_true',
+                        help='drop the dependencies implied by other ones')
+    parser.add_argument('--backend', choices=('celery', 'local'),
+                        default='celery',
+                        help='run the tasks on the Celery workers or in '
+                        'processes of this host')
+    parser.add_argument('-j', '--jobs', type=int,
+                        help='the number of processes of the local backend '
+                        '(default: number of cores)')
+    parser.add_argument('--no-plan-cache', action='store_true',
+                        help='parse the makefile even if its tree is in '
+                        + PLAN_CACHE_DIR)
+    parser.add_argument('--resources', type=FileType('r'),
+                        help='the file of the resources the tasks need')
     parser.add_argument('target', nargs='?', default="",
                         help='the makefile\'s target to create')
     args = parser.parse_args()
 
     if args.makefile is None:
         print "No makefile was found. Stopping."
-        return
+        return 2
+    if args.backend == 'local' and (args.async or args.hash):
+        parser.error('--async and --hash need the celery backend')
+
+    backend = get_backend(args)
+    mark = time()
+
+    # The tree of a makefile which did not change is read from the
+    # plan cache instead, the makefile is hashed in a first pass, so
+    # a piped makefile is always parsed
+    cache = None
+    if not args.no_plan_cache and _seekable(args.makefile):
+        cache = PlanCache(PLAN_CACHE_DIR)
+    plan = None
+    if cache is not None:
+        key = plan_key(args.makefile, args.target, args.reduce)
+        plan = cache.load(key)
+        args.makefile.seek(0)
+    if plan is not None:
+        dep_tree = DepTree.from_plan(plan)
+        mark = backend.phase('tree', mark)
+    else:
+        # Parse the makefile
+        makefile_parser = Parser()
+        makefile_parser.parse_makefile(args.makefile)
+        mark = backend.phase('parse', mark)
+
+        # Fetch the target
+        task = makefile_parser.get_task(args.target)
 
-    # Initialize the start_time and the end_time (for the measures)
-    RED.set(START_TIME, time())
-    RED.set(END_TIME, time())
+        # Wire the dependencies of the targets without recipe straight
+        # to the targets depending on them, they are not worth a message
+        collapsed, edges = collapse_recipeless(task)
 
-    # Parse the makefile
-    makefile_parser = Parser()
-    makefile_parser.parse_makefile(args.makefile)
+        # Create a dependency tree and launch all the leaves
+        # in parrallel
+        dep_tree = DepTree(task)
+        if args.reduce:
+            edges += dep_tree.reduce()
+        if collapsed or edges:
+            print "%d targets without recipe and %d dependencies removed." \
+                  % (collapsed, edges)
+        if cache is not None:
+            cache.store(key, BuildPlan.from_tree(dep_tree))
+        mark = backend.phase('tree', mark)
+    # The root comes after all its dependencies
+    root = dep_tree.nodes[-1]
+    # Not part of the cached tree, the file may change on its own
+    if args.resources is not None:
+        rules = parse_resources(args.resources)
+        for node in dep_tree.nodes:
+            node.needs = task_needs(node.target, rules)
 
-    # Fetch the target
-    task = makefile_parser.get_task(args.target)
+    # Only build the targets whose inputs changed since their last build
+    checker = HashChecker(backend.history) if args.hash else MtimeChecker()
+    if not args.always_make:
+        dep_tree.prune(checker)
+        if not dep_tree.nodes_num:
+            print "'%s' is up to date." % root.target
+            return 0
+        mark = backend.phase('prune', mark)
 
-    # Create a dependency tree and launch all the leaves
-    # in parrallel
-    dep_tree = DepTree(task)
-    RED.set(TASK_NUM, dep_tree.nodes_num)
-    group((run_task.s(leaf) for leaf in dep_tree.leaves))()
-    if not args.async:
-        # Wait for the last task to return
-        RED.blpop(END_LIST)
+    # Prioritize the tasks on the critical path, according to the
+    # durations of the previous builds
+    durations = backend.durations()
+    weights = compute_weights(dep_tree, durations)
+    for node, priority in compute_priorities(weights).items():
+        node.priority = priority
+    # The tiny tasks are sent in batches
+    for node, duration in estimate_durations(dep_tree, durations).items():
+        node.duration = duration
+    leaves = sorted(dep_tree.leaves, key=lambda leaf: -weights[leaf])
+    mark = backend.phase('schedule', mark)
+    status = backend.run(dep_tree, leaves, mark)
+    if args.hash and not args.async and not status:
+        checker.record(dep_tree)
+    return status
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+#
+# this file is part of the SDCA project (team 11)
+#
+
+"""
+This module flattens a dependency tree into a compact build plan
+
+A build plan is a table indexed by integers: for each task it holds
+the target, the command and the indexes of its dependencies and
+children, as compressed sparse rows (see csr.py). The master publishes
+it once per build and the workers only receive a build id and a task
+index. ``plan.task(index)`` is a view of a task of the plan with the
+attributes of a ``makeparse.Task``.
+"""
+
+import json
+import zlib
+from csr import Adjacency
+
+# Bump this each time the serialized layout changes
+PLAN_VERSION = 6
+
+class PlanError(Exception):
+    """
+    Exception to signal an invalid or incompatible build plan.
+    """
+    pass
+
+class BuildPlan(object):
+    """
+    A compact, index based representation of a dependency tree.
+
+    Attributes:
+       targets(list(str)): name of the target of each task.
+       commands(list(str)): command of each task (None if none).
+       dependencies(Adjacency): indexes of the dependencies.
+       children(Adjacency): indexes of the children.
+       priorities(list(int)): Celery priority of each task.
+       durations(list(float)): expected duration of each task, None
+       if unknown.
+       inputs(list(list(str))): targets of all the dependencies of
+       each task, files included.
+       needs(list(dict(str, int))): the resources each task needs,
+       None if it declares none.
+       leaves(list(int)): indexes of the tasks without dependencies.
+    """
+    def __init__(self, targets, commands, dependencies, children=None,
+                 priorities=None, inputs=None, durations=None, leaves=None,
+                 needs=None):
+        self.targets = targets
+        self.commands = commands
+        if not isinstance(dependencies, Adjacency):
+            dependencies = Adjacency.from_lists(dependencies)
+        self.dependencies = dependencies
+        # The children are the reversed dependencies
+        if children is None:
+            children = dependencies.transposed()
+        elif not isinstance(children, Adjacency):
+            children = Adjacency.from_lists(children)
+        self.children = children
+        self.priorities = priorities or [0] * len(targets)
+        self.inputs = inputs or [[] for _ in targets]
+        self.durations = durations or [None] * len(targets)
+        self.needs = needs or [None] * len(targets)
+        if leaves is None:
+            leaves = self.dependencies.isolated()
+        self.leaves = leaves
+
+    def __len__(self):
+        return len(self.targets)
+
+    def task(self, index):
+        """Returns a view of the task at ``index``."""
+        return PlanTask(self, index)
+
+    def tasks(self):
+        """Returns views of all the tasks of the plan."""
+        return [PlanTask(self, index) for index in range(len(self))]
+
+    @classmethod
+    def from_tree(cls, dep_tree):
+        """
+        Builds a plan from a DepTree
+
+        The tasks are numbered in the order of the ``nodes`` attr
+        of the DepTree, from the leaves to the root.
+        """
+        tasks = dep_tree.nodes
+        index_of = dict((task, index) for index, task in enumerate(tasks))
+
+        targets = [task.target for task in tasks]
+        commands = [task.command for task in tasks]
+        dependencies = [[index_of[dep] for dep in task.dependencies]
+                        for task in tasks]
+        children = [[index_of[child] for child in task.children]
+                    for task in tasks]
+        priorities = [task.priority for task in tasks]
+        inputs = [task.inputs for task in tasks]
+        durations = [task.duration for task in tasks]
+        needs = [task.needs for task in tasks]
+        return cls(targets, commands, dependencies, children, priorities,
+                   inputs, durations, needs=needs)
+
+    def dumps(self):
+        """Returns the serialized plan."""
+        table = {
+            'version': PLAN_VERSION,
+            'targets': self.targets,
+            'commands': self.commands,
+            'dependencies': self.dependencies.dumps(),
+            'priorities': self.priorities,
+            'inputs': self.inputs,
+            'durations': self.durations,
+            'needs': self.needs,
+        }
+        return zlib.compress(json.dumps(table, separators=(',', ':')))
+
+    @classmethod
+    def loads(cls, data):
+        """Builds a plan from its serialized form.
+           Raises:
+             PlanError: Raised when the data is not a plan
+             this version can read."""
+        try:
+            table = json.loads(zlib.decompress(data))
+        except (zlib.error, ValueError, TypeError):
+            raise PlanError('Malformed build plan')
+        if table.get('version') != PLAN_VERSION:
+            raise PlanError('Unsupported build plan version: '
+                            + str(table.get('version')))
+        return cls([intern(target.encode('utf-8'))
+                    for target in table['targets']],
+                   table['commands'],
+                   Adjacency.loads(table['dependencies']), None,
+                   table['priorities'], table['inputs'],
+                   table['durations'], needs=table['needs'])
+
+class PlanTask(object):
+    """
+    A task of a build plan, with the attributes of a makeparse.Task
+    read from the plan.
+
+    Attributes:
+       index(int): the index of the task in the plan.
+       _plan(BuildPlan): the plan holding the task.
+    """
+    __slots__ = ('index', '_plan')
+
+    def __init__(self, plan, index):
+        self.index = index
+        self._plan = plan
+
+    @property
+    def target(self):
+        """The name of the target."""
+        return self._plan.targets[self.index]
+
+    @property
+    def command(self):
+        """The command building the target."""
+        return self._plan.commands[self.index]
+
+    @property
+    def dependencies(self):
+        """The views of the dependencies."""
+        return [PlanTask(self._plan, dep)
+                for dep in self._plan.dependencies[self.index]]
+
+    @property
+    def children(self):
+        """The views of the children."""
+        return [PlanTask(self._plan, child)
+                for child in self._plan.children[self.index]]
+
+    @property
+    def priority(self):
+        """The Celery priority of the task."""
+        return self._plan.priorities[self.index]
+
+    @property
+    def duration(self):
+        """The expected duration of the task."""
+        return self._plan.durations[self.index]
+
+    @property
+    def needs(self):
+        """The resources the task needs."""
+        return self._plan.needs[self.index]
+
+    @property
+    def inputs(self):
+        """The targets of all the dependencies, files included."""
+        return self._plan.inputs[self.index]
+
+    def __repr__(self):
+        return self.target
+
+    def __hash__(self):
+        return self.target.__hash__()
+
+    def __eq__(self, other):
+        return isinstance(other, PlanTask) and self.target == other.target
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def is_file_dependency(self):
+        """Returns True if this task represents a file, False otherwise."""
+        return not len(self._plan.dependencies[self.index]) \
+               and not self.command
+
+    def get_dot_node(self):
+        """Returns the node name associated with this task."""
+        return "node" + str(self.index)
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+#
+# this file is part of the SDCA project (team 11)
+#
+
+"""
+This module keeps the dependency trees of the Makefiles on disk
+
+Parsing a large Makefile, checking it for cycles and building its tree
+takes most of the start of the master, even when the Makefile did not
+change since the previous build. The tree is stored as a build plan
+(see plan.py) under the hash of the content of the Makefile and of the
+target, as it is before the up to date targets are pruned. The plan is
+written with ``marshal`` and its compressed sparse rows as raw arrays,
+the children and the leaves included, so that reading it back costs
+little more than reading the file.
+"""
+
+import marshal
+import os
+from array import array
+from csr import Adjacency, TYPECODE
+from hashlib import sha1
+from plan import BuildPlan
+
+# Bump this each time the trees or the layout of the files change
+CACHE_VERSION = 1
+
+# The number of plans kept, the least recently used are removed
+MAX_PLANS = 16
+
+# The size of the blocks of the Makefiles hashed, in bytes
+BLOCK_SIZE = 1024 * 1024
+
+def plan_key(makefile, target, reduced):
+    """Returns the key of the tree of ``target`` in the rest of the
+       stream ``makefile``, ``reduced`` if it went through the
+       transitive reduction. The stream is read by blocks."""
+    digest = sha1()
+    digest.update('%d\0%s\0%d\0' % (CACHE_VERSION, target, reduced))
+    for block in iter(lambda: makefile.read(BLOCK_SIZE), ''):
+        digest.update(block)
+    return digest.hexdigest()
+
+def _bytes_array(data):
+    """Returns the array of the raw bytes ``data``."""
+    values = array(TYPECODE)
+    values.fromstring(data)
+    return values
+
+class PlanCache(object):
+    """
+    A directory of build plans indexed by their key.
+
+    Attributes:
+       directory(str): the directory storing the plans.
+       max_plans(int): the number of plans kept.
+    """
+    def __init__(self, directory, max_plans=MAX_PLANS):
+        self.directory = directory
+        self.max_plans = max_plans
+
+    def load(self, key):
+        """Returns the plan stored under ``key``, None if there is none
+           or if it was written by another version."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as stream:
+                table = marshal.load(stream)
+            # The modification time of a plan is the time of its last use
+            os.utime(path, None)
+        except (IOError, OSError, EOFError, ValueError, TypeError):
+            return None
+        if not isinstance(table, tuple) or table[0] != CACHE_VERSION:
+            return None
+        _, targets, commands, dependencies, children, inputs, leaves = table
+        return BuildPlan(targets, commands,
+                         Adjacency(_bytes_array(dependencies[0]),
+                                   _bytes_array(dependencies[1])),
+                         Adjacency(_bytes_array(children[0]),
+                                   _bytes_array(children[1])),
+                         inputs=inputs, leaves=leaves)
+
+    def store(self, key, plan):
+        """Stores ``plan`` under ``key``, readers never see a partial
+           file."""
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        table = (CACHE_VERSION, plan.targets, plan.commands,
+                 (plan.dependencies.offsets.tostring(),
+                  plan.dependencies.edges.tostring()),
+                 (plan.children.offsets.tostring(),
+                  plan.children.edges.tostring()),
+                 plan.inputs, plan.leaves)
+        path = self._path(key)
+        temporary = '%s.%d.tmp' % (path, os.getpid())
+        with open(temporary, 'wb') as stream:
+            marshal.dump(table, stream)
+        os.rename(temporary, path)
+        self.evict()
+
+    def evict(self):
+        """Removes the least recently used plans over ``max_plans``."""
+        plans = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if not name.endswith('.tmp'):
+                try:
+                    plans.append((os.path.getmtime(path), path))
+                except OSError:
+                    # Evicted by another master
+                    pass
+        plans.sort(reverse=True)
+        for _, path in plans[self.max_plans:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _path(self, key):
+        """Returns the path of the plan stored under ``key``."""
+        return os.path.join(self.directory, key)
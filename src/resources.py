@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+#
+# this file is part of the SDCA project (team 11)
+#
+
+"""
+This module places the tasks according to the resources they need
+
+A blender frame takes every core and gigabytes of memory of a node
+while a ``convert`` or a ``list*.txt`` task takes a fraction of a
+core: if the prefetching of the workers places them blindly, two
+frames end up on the same node while the others are idle. The tasks
+declare what they need in a side file of the Makefile, one rule per
+line, the first rule matching the target applying:
+
+    # patterns: resource=amount ...
+    frame_*.png: cores=8 memory=2G
+    cube.mpg: cores=2 license=1
+
+``cores`` and ``memory`` are the ones of the node, any other name is a
+pool of tokens the workers declare in celeryconfig.py. Each host
+advertises its capacity when its worker starts, and is only chosen
+while its workers are seen alive (see leases.py). The tasks which need
+resources are sent to the host where they fit best (the one left with
+the fewest free cores) and a worker only starts one once its resources
+are reserved on its host, atomically with its dependency counter:
+otherwise the task is sent again a bit later. The other tasks are
+sent as before.
+"""
+
+import json
+import os
+import re
+from fnmatch import fnmatch
+from multiprocessing import cpu_count
+
+# The capacity of each host, host -> JSON object
+CAPACITIES = "resources:capacities"
+# The resources reserved on each host, "host resource" -> amount
+USAGE = "resources:usage"
+
+# What ``Resources.admit`` returns
+STOPPED = -1
+WAIT = 0
+READY = 1
+NOT_READY = 2
+
+# The suffixes of the amounts of memory
+_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+# KEYS[1]: set when the build is stopped
+# KEYS[2]: the dependency counter of the task (see counters.py)
+# KEYS[3]: the resources reserved on each host
+# ARGV[1]: the time to live of the counter, in seconds
+# ARGV[2]: the number of dependencies of the task, 0 if it was counted
+# already
+# ARGV[3]: the host
+# ARGV[4...]: the name, the amount needed and the capacity of the host
+# of each resource
+#
+# Decrements the counter of the task, and when it is the last
+# dependency done reserves the resources of the task on the host. If
+# they do not fit, nothing is changed. Returns -1 if the build is
+# stopped, 0 if the task must wait, 1 if it is ready and its resources
+# reserved, 2 if it is not ready (or was run already).
+ADMIT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return -1
+end
+local counted = ARGV[2] == '0'
+if not counted then
+    local left = tonumber(redis.call('GET', KEYS[2]) or ARGV[2])
+    if left < 1 then
+        return 2
+    end
+    if left > 1 then
+        redis.call('SET', KEYS[2], left - 1, 'EX', ARGV[1])
+        return 2
+    end
+end
+for i = 4, #ARGV, 3 do
+    local used = tonumber(redis.call('HGET', KEYS[3],
+                                     ARGV[3] .. ' ' .. ARGV[i]) or '0')
+    if used + tonumber(ARGV[i + 1]) > tonumber(ARGV[i + 2]) then
+        return 0
+    end
+end
+for i = 4, #ARGV, 3 do
+    redis.call('HINCRBY', KEYS[3], ARGV[3] .. ' ' .. ARGV[i], ARGV[i + 1])
+end
+if not counted then
+    redis.call('SET', KEYS[2], 0, 'EX', ARGV[1])
+end
+return 1
+"""
+
+def parse_amount(amount):
+    """Returns the integer ``amount``, with an optional K, M, G or T
+       suffix."""
+    match = re.match(r'^(\d+)([KMGT]?)$', amount.strip().upper())
+    if match is None:
+        raise ValueError('Invalid amount: ' + amount)
+    return int(match.group(1)) * _UNITS[match.group(2)]
+
+def parse_resources(stream):
+    """Returns the rules of the side file ``stream``: a list of target
+       patterns and the resources they need, as a dict."""
+    rules = []
+    for line in stream:
+        line = line.split('#', 1)[0].strip()
+        if not line:
+            continue
+        patterns, _, needs = line.partition(':')
+        resources = {}
+        for need in needs.split():
+            name, _, amount = need.partition('=')
+            resources[name] = parse_amount(amount)
+        rules.append((patterns.split(), resources))
+    return rules
+
+def task_needs(target, rules):
+    """Returns the resources ``target`` needs according to ``rules``,
+       None if none is declared."""
+    for patterns, resources in rules:
+        if any(fnmatch(target, pattern) for pattern in patterns):
+            return resources or None
+    return None
+
+def local_capacity(tokens):
+    """Returns the capacity of this host: its cores, its memory in
+       bytes and the ``tokens`` of each pool it holds."""
+    capacity = dict(tokens)
+    capacity['cores'] = cpu_count()
+    capacity['memory'] = os.sysconf('SC_PHYS_PAGES') \
+                         * os.sysconf('SC_PAGE_SIZE')
+    return capacity
+
+def live_capacities(capacities, seen, now, timeout):
+    """Returns the ``capacities`` of the hosts ``seen`` alive, a dict of
+       the time each host was last seen, less than ``timeout`` seconds
+       before ``now``."""
+    return dict((host, capacity) for host, capacity in capacities.items()
+                if now - seen.get(host, 0.0) <= timeout)
+
+def fits(needs, capacity, used):
+    """Returns True if ``needs`` fit in ``capacity`` besides ``used``."""
+    return all(used.get(name, 0) + amount <= capacity.get(name, 0)
+               for name, amount in needs.items())
+
+def choose_worker(needs, capacities, usage):
+    """
+    Returns the host where ``needs`` fit best, the one left with the
+    fewest free cores, given the ``capacities`` and the ``usage`` of
+    each host
+
+    If they fit nowhere right now, returns the least used host where
+    they fit once it is idle, and None if there is none.
+    """
+    best = None
+    waiting = None
+    for host in sorted(capacities):
+        capacity = capacities[host]
+        used = usage.get(host, {})
+        if fits(needs, capacity, used):
+            left = capacity.get('cores', 0) - used.get('cores', 0) \
+                   - needs.get('cores', 0)
+            if best is None or left < best[0]:
+                best = (left, host)
+        elif fits(needs, capacity, {}):
+            busy = used.get('cores', 0)
+            if waiting is None or busy < waiting[0]:
+                waiting = (busy, host)
+    if best is not None:
+        return best[1]
+    return None if waiting is None else waiting[1]
+
+class Resources(object):
+    """
+    The capacities of the hosts and the resources reserved on them,
+    shared by the builds.
+
+    Attributes:
+       ttl(int): the time to live of the counters, in seconds.
+       _red(Redis): the database storing the resources.
+       _admit(Script): the script counting and admitting a task.
+    """
+    def __init__(self, red, ttl):
+        self.ttl = ttl
+        self._red = red
+        self._admit = red.register_script(ADMIT)
+
+    def advertise(self, host, capacity):
+        """Records the ``capacity`` of ``host``. Its worker just
+           started, the resources reserved by its previous run are
+           released."""
+        pipe = self._red.pipeline()
+        pipe.hset(CAPACITIES, host, json.dumps(capacity))
+        for name in capacity:
+            pipe.hdel(USAGE, '%s %s' % (host, name))
+        pipe.execute()
+
+    def capacities(self):
+        """Returns the capacity of each host."""
+        return dict((host, json.loads(capacity)) for host, capacity
+                    in self._red.hgetall(CAPACITIES).items())
+
+    def usage(self):
+        """Returns the resources reserved on each host."""
+        usage = {}
+        for key, amount in self._red.hgetall(USAGE).items():
+            host, name = key.rsplit(' ', 1)
+            usage.setdefault(host, {})[name] = int(amount)
+        return usage
+
+    def admit(self, keys, host, target, dependencies_num, needs, capacity):
+        """Counts one more dependency of ``target`` done and reserves its
+           ``needs`` on ``host`` of ``capacity`` if it is ready. Returns
+           READY, NOT_READY, WAIT (nothing changed, the resources are
+           missing) or STOPPED. A ``dependencies_num`` of None means the
+           task was counted already, the resources are only reserved."""
+        args = [self.ttl, 0 if dependencies_num is None
+                else dependencies_num or 1, host]
+        for name in sorted(needs):
+            args.extend([name, needs[name], capacity.get(name, 0)])
+        return self._admit(keys=[keys.stopped, keys.sem(target), USAGE],
+                           args=args)
+
+    def release(self, host, needs):
+        """Releases the ``needs`` reserved on ``host``."""
+        pipe = self._red.pipeline()
+        for name, amount in needs.items():
+            pipe.hincrby(USAGE, '%s %s' % (host, name), -amount)
+        pipe.execute()
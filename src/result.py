@@ -4,24 +4,33 @@
 #
 
 """
-This module allows a user to fetch the last execution time of a
-makefile
+This module allows a user to fetch the execution time of a build
+of a makefile
 
 Please make sure the execution actually ended before running this
 """
 
-from work import RED, START_TIME, END_TIME
+from buildkeys import BuildKeys, LAST_BUILD
+from work import RED
 import sys
 
-def main(result_file):
+def main(result_file, build_id=None):
     """
-    Appends the last execution time of a makefile to ``result_file``
+    Appends the execution time of the build ``build_id`` to
+    ``result_file``, by default the one of the last build started
 
     Please make sure the execution actually ended before running this
     """
+    if build_id is None:
+        build_id = RED.get(LAST_BUILD)
+    keys = BuildKeys(build_id)
+    start_time = RED.get(keys.start_time)
+    if start_time is None:
+        print "No build %s, or it expired." % build_id
+        return
     with open(result_file, 'a+') as stream:
-        duration = float(RED.get(END_TIME)) - float(RED.get(START_TIME))
+        duration = float(RED.get(keys.end_time)) - float(start_time)
         stream.write(str(duration) + "\n")
 
 if __name__ == '__main__':
-    main(sys.argv[1])
+    main(*sys.argv[1:3])
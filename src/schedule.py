@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+#
+# this file is part of the SDCA project (team 11)
+#
+
+"""
+This module computes the order in which the ready tasks should run
+
+Each task is weighted by the longest path from it to the root of the
+tree, using the durations of the previous runs when they are known.
+The tasks on the critical path get the highest Celery priorities so
+that a long chain does not start after all the short tasks. The tasks
+expected to be much shorter than the cost of a message are sent
+together, in batches.
+"""
+
+# The number of priority levels of the Celery queue, the highest
+# priority is ``PRIORITY_LEVELS - 1``
+PRIORITY_LEVELS = 10
+
+def estimate_durations(dep_tree, durations):
+    """
+    Returns the expected duration of every task of ``dep_tree``
+
+    The duration of a task is its ``durations`` at the previous build,
+    the duration of a task never run before is the mean of the known
+    ones (1 second if none is known).
+    """
+    known = [durations[node.target] for node in dep_tree.nodes
+             if node.target in durations]
+    default = sum(known) / len(known) if known else 1.0
+    return dict((node, durations.get(node.target, default))
+                for node in dep_tree.nodes)
+
+def compute_weights(dep_tree, durations):
+    """
+    Returns the weight of every task of ``dep_tree``
+
+    The weight of a task is its expected duration (see
+    ``estimate_durations``) plus the highest weight of its children.
+    """
+    expected = estimate_durations(dep_tree, durations)
+    weights = {}
+    # The nodes are sorted from the leaves to the root, so the
+    # children of a task are weighted before the task itself
+    for node in reversed(dep_tree.nodes):
+        remaining = max([weights[child] for child in node.children] or [0])
+        weights[node] = expected[node] + remaining
+    return weights
+
+def compute_priorities(weights, levels=PRIORITY_LEVELS):
+    """
+    Returns the Celery priority of every task from its weight
+
+    The distinct weights are ranked and the ranks are spread evenly on
+    the ``levels`` priorities, so that the priorities do not depend on
+    the scale of the durations.
+    """
+    ranked = sorted(set(weights.values()))
+    rank_of = dict((weight, rank) for rank, weight in enumerate(ranked))
+    priorities = {}
+    for task, weight in weights.items():
+        priorities[task] = rank_of[weight] * levels // len(ranked)
+    return priorities
+
+def make_batches(durations, max_duration, max_size, max_time):
+    """
+    Returns the tasks to send in each message, as lists of positions
+    in ``durations``, the expected durations of the tasks to send
+
+    The tasks expected to last ``max_duration`` seconds or less are
+    grouped, in order, up to ``max_size`` tasks and ``max_time``
+    seconds per batch. The other ones, and the ones whose duration is
+    unknown (None), are sent alone.
+    """
+    batches = []
+    batch = []
+    batch_time = 0.0
+    for position, duration in enumerate(durations):
+        if duration is None or duration > max_duration or max_size <= 1:
+            batches.append([position])
+            continue
+        if batch and (len(batch) >= max_size
+                      or batch_time + duration > max_time):
+            batches.append(batch)
+            batch = []
+            batch_time = 0.0
+        batch.append(position)
+        batch_time += duration
+    if batch:
+        batches.append(batch)
+    return batches
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+#
+# this file is part of the SDCA project (team 11)
+#
+
+"""
+This module predicts the makespan of a build on a cluster of any size
+
+Measuring how a build scales means reserving the nodes again and
+again. The simulator replays instead how the workers run the tree of a
+Makefile, event by event: the messages wait ``dispatch`` seconds in
+the broker before a worker can take them, the highest priority first,
+each message costs a worker its round trips to Redis (``redis``
+seconds each) to update the dependency counters and take the leases,
+and each task done costs the ones marking it done and sending its
+children. The commands last their duration at the previous build,
+taken from the CSV of ``tracing.py --csv`` or from Redis, the tasks
+never run lasting the mean of the known ones.
+
+The policies replayed are the ones of work.py: ``fanout`` sends each
+child alone, ``batch`` (the default settings) sends the short ones
+together (see schedule.py), ``local`` also keeps the child on the
+critical path on the worker, like ``DMAKE_LOCAL_CHILDREN=1``, and
+``fifo`` sends each child alone without priorities. The predictions
+are printed as the CSV read by ``measures/plot.R``:
+
+    python simulate.py [-f Makefile] [--durations tasks.csv | --history]
+                       [-c 1,2,4,8] [-p batch] [target] > perf.csv
+"""
+
+import csv
+import heapq
+import sys
+from argparse import ArgumentParser, FileType
+from collections import deque
+from graphopt import collapse_recipeless
+from makeparse import Parser
+from master import DepTree
+from schedule import compute_priorities, compute_weights, \
+                     estimate_durations, make_batches
+
+POLICIES = ('fanout', 'batch', 'local', 'fifo')
+
+# The round trips to Redis of a message before its tasks run: the
+# dependency counters and the leases
+COUNT_TRIPS = 2
+# The round trips to Redis of a task done: its lease, its trace, the
+# locality of its target and the count of the tasks done
+DONE_TRIPS = 4
+
+# The kinds of events, in the order they are handled at the same time
+_DONE = 0
+_FREE = 1
+_ARRIVE = 2
+
+def read_durations(stream):
+    """Returns the duration of each target of the CSV ``stream``, with a
+       ``duration`` column or the ``command`` one written by
+       ``tracing.py --csv``. The tasks cached, failed or not finished
+       are left out, they last the mean of the others."""
+    durations = {}
+    for row in csv.DictReader(stream):
+        duration = row.get('duration', row.get('command'))
+        if duration is None or row.get('cached') == '1' \
+                or row.get('exit_code', '0') != '0':
+            continue
+        durations[row['target']] = float(duration)
+    return durations
+
+class Simulator(object):
+    """
+    Replays the build of a dependency tree.
+
+    Attributes:
+       policy(str): how the children are sent, among POLICIES.
+       dispatch(float): the time a message takes through the broker,
+       in seconds.
+       redis(float): the time of a round trip to Redis, in seconds.
+       batch_max_duration(float): the longest task sent in a batch.
+       batch_size(int): the largest number of tasks of a batch.
+       batch_time(float): the longest duration of a batch.
+       _nodes(list(Task)): the tasks, sorted from the leaves to the
+       root.
+       _leaves(set(Task)): the tasks without dependencies.
+       _duration(dict(Task, float)): the duration of each command.
+       _priority(dict(Task, int)): the priority of each task.
+       _sequence(int): the number of events and messages so far, which
+       orders the ones at the same time.
+    """
+    def __init__(self, dep_tree, durations, policy='batch', dispatch=0.0,
+                 redis=0.0, batch_max_duration=0.05, batch_size=32,
+                 batch_time=0.5):
+        self.policy = policy
+        self.dispatch = dispatch
+        self.redis = redis
+        self.batch_max_duration = batch_max_duration
+        self.batch_size = batch_size
+        self.batch_time = batch_time
+        self._nodes = dep_tree.nodes
+        self._leaves = dep_tree.leaves
+        expected = estimate_durations(dep_tree, durations)
+        # A target without recipe only groups its dependencies
+        self._duration = dict((node, expected[node] if node.command else 0.0)
+                              for node in dep_tree.nodes)
+        self._priority = compute_priorities(compute_weights(dep_tree,
+                                                            durations))
+        self._sequence = 0
+
+    def sequential_time(self):
+        """Returns the time of the commands run one after the other."""
+        return sum(self._duration.values())
+
+    def run(self, workers):
+        """Returns the makespan of the build on ``workers`` worker
+           processes, from the time the master sends the leaves to the
+           end of the last task."""
+        # The dependencies left of each task
+        left = dict((node, max(len(node.dependencies), 1))
+                    for node in self._nodes)
+        events = []
+        # The messages in the broker, and the tasks left to run by each
+        # busy worker
+        queue = []
+        jobs = {}
+        idle = range(workers)
+        self._sequence = 0
+        self._send(events, 0.0, sorted(self._leaves,
+                                       key=lambda leaf:
+                                       -self._priority[leaf]))
+        end = 0.0
+        while events:
+            now, kind, _, payload = heapq.heappop(events)
+            if kind == _ARRIVE:
+                heapq.heappush(queue, payload)
+            elif kind == _FREE:
+                idle.append(payload)
+            else:
+                worker, node = payload
+                now += DONE_TRIPS * self.redis
+                end = max(end, now)
+                children = sorted(node.children,
+                                  key=lambda child: -self._priority[child])
+                if self.policy == 'local' and children:
+                    # Counted by the worker once the others are sent
+                    self._send(events, now, children[1:])
+                    now += COUNT_TRIPS * self.redis
+                    left[children[0]] -= 1
+                    if not left[children[0]]:
+                        jobs[worker].appendleft(children[0])
+                else:
+                    self._send(events, now, children)
+                if self._next(events, now, worker, jobs[worker]):
+                    continue
+                del jobs[worker]
+                idle.append(worker)
+            while idle and queue:
+                tasks = heapq.heappop(queue)[-1]
+                worker = idle.pop()
+                start = now + COUNT_TRIPS * self.redis
+                ready = deque()
+                for task in tasks:
+                    left[task] -= 1
+                    if not left[task]:
+                        ready.append(task)
+                jobs[worker] = ready
+                if not self._next(events, start, worker, ready):
+                    # None of them was ready
+                    del jobs[worker]
+                    self._push(events, start, _FREE, worker)
+        return end
+
+    def _next(self, events, now, worker, ready):
+        """Starts at ``now`` the next of the ``ready`` tasks of
+           ``worker``, returns False if there is none."""
+        if not ready:
+            return False
+        node = ready.popleft()
+        self._push(events, now + self._duration[node], _DONE, (worker, node))
+        return True
+
+    def _send(self, events, now, tasks):
+        """Sends ``tasks`` at ``now``, sorted by priority, in messages
+           according to the policy."""
+        if not tasks:
+            return
+        if self.policy == 'fanout' or self.policy == 'fifo':
+            batches = [[task] for task in tasks]
+        else:
+            batches = [[tasks[position] for position in positions]
+                       for positions in make_batches(
+                           [self._duration[task] for task in tasks],
+                           self.batch_max_duration, self.batch_size,
+                           self.batch_time)]
+        for batch in batches:
+            self._sequence += 1
+            if self.policy == 'fifo':
+                message = (self._sequence, batch)
+            else:
+                message = (-max(self._priority[task] for task in batch),
+                           self._sequence, batch)
+            self._push(events, now + self.dispatch, _ARRIVE, message)
+
+    def _push(self, events, time, kind, payload):
+        """Adds an event of ``kind`` at ``time``."""
+        self._sequence += 1
+        heapq.heappush(events, (time, kind, self._sequence, payload))
+
+def main():
+    """Prints the predicted makespans of a build."""
+    parser = ArgumentParser(description='Distributed make simulator')
+    parser.add_argument('-f', '--file', dest='makefile', default='Makefile',
+                        type=FileType('r'), help='the file to use')
+    parser.add_argument('--durations', type=FileType('r'),
+                        help='the durations of the tasks, as a CSV (see '
+                        'tracing.py --csv)')
+    parser.add_argument('--history', action='store_true',
+                        help='read the durations of the last builds from '
+                        'Redis')
+    parser.add_argument('-c', '--cores', default='1,2,4,8,16,32',
+                        help='the numbers of worker processes')
+    parser.add_argument('-p', '--policy', choices=POLICIES, default='batch',
+                        help='how the children of a task are sent')
+    parser.add_argument('--dispatch', type=float, default=0.005,
+                        help='the time of a message through the broker')
+    parser.add_argument('--redis', type=float, default=0.0005,
+                        help='the time of a round trip to Redis')
+    parser.add_argument('target', nargs='?', default="",
+                        help='the makefile\'s target to create')
+    args = parser.parse_args()
+
+    makefile_parser = Parser()
+    makefile_parser.parse_makefile(args.makefile)
+    task = makefile_parser.get_task(args.target)
+    collapse_recipeless(task)
+    dep_tree = DepTree(task)
+    durations = {}
+    if args.durations is not None:
+        durations = read_durations(args.durations)
+    elif args.history:
+        # Imported here, only the history needs Celery and Redis
+        from work import HISTORY, DURATIONS
+        durations = dict((target, float(duration)) for target, duration
+                         in HISTORY.hgetall(DURATIONS).items())
+    simulator = Simulator(dep_tree, durations, args.policy, args.dispatch,
+                          args.redis)
+
+    sequential = simulator.sequential_time()
+    writer = csv.writer(sys.stdout)
+    writer.writerow(['cores', 'times', 'speedup', 'efficiency'])
+    for cores in [int(cores) for cores in args.cores.split(',')]:
+        makespan = simulator.run(cores)
+        speedup = sequential / makespan if makespan else 1.0
+        writer.writerow([cores, '%f' % makespan, '%f' % speedup,
+                         '%f' % (speedup / cores)])
+
+if __name__ == '__main__':
+    main()
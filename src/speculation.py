@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+#
+# this file is part of the SDCA project (team 11)
+#
+
+"""
+This module runs a backup copy of the tasks lagging behind
+
+At the end of a build the last tasks may run on a slow or overloaded
+node while the others are idle. Once no task waits in the queues any
+more, the master sends a second copy of each task running for much
+longer than at its last build, and the first copy done wins: the
+other one is killed by the heartbeat of its worker (see leases.py).
+
+So that two copies never write the same file, each copy writes the
+target to a temporary file of its own, next to it, in place of the
+target in the command. The copy which wins renames it to the target,
+which is atomic, the other one removes it. A task whose command does
+not name its target is never copied.
+"""
+
+import os
+import re
+from time import time
+
+# KEYS[1]: the copy of each target which won
+# KEYS[2]: the leases of the build
+# ARGV[1]: the time to live of the keys, in seconds
+# ARGV[2]: the owner of the copy
+# ARGV[3]: the target
+#
+# The first copy done wins and drops the lease of the task, so that
+# the other copy is killed. Returns 1 for the first copy, 0 otherwise.
+COMMIT = """
+if redis.call('HSETNX', KEYS[1], ARGV[3], ARGV[2]) == 0 then
+    return 0
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('HDEL', KEYS[2], ARGV[3])
+return 1
+"""
+
+# What may surround a file name in a command
+_NAME_CHARS = r'\w./+-'
+
+def temporary_output(target, owner):
+    """Returns the file the copy of ``owner`` writes ``target`` to, in
+       the same directory so that it can be renamed to the target."""
+    return "%s.dmake-%s" % (target, re.sub(r'[^\w.-]', '-', owner))
+
+def rewrite_command(command, target, output):
+    """Returns ``command`` writing ``output`` instead of ``target``,
+       None if the command does not name its target."""
+    pattern = re.compile(r'(?<![%s])%s(?![%s])' % (_NAME_CHARS,
+                                                   re.escape(target),
+                                                   _NAME_CHARS))
+    if not pattern.search(command):
+        return None
+    return pattern.sub(output.replace('\\', '\\\\'), command)
+
+def stragglers(started, durations, now, factor, minimum):
+    """Returns the targets running since ``started``, a dict, for more
+       than ``factor`` times their expected ``durations`` and at least
+       ``minimum`` seconds, the latest first. The targets whose duration
+       is unknown are not stragglers."""
+    late = []
+    for target, since in started.items():
+        duration = durations.get(target)
+        if duration is None:
+            continue
+        overrun = now - since - max(minimum, factor * duration)
+        if overrun > 0:
+            late.append((-overrun, target))
+    return [target for _, target in sorted(late)]
+
+def is_waiting(nodes, finished, started):
+    """Returns True if a task of ``nodes``, a dict, is ready, all its
+       dependencies being ``finished``, but neither finished nor
+       ``started``: a worker will take it instead of being idle."""
+    for target, node in nodes.items():
+        if target in finished or target in started:
+            continue
+        if all(dep.target in finished for dep in node.dependencies):
+            return True
+    return False
+
+def publish_output(output, target):
+    """Renames ``output`` to ``target`` if the command wrote it."""
+    if os.path.lexists(output):
+        os.rename(output, target)
+
+def remove_output(output):
+    """Removes ``output`` if the command wrote it."""
+    if os.path.lexists(output):
+        os.remove(output)
+
+class Speculation(object):
+    """
+    The copies of the tasks of the builds.
+
+    Attributes:
+       ttl(int): the time to live of the keys, in seconds.
+       _red(Redis): the database storing the copies.
+       _commit(Script): the script choosing the copy which wins.
+    """
+    def __init__(self, red, ttl):
+        self.ttl = ttl
+        self._red = red
+        self._commit = red.register_script(COMMIT)
+
+    def started(self, keys, targets):
+        """Records that the tasks of ``targets`` start now."""
+        if not targets:
+            return
+        now = time()
+        pipe = self._red.pipeline()
+        pipe.hmset(keys.running, dict((target, now) for target in targets))
+        pipe.expire(keys.running, self.ttl)
+        pipe.execute()
+
+    def running(self, keys):
+        """Returns when each task running started, as a dict."""
+        return dict((target, float(since)) for target, since
+                    in self._red.hgetall(keys.running).items())
+
+    def commit(self, keys, target, owner):
+        """Returns True if the copy of ``owner`` is the first one done,
+           in which case its output becomes the target."""
+        return bool(self._commit(keys=[keys.committed, keys.leases],
+                                 args=[self.ttl, owner, target]))
+
+    def winner(self, keys, target):
+        """Returns the owner of the copy of ``target`` which won, None
+           if no copy is done yet."""
+        return self._red.hget(keys.committed, target)
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+#
+# this file is part of the SDCA project (team 11)
+#
+
+"""
+This module records what happened to each task of a build
+
+For each task run, the worker records when it was sent, when the
+worker received it, when the dependency counter answered, when the
+command finished and when its children were sent, with the worker,
+the exit code and the bytes of its inputs read on the host which built
+them or on another one (see locality.py). The records of a build are
+kept in one Redis hash and can be exported as a Chrome trace
+(chrome://tracing, Perfetto) or as a CSV, or summarized:
+
+    python tracing.py [-b build_id] [--chrome trace.json] [--csv tasks.csv]
+"""
+
+import csv
+import json
+from argparse import ArgumentParser, FileType
+
+# The fields of a record, in the order they are stored
+FIELDS = ('target', 'worker', 'pid', 'parent', 'enqueued', 'started',
+          'counted', 'finished', 'dispatched', 'exit_code', 'cached',
+          'local_bytes', 'remote_bytes')
+
+class Tracer(object):
+    """
+    Stores the records of the tasks of the builds.
+
+    Attributes:
+       ttl(int): the time to live of the records, in seconds.
+       _red(Redis): the database storing the records.
+    """
+    def __init__(self, red, ttl):
+        self.ttl = ttl
+        self._red = red
+
+    def record(self, keys, report):
+        """Records the task described by ``report`` for the build of
+           ``keys``, in a single round trip."""
+        record = [report.get(field) for field in FIELDS]
+        pipe = self._red.pipeline(transaction=False)
+        pipe.hset(keys.traces, report['target'],
+                  json.dumps(record, separators=(',', ':')))
+        pipe.expire(keys.traces, self.ttl)
+        pipe.execute()
+
+    def record_phase(self, keys, phase, duration):
+        """Records the ``duration`` of a ``phase`` of the master."""
+        pipe = self._red.pipeline(transaction=False)
+        pipe.hset(keys.phases, phase, duration)
+        pipe.expire(keys.phases, self.ttl)
+        pipe.execute()
+
+    def load(self, keys):
+        """Returns the records of the build of ``keys``, as dicts,
+           sorted by start time."""
+        records = [dict(zip(FIELDS, json.loads(record)))
+                   for record in self._red.hvals(keys.traces)]
+        records.sort(key=lambda record: record['started'])
+        return records
+
+    def load_phases(self, keys):
+        """Returns the durations of the phases of the master."""
+        return dict((phase, float(duration)) for phase, duration
+                    in self._red.hgetall(keys.phases).items())
+
+def _span(record, begin, end):
+    """Returns the time between two fields of ``record``, 0 if one of
+       them is missing."""
+    if record.get(begin) is None or record.get(end) is None:
+        return 0.0
+    return max(record[end] - record[begin], 0.0)
+
+def write_chrome_trace(records, stream):
+    """Writes ``records`` to ``stream`` in the Chrome trace event format.
+
+       Each worker is a process and each of its worker processes a
+       thread. The time spent in the queue is on a separate track."""
+    origin = min([record['enqueued'] or record['started']
+                  for record in records] or [0])
+    events = []
+    for record in records:
+        worker = record['worker']
+        for name, begin, end in (('counter', 'started', 'counted'),
+                                 ('command', 'counted', 'finished'),
+                                 ('dispatch', 'finished', 'dispatched')):
+            if record.get(begin) is None or record.get(end) is None:
+                continue
+            events.append({'name': record['target'], 'cat': name,
+                           'ph': 'X', 'pid': worker, 'tid': record['pid'],
+                           'ts': (record[begin] - origin) * 1e6,
+                           'dur': _span(record, begin, end) * 1e6,
+                           'args': {'exit_code': record['exit_code'],
+                                    'cached': record['cached'],
+                                    'parent': record['parent']}})
+        if record.get('enqueued') is not None:
+            events.append({'name': record['target'], 'cat': 'queue',
+                           'ph': 'X', 'pid': 'queue', 'tid': worker,
+                           'ts': (record['enqueued'] - origin) * 1e6,
+                           'dur': _span(record, 'enqueued',
+                                        'started') * 1e6})
+    json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, stream)
+
+def write_csv(records, stream):
+    """Writes a summary line per task of ``records`` to ``stream``."""
+    writer = csv.writer(stream)
+    writer.writerow(['target', 'worker', 'queue_wait', 'counter_wait',
+                     'command', 'dispatch', 'exit_code', 'cached'])
+    for record in records:
+        writer.writerow([record['target'], record['worker'],
+                         '%f' % _span(record, 'enqueued', 'started'),
+                         '%f' % _span(record, 'started', 'counted'),
+                         '%f' % _span(record, 'counted', 'finished'),
+                         '%f' % _span(record, 'finished', 'dispatched'),
+                         record['exit_code'], int(bool(record['cached']))])
+
+def critical_path(records):
+    """Returns the records of the chain of tasks that ended last: the
+       last task, the dependency that made it ready, and so on."""
+    by_target = dict((record['target'], record) for record in records)
+    ended = [record for record in records if record['finished'] is not None]
+    if not ended:
+        return []
+    path = [max(ended, key=lambda record: record['finished'])]
+    while path[-1]['parent'] in by_target and len(path) <= len(records):
+        path.append(by_target[path[-1]['parent']])
+    path.reverse()
+    return path
+
+def worker_utilization(records):
+    """Returns the fraction of the build each worker spent running
+       commands, for each worker: the time of its commands divided by
+       the span of the build times its number of processes."""
+    if not records:
+        return {}
+    begin = min(record['started'] for record in records)
+    end = max(record['dispatched'] or record['finished'] or record['started']
+              for record in records)
+    span = max(end - begin, 1e-9)
+    busy = {}
+    processes = {}
+    for record in records:
+        worker = record['worker']
+        busy[worker] = busy.get(worker, 0.0) + _span(record, 'counted',
+                                                     'finished')
+        processes.setdefault(worker, set()).add(record['pid'])
+    return dict((worker, busy[worker] / (span * len(processes[worker])))
+                for worker in busy)
+
+def scheduling_overhead(records):
+    """Returns the mean time per task spent outside of the commands:
+       in the queue, in the counter and sending the children."""
+    overhead = {'queue_wait': 0.0, 'counter_wait': 0.0, 'dispatch': 0.0}
+    if not records:
+        return overhead
+    for record in records:
+        overhead['queue_wait'] += _span(record, 'enqueued', 'started')
+        overhead['counter_wait'] += _span(record, 'started', 'counted')
+        overhead['dispatch'] += _span(record, 'finished', 'dispatched')
+    return dict((name, total / len(records))
+                for name, total in overhead.items())
+
+def input_locality(records):
+    """Returns the bytes of the inputs of the tasks read on the host
+       which built them and on another host."""
+    return {'local': sum(record.get('local_bytes') or 0
+                         for record in records),
+            'remote': sum(record.get('remote_bytes') or 0
+                          for record in records)}
+
+def print_report(records, phases):
+    """Prints the critical path, the utilization of the workers, the
+       scheduling overhead and the locality of the inputs of a build."""
+    print 'Master phases:'
+    for phase, duration in sorted(phases.items()):
+        print '  %-12s %10.3fs' % (phase, duration)
+    print 'Critical path:'
+    for record in critical_path(records):
+        print '  %-30s %10.3fs on %s' % (record['target'],
+                                         _span(record, 'counted', 'finished'),
+                                         record['worker'])
+    print 'Worker utilization:'
+    for worker, ratio in sorted(worker_utilization(records).items()):
+        print '  %-30s %9.1f%%' % (worker, ratio * 100)
+    print 'Scheduling overhead per task:'
+    for name, duration in sorted(scheduling_overhead(records).items()):
+        print '  %-12s %10.6fs' % (name, duration)
+    print 'Inputs read:'
+    for name, size in sorted(input_locality(records).items()):
+        print '  %-12s %10d bytes' % (name, size)
+
+def main():
+    """Exports and summarizes the records of a build."""
+    # Imported here, work imports this module
+    from buildkeys import BuildKeys, BUILD_TTL, LAST_BUILD
+    from work import RED
+
+    parser = ArgumentParser(description='Distributed make traces')
+    parser.add_argument('-b', '--build', help='the build id (default: last)')
+    parser.add_argument('--chrome', type=FileType('w'),
+                        help='write a Chrome / Perfetto trace')
+    parser.add_argument('--csv', type=FileType('w'),
+                        help='write a CSV summary per task')
+    args = parser.parse_args()
+
+    keys = BuildKeys(args.build or RED.get(LAST_BUILD))
+    tracer = Tracer(RED, BUILD_TTL)
+    records = tracer.load(keys)
+    if args.chrome:
+        write_chrome_trace(records, args.chrome)
+    if args.csv:
+        write_csv(records, args.csv)
+    print_report(records, tracer.load_phases(keys))
+
+if __name__ == '__main__':
+    main()
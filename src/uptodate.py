@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+#
+# this file is part of the SDCA project (team 11)
+#
+
+"""
+This module tells whether a target has to be built again
+
+Like make, a target is up to date when its file exists and none of its
+inputs changed since it was built. The change is detected with the
+modification times or, when they cannot be trusted (NFS clocks), with
+the content hashes recorded at the end of the previous build.
+"""
+
+import json
+from hashlib import sha1
+from os import stat
+
+# Content hashes of the inputs of each target, at its last build
+INPUT_HASHES = "input_hashes"
+
+def mtime(path):
+    """Returns the modification time of ``path``, None if it does
+       not exist."""
+    try:
+        return stat(path).st_mtime
+    except OSError:
+        return None
+
+def file_hash(path, block_size=1 << 20):
+    """Returns the content hash of ``path``, None if it does not
+       exist."""
+    digest = sha1()
+    try:
+        with open(path, 'rb') as stream:
+            block = stream.read(block_size)
+            while block:
+                digest.update(block)
+                block = stream.read(block_size)
+    except IOError:
+        return None
+    return digest.hexdigest()
+
+class MtimeChecker(object):
+    """
+    Compares the modification time of a target with its inputs'.
+    """
+    def is_up_to_date(self, target, inputs):
+        """Returns True if ``target`` exists and is newer than all its
+           ``inputs``, False otherwise."""
+        target_mtime = mtime(target)
+        if target_mtime is None:
+            return False
+        for path in inputs:
+            input_mtime = mtime(path)
+            if input_mtime is None or input_mtime > target_mtime:
+                return False
+        return True
+
+class HashChecker(object):
+    """
+    Compares the content of the inputs of a target with their content
+    at the last build of the target.
+
+    Attributes:
+       _red(Redis): the database keeping the hashes between builds.
+    """
+    def __init__(self, red):
+        self._red = red
+
+    def is_up_to_date(self, target, inputs):
+        """Returns True if ``target`` exists and the hashes of its
+           ``inputs`` are the recorded ones, False otherwise."""
+        if mtime(target) is None:
+            return False
+        recorded = self._red.hget(INPUT_HASHES, target)
+        if recorded is None:
+            return False
+        recorded = json.loads(recorded)
+        if sorted(recorded) != sorted(inputs):
+            return False
+        return all(file_hash(path) == recorded[path] for path in inputs)
+
+    def record(self, dep_tree):
+        """Records the hashes of the inputs of every task of
+           ``dep_tree``, once they are built."""
+        hashes = {}
+        for node in dep_tree.nodes:
+            hashes[node.target] = json.dumps(
+                dict((path, file_hash(path))
+                     for path in node.inputs))
+        if hashes:
+            self._red.hmset(INPUT_HASHES, hashes)
@@ -7,90 +7,701 @@
 This module contains the code used by the slave nodes
 """
 
+from buildkeys import BuildKeys, BUILD_TTL
 from celery import Celery, group
-from celeryconfig import MASTER_NODE
-from celery.signals import task_postrun
+from cache import ResultCache
+from celeryconfig import MASTER_NODE, CACHE_DIR, CACHE_SIZE, \
+                         CACHE_ENVIRONMENT, LOCALITY, LOCALITY_MAX_QUEUED, \
+                         BATCH_MAX_DURATION, BATCH_SIZE, BATCH_TIME, \
+                         LOCAL_CHILDREN, LEASE_TIME, LEASE_HEARTBEAT, \
+                         TIMEOUT_FACTOR, TIMEOUT_MIN, SPECULATION_FACTOR, \
+                         WORKER_TOKENS, RESOURCES_RETRY
+from counters import Counters
+from events import BuildEvents
+from executor import get_executor
+from leases import Heartbeat, HostHeartbeat, Leases, task_timeout
+from celery.signals import task_postrun, celeryd_after_setup
+from collections import OrderedDict, deque, namedtuple
+from locality import Locality, local_queue
 # Import the Task so that it can be deserialized by celery
 from makeparse import Task
-from os import system
+from os import getpid
+from os.path import getsize, isfile
+from plan import BuildPlan
 from redis import Redis
+from resources import Resources, choose_worker, live_capacities, \
+                      local_capacity, READY, WAIT
+from schedule import make_batches
+from socket import gethostname
+from speculation import Speculation, temporary_output, rewrite_command, \
+                        publish_output, remove_output
 from time import time
+from tracing import Tracer
 
 APP = Celery()
 # Configure Celery
 APP.config_from_object('celeryconfig')
 
-START_TIME = "start_time"
-END_TIME = "end_time"
-
-TASK_NUM = "task_num"
-END_LIST = "endlist"
-SLAVE_LOCK = "slavelock"
+# Duration of the last run of each target
+DURATIONS = "durations"
+# Hits and misses of the result caches of all the workers
+CACHE_STATS = "cache_stats"
 
 RED = Redis(host=MASTER_NODE)
+# What is learnt from one build to be used by the next ones, apart
+# from the keys of the builds
+HISTORY = Redis(host=MASTER_NODE, db=2)
+
+if CACHE_DIR is None:
+    CACHE = None
+else:
+    CACHE = ResultCache(CACHE_DIR, CACHE_SIZE, CACHE_ENVIRONMENT)
+COUNTERS = Counters(RED, BUILD_TTL)
+TRACER = Tracer(RED, BUILD_TTL)
+LOCALITIES = Locality(RED, BUILD_TTL)
+EVENTS = BuildEvents(RED, BUILD_TTL)
+LEASES = Leases(RED, BUILD_TTL, LEASE_TIME)
+SPECULATION = Speculation(RED, BUILD_TTL)
+RESOURCES = Resources(RED, BUILD_TTL)
+
+HOSTNAME = gethostname()
+# What the tasks of this host may use at the same time
+CAPACITY = local_capacity(WORKER_TOKENS)
+
+# Build plans already fetched by this worker, by build id, the
+# oldest first
+_PLANS = OrderedDict()
+# The number of plans kept, several builds may run at the same time
+MAX_PLANS = 8
+
+# What ``_execute`` needs to run a task: its target, the number of its
+# dependencies, its command, its inputs, the resources it needs, and
+# the function launching its children which returns the job of the
+# child the worker keeps, if any
+Job = namedtuple('Job', ['target', 'deps_num', 'command', 'inputs', 'needs',
+                         'dispatch'])
+
+# In eager mode, the messages sent by the tasks running, and whether
+# they are being run
+_EAGER_MESSAGES = deque()
+_eager_running = False
+
+def get_plan(build_id):
+    """
+    Returns the build plan of ``build_id``
+
+    The plan is fetched from Redis the first time only, it is
+    then cached for the rest of the build
+    """
+    if build_id not in _PLANS:
+        # A worker only takes part in a few builds, drop the
+        # plans of the oldest ones
+        while len(_PLANS) >= MAX_PLANS:
+            _PLANS.popitem(last=False)
+        keys = BuildKeys(build_id)
+        _PLANS[build_id] = BuildPlan.loads(RED.get(keys.plan))
+    return _PLANS[build_id]
+
+@celeryd_after_setup.connect
+def consume_local_queue(sender, instance, **kwargs):
+    """Makes the worker consume from the queue of its host besides
+       the shared queue"""
+    instance.app.amqp.queues.select_add(local_queue(HOSTNAME))
+
+@celeryd_after_setup.connect
+def start_host_heartbeat(sender, instance, **kwargs):
+    """Records that the workers of this host are alive until the worker
+       exits, so that the master does not send again the tasks waiting
+       in the queue of the host"""
+    HostHeartbeat(LEASES, HOSTNAME, LEASE_HEARTBEAT).start()
+
+@celeryd_after_setup.connect
+def advertise_capacity(sender, instance, **kwargs):
+    """Tells the masters and the other workers what the tasks of this
+       host may use"""
+    RESOURCES.advertise(HOSTNAME, CAPACITY)
+
+class _Waiting(Exception):
+    """
+    Exception to signal that the resources a task needs are not free
+    on this host, nothing was changed.
+
+    Attributes:
+       target(str): the target of the task.
+       needs(dict(str, int)): the resources the task needs.
+    """
+    def __init__(self, target, needs):
+        Exception.__init__(self, "'%s' waiting for %s" % (target, needs))
+        self.target = target
+        self.needs = needs
+
+def _place(needs):
+    """
+    Returns the host where a task needing ``needs`` fits best, None for
+    the shared queue if no host can hold it. The hosts whose workers
+    were not seen for a lease time are left out.
+    """
+    capacities = live_capacities(RESOURCES.capacities(), LEASES.hosts(),
+                                 time(), LEASE_TIME)
+    return choose_worker(needs, capacities, RESOURCES.usage())
+
+def _wait(task, build_id, waiting, priority):
+    """
+    Sends the task of the build ``build_id`` which is ``waiting`` for
+    its resources again, a bit later, to the host where they fit best,
+    with its ``priority``
+
+    If they fit on no host, even idle, the task fails instead of being
+    sent again forever.
+    """
+    host = _place(waiting.needs)
+    if host is None:
+        error = "needs %s, more than any host has" % ', '.join(
+            '%s=%s' % (name, amount)
+            for name, amount in sorted(waiting.needs.items()))
+        print "*** '%s' %s" % (waiting.target, error)
+        EVENTS.failed(BuildKeys(build_id), waiting.target, HOSTNAME, None,
+                      error)
+        return None
+    raise task.retry(countdown=RESOURCES_RETRY, priority=priority,
+                     **_queue_options(host))
+
+def _route(keys, inputs):
+    """
+    Returns the host to send each task to, given the ``inputs`` of
+    each task, None for the shared queue
+    """
+    if not LOCALITY:
+        return [None] * len(inputs)
+    return LOCALITIES.route(keys, inputs, LOCALITY_MAX_QUEUED)
+
+def _queue_options(host):
+    """
+    Returns the options sending a task to the queue of ``host``, or
+    to the shared queue if ``host`` is None
+    """
+    if host is None:
+        return {}
+    queue = local_queue(host)
+    # Declared as the worker of the host declares it
+    APP.amqp.queues.add(queue)
+    return {'queue': queue.name}
+
+def _send(build_id, targets, durations, priorities, inputs, needs, single,
+          batch, args, parent):
+    """
+    Sends tasks of the build ``build_id`` in the given order, the ones
+    expected to be tiny in batches, each message to the host holding
+    most of the inputs of its tasks. The tasks needing resources are
+    sent alone, to the host where they fit best.
+
+    ``targets``, ``durations``, ``priorities``, ``inputs`` and
+    ``needs`` describe each task, and ``args`` holds its argument of
+    the ``single`` Celery task, or of the ``batch`` one if several are
+    sent together. The tasks sent to the queue of a host are recorded,
+    the master sends them again if the host is lost (see leases.py).
+    """
+    if not args:
+        return
+    keys = BuildKeys(build_id)
+    batches = make_batches([None if needs[position] else duration
+                            for position, duration in enumerate(durations)],
+                           BATCH_MAX_DURATION, BATCH_SIZE, BATCH_TIME)
+    routed = [positions for positions in batches if not needs[positions[0]]]
+    hosts = dict(zip([positions[0] for positions in routed],
+                     _route(keys, [[target for position in positions
+                                    for target in inputs[position]]
+                                   for positions in routed])))
+    now = time()
+    signatures = []
+    # The targets sent to the queue of each host
+    queued = {}
+    for positions in batches:
+        if needs[positions[0]]:
+            # Not counted in the tasks queued for the locality
+            host = None
+            queue_host = _place(needs[positions[0]])
+        else:
+            host = queue_host = hosts[positions[0]]
+        options = _queue_options(queue_host)
+        if queue_host is not None:
+            queued.setdefault(queue_host, []).extend(
+                targets[position] for position in positions)
+        options['priority'] = max(priorities[position]
+                                  for position in positions)
+        if len(positions) == 1:
+            signature = single.s(build_id, args[positions[0]], now, parent,
+                                 host)
+        else:
+            signature = batch.s(build_id, [args[position]
+                                           for position in positions],
+                                now, parent, host)
+        signatures.append(signature.set(**options))
+    # Before the messages, a task may start as soon as it is sent
+    for queue_host, queue_targets in queued.items():
+        LEASES.routed(keys, queue_targets, queue_host)
+    _apply(signatures)
+
+def _apply(signatures):
+    """
+    Sends the messages of ``signatures``
+
+    In eager mode each task runs in the process sending it: the tasks
+    sent by a task are only queued, and the first call runs them all
+    in a loop instead of nesting a call per task of a chain.
+    """
+    global _eager_running
+    if not APP.conf.CELERY_ALWAYS_EAGER:
+        group(signatures)()
+        return
+    _EAGER_MESSAGES.extend(signatures)
+    if _eager_running:
+        return
+    _eager_running = True
+    try:
+        while _EAGER_MESSAGES:
+            _EAGER_MESSAGES.popleft().apply_async()
+    finally:
+        _eager_running = False
+        # Left by a task which failed
+        _EAGER_MESSAGES.clear()
+
+def send_tasks(build_id, tasks, parent=None):
+    """
+    Sends ``tasks`` of the build ``build_id``, launched by the task
+    ``parent`` (None for the master)
+    """
+    _send(build_id, [task.target for task in tasks],
+          [task.duration for task in tasks],
+          [task.priority for task in tasks],
+          [task.inputs for task in tasks], [task.needs for task in tasks],
+          run_task, run_batch, tasks, parent)
+
+def send_plan_tasks(build_id, plan, indexes, parent=None):
+    """
+    Sends the tasks at ``indexes`` in the build plan of ``build_id``,
+    launched by the task ``parent`` (None for the master)
+    """
+    _send(build_id, [plan.targets[index] for index in indexes],
+          [plan.durations[index] for index in indexes],
+          [plan.priorities[index] for index in indexes],
+          [plan.inputs[index] for index in indexes],
+          [plan.needs[index] for index in indexes], run_plan_task,
+          run_plan_batch, indexes, parent)
+
+def resend_task(build_id, task, attempt=0, backup=False):
+    """
+    Sends ``task`` of the build ``build_id`` again to the shared queue,
+    for the ``attempt`` prepared by the master (see leases.py) or as
+    the backup copy of a task lagging behind if ``backup`` (see
+    speculation.py)
+    """
+    run_task.apply_async((build_id, task, time(), None, None, attempt,
+                          backup), priority=task.priority)
+
+def resend_plan_task(build_id, plan, index, attempt=0, backup=False):
+    """
+    Sends the task at ``index`` in the build plan of ``build_id`` again
+    to the shared queue, for the ``attempt`` prepared by the master or
+    as a backup copy if ``backup``
+    """
+    run_plan_task.apply_async((build_id, index, time(), None, None,
+                               attempt, backup),
+                              priority=plan.priorities[index])
+
+def _keep_child(children, needs):
+    """
+    Returns the child a worker keeps for itself, None if it sends all
+    of them, and the children to send. A child which ``needs(child)``
+    resources is sent where they are free.
+    """
+    if not LOCAL_CHILDREN or not children or needs(children[0]):
+        return None, children
+    return children[0], children[1:]
+
+def _task_job(build_id, task):
+    """
+    Returns the Job running ``task``
+    """
+    def dispatch():
+        """Launches all the task's dependencies in parrallel, the ones
+           on the critical path first, and returns the job of the
+           child kept by the worker if any"""
+        kept, children = _keep_child(sorted(task.children,
+                                            key=lambda child:
+                                            -child.priority),
+                                     lambda child: child.needs)
+        send_tasks(build_id, children, task.target)
+        return None if kept is None else _task_job(build_id, kept)
+
+    return Job(task.target, len(task.dependencies), task.command,
+               task.inputs, task.needs, dispatch)
+
+def _plan_job(build_id, index):
+    """
+    Returns the Job running the task at ``index`` in the build plan of
+    ``build_id``
+    """
+    plan = get_plan(build_id)
+    # Read from the plan as a parsed task would be
+    task = plan.task(index)
+
+    def dispatch():
+        """Launches the children of the task, the ones on the critical
+           path first, and returns the job of the child kept by the
+           worker if any"""
+        kept, children = _keep_child(sorted(task.children,
+                                            key=lambda child:
+                                            -child.priority),
+                                     lambda child: child.needs)
+        send_plan_tasks(build_id, plan, [child.index for child in children],
+                        task.target)
+        return None if kept is None else _plan_job(build_id, kept.index)
+
+    return Job(task.target, len(task.dependencies), task.command,
+               task.inputs, task.needs, dispatch)
+
+@APP.task(bind=True, max_retries=None)
+def run_task(self, build_id, task, enqueued=None, parent=None, host=None,
+             attempt=0, backup=False):
+    """
+    Runs a task of the build ``build_id``, sent at ``enqueued`` by
+    the task ``parent`` (None for the master) to the queue of ``host``
+    (None for the shared queue), ``attempt`` being above 0 when the
+    master sends it again and ``backup`` True for a backup copy
+
+    Returns the report of the task if it was run, None otherwise
+    """
+    try:
+        reports = _execute(BuildKeys(build_id), [_task_job(build_id, task)],
+                           enqueued, parent, host, attempt, backup)
+    except _Waiting as waiting:
+        return _wait(self, build_id, waiting, task.priority)
+    return reports[0] if reports else None
 
 @APP.task
-def run_task(task):
-    """
-    Runs a task
-    """
-    # We create two names that are specific to a given task
-    lock_name = task.target + "_lock"
-    # This is more of a counter than a semaphore, but I like it
-    sem_name = task.target + "_sem"
-
-    # Acquire the lock specific to this task
-    # Mainly to avoid concurrent accesses to Redis' database
-    with RED.lock(lock_name):
-        if not RED.exists(sem_name):
-            # This is the first time we try to run this task
-            #
-            # Initialise a (key, value) pair in Redis with
-            # key = ``sem_name``
-            # value = "number of children of the task"
-            #
-            # ``value`` will be decremented each time one of the
-            # dependency of the given task will be run
-            if task.dependencies:
-                RED.set(sem_name, len(task.dependencies))
-            else:
-                RED.set(sem_name, 1)
-
-        RED.decr(sem_name)
-        # This way, if (value == 0) the task's last dependency just
-        # ended and we can run the task's itself
-        if int(RED.get(sem_name)):
-            # If the value associated to ``sem_name`` in the database
-            # is not 0 the task either is not ready (some dependencies
-            # haven't been run) or it has already been run (for
-            # whatever reason) and we don't want to do it again
-            # This last part is mainly defensive
+def run_batch(build_id, tasks, enqueued=None, parent=None, host=None):
+    """
+    Runs several tasks of the build ``build_id``, one after the other,
+    sent together by ``send_tasks``
+
+    Returns the reports of the tasks run
+    """
+    return _execute(BuildKeys(build_id),
+                    [_task_job(build_id, task) for task in tasks],
+                    enqueued, parent, host)
+
+@APP.task(bind=True, max_retries=None)
+def run_plan_task(self, build_id, index, enqueued=None, parent=None,
+                  host=None, attempt=0, backup=False):
+    """
+    Runs the task at ``index`` in the build plan of ``build_id``, sent
+    at ``enqueued`` by the task ``parent`` (None for the master) to the
+    queue of ``host`` (None for the shared queue), ``attempt`` being
+    above 0 when the master sends it again and ``backup`` True for a
+    backup copy
+
+    Returns the report of the task if it was run, None otherwise
+    """
+    try:
+        reports = _execute(BuildKeys(build_id), [_plan_job(build_id, index)],
+                           enqueued, parent, host, attempt, backup)
+    except _Waiting as waiting:
+        return _wait(self, build_id, waiting,
+                     get_plan(build_id).task(index).priority)
+    return reports[0] if reports else None
+
+@APP.task
+def run_plan_batch(build_id, indexes, enqueued=None, parent=None,
+                   host=None):
+    """
+    Runs the tasks at ``indexes`` in the build plan of ``build_id``,
+    one after the other, sent together by ``send_plan_tasks``
+
+    Returns the reports of the tasks run
+    """
+    return _execute(BuildKeys(build_id),
+                    [_plan_job(build_id, index) for index in indexes],
+                    enqueued, parent, host)
+
+def _output(target, command, owner):
+    """
+    Returns the temporary file the copy of ``owner`` writes ``target``
+    to, None if it writes the target itself, when the tasks are not
+    copied or when its command does not name it
+    """
+    if SPECULATION_FACTOR is None or not command:
+        return None
+    output = temporary_output(target, owner)
+    if rewrite_command(command, target, output) is None:
+        return None
+    return output
+
+def _execute(keys, jobs, enqueued, parent, host, attempt=0, backup=False):
+    """
+    Runs the commands of the tasks of ``jobs`` whose last dependency
+    is done, one after the other, and launches their children
+
+    The child a job keeps (see Job) is run next if it is ready, without
+    going through the broker.
+
+    Each task is run under a lease renewed by a heartbeat thread (see
+    leases.py): if the worker dies the master sends the task again,
+    with an ``attempt`` above 0. A task whose lease was taken back
+    while it ran neither launches its children nor counts as done, the
+    next attempt does. A ``backup`` copy of a task runs without lease,
+    the first of the two copies done wins (see speculation.py).
+
+    The resources a task needs are reserved on this host while it runs
+    (see resources.py). If they are not free, _Waiting is raised before
+    anything is changed and the task is sent again.
+
+    Returns a report for each task run: a dict with the target,
+    whether it was found in the cache, the results of the parts of its
+    command and the times of its steps, which are recorded for the
+    traces of the build
+    """
+    started = time()
+    if host is not None:
+        LOCALITIES.started(keys, host)
+    owner = "%s:%d" % (HOSTNAME, getpid())
+    if backup:
+        # The task is running elsewhere under its lease, only a copy
+        # writing a temporary file can race with it
+        jobs = [job for job in jobs
+                if _output(job.target, job.command, owner) is not None]
+        try:
+            _ready(keys, jobs, True)
+        except _Waiting:
+            # A copy is only worth it if it starts right away
+            return []
+        taken = [True] * len(jobs)
+    else:
+        # The dependencies were counted by the first attempt, the
+        # master only sends the task again if it was ready
+        ready = _ready(keys, jobs, attempt > 0)
+        jobs = [job for job, is_ready in zip(jobs, ready) if is_ready]
+        taken = LEASES.acquire(keys, [job.target for job in jobs], owner,
+                               attempt)
+    # The resources reserved for the tasks still to run, by target
+    reserved = dict((job.target, job.needs) for job in jobs if job.needs)
+    for job, is_taken in zip(jobs, taken):
+        if not is_taken and job.target in reserved:
+            RESOURCES.release(HOSTNAME, reserved.pop(job.target))
+    pending = deque((job, parent, enqueued, started)
+                    for job, is_taken in zip(jobs, taken) if is_taken)
+    if not pending:
+        return []
+    is_cancelled = None
+    if SPECULATION_FACTOR is not None:
+        if not backup:
+            SPECULATION.started(keys, [job.target for job, _, _, _
+                                       in pending])
+        is_cancelled = lambda target: SPECULATION.winner(keys, target) \
+            not in (None, owner)
+    heartbeat = Heartbeat(LEASES, keys, owner, LEASE_HEARTBEAT,
+                          get_executor(), is_cancelled)
+    if not backup:
+        heartbeat.held.update(job.target for job, _, _, _ in pending)
+    heartbeat.start()
+    reports = []
+    errors = []
+    try:
+        while pending:
+            job, job_parent, job_enqueued, job_started = pending.popleft()
+            target, command, inputs = job.target, job.command, job.inputs
+            report = {'target': target, 'worker': HOSTNAME,
+                      'pid': getpid(), 'parent': job_parent,
+                      'enqueued': job_enqueued, 'started': job_started,
+                      'counted': time(), 'cached': False, 'commands': []}
+            if backup:
+                report['backup'] = True
+            reports.append(report)
+            output = _output(target, command, owner)
+            timeout = None
+            if TIMEOUT_FACTOR is not None:
+                # The expected duration of a target never built is only
+                # a guess, it is not worth killing the command
+                last = HISTORY.hget(DURATIONS, target)
+                timeout = task_timeout(None if last is None else float(last),
+                                       TIMEOUT_FACTOR, TIMEOUT_MIN)
+            heartbeat.limit(timeout, target)
+            # The records are kept by target, the ones of the copies
+            # which lost would replace the one of the copy which won
+            recorded = True
+            try:
+                _build(target, command, inputs, report, output)
+                if heartbeat.cancelled:
+                    raise RuntimeError("'%s' cancelled" % target)
+                if heartbeat.timed_out:
+                    raise RuntimeError("'%s' timed out" % target)
+                heartbeat.limit(None)
+                heartbeat.held.discard(target)
+                if output is None:
+                    won = LEASES.complete(keys, target, owner)
+                else:
+                    won = SPECULATION.commit(keys, target, owner)
+                    if won:
+                        publish_output(output, target)
+                    else:
+                        remove_output(output)
+                if not won:
+                    # Taken back while it ran or beaten by the other
+                    # copy, which launches the children and records
+                    # the task
+                    recorded = False
+                    continue
+                report['finished'] = time()
+                # Where the children will find the target, and how many
+                # bytes of the inputs were read locally
+                size = getsize(target) if isfile(target) else 0
+                report['local_bytes'], report['remote_bytes'] = \
+                    LOCALITIES.output_done(keys, target, HOSTNAME, size,
+                                           inputs)
+                kept = job.dispatch()
+                report['dispatched'] = time()
+            except Exception as error:
+                timed_out = heartbeat.timed_out
+                cancelled = heartbeat.cancelled
+                heartbeat.limit(None)
+                heartbeat.held.discard(target)
+                if output is not None:
+                    remove_output(output)
+                if cancelled or backup:
+                    # The other copy won or may still win
+                    recorded = False
+                if cancelled:
+                    # Nothing went wrong
+                    continue
+                errors.append(error)
+                if timed_out and not backup:
+                    # Let the master send it again, on another worker
+                    LEASES.give_back(keys, target, owner)
+                elif not backup and LEASES.complete(keys, target, owner):
+                    # The other tasks of the message are still run, the
+                    # master decides whether the build goes on. The
+                    # failure of a backup copy is not the one of its
+                    # task, which may still succeed
+                    EVENTS.failed(keys, target, HOSTNAME,
+                                  report.get('exit_code'), str(error))
+                continue
+            finally:
+                if target in reserved:
+                    RESOURCES.release(HOSTNAME, reserved.pop(target))
+                if recorded:
+                    TRACER.record(keys, report)
+            if kept is not None and COUNTERS.dependencies_done(
+                    keys.stopped, [keys.sem(kept.target)],
+                    [kept.deps_num])[0] \
+                    and LEASES.acquire(keys, [kept.target], owner, 0)[0]:
+                if SPECULATION_FACTOR is not None:
+                    SPECULATION.started(keys, [kept.target])
+                heartbeat.held.add(kept.target)
+                now = time()
+                pending.appendleft((kept, target, now, now))
+    finally:
+        heartbeat.stop()
+        for needs in reserved.values():
+            RESOURCES.release(HOSTNAME, needs)
+        # A single update for all the tasks of the message
+        done = [report['target'] for report in reports
+                if 'dispatched' in report]
+        if done:
+            _tasks_done(keys, done)
+    if errors:
+        raise errors[0]
+    return reports
+
+def _ready(keys, jobs, counted):
+    """
+    Returns whether each of ``jobs`` is ready: its last dependency is
+    done, or was ``counted`` already, and the resources it needs are
+    reserved on this host
+
+    Raises _Waiting if the resources of a ready task are not free, its
+    counter is then left as it was.
+    """
+    light = [index for index, job in enumerate(jobs) if not job.needs]
+    ready = [True] * len(jobs)
+    if light and not counted:
+        # This is more of a counter than a semaphore, but I like it
+        #
+        # It is initialised to the number of dependencies of the task
+        # the first time one of them is done, and decremented each
+        # time. If it does not reach 0 the task either is not ready
+        # (some dependencies haven't been run) or it has already been
+        # run (for whatever reason) and we don't want to do it again
+        done = COUNTERS.dependencies_done(
+            keys.stopped, [keys.sem(jobs[index].target) for index in light],
+            [jobs[index].deps_num for index in light])
+        for index, is_ready in zip(light, done):
+            ready[index] = is_ready
+    for index, job in enumerate(jobs):
+        if not job.needs:
+            continue
+        # Only sent alone, a task needing resources is the only job
+        status = RESOURCES.admit(keys, HOSTNAME, job.target,
+                                 None if counted else job.deps_num,
+                                 job.needs, CAPACITY)
+        if status == WAIT:
+            raise _Waiting(job.target, job.needs)
+        ready[index] = status == READY
+    return ready
+
+def _build(target, command, inputs, report, output=None):
+    """
+    Builds ``target`` with ``command``, and fills ``report`` with the
+    results of the parts of the command and the exit code
+
+    If the result cache is enabled and already holds the file built by
+    the same command from the same ``inputs``, the file is copied from
+    the cache instead. The file is written to ``output`` instead of the
+    target if it is not None.
+    """
+    report['exit_code'] = 0
+    if not command:
+        # The target only groups its dependencies
+        return
+    if CACHE is not None:
+        key = CACHE.key(command, inputs)
+        if CACHE.fetch(key, output or target):
+            print "cached '%s'" % target
+            HISTORY.hincrby(CACHE_STATS, "hits")
+            report['cached'] = True
             return
-        else:
-            # Time to actually run the task
-            for command in task.command.split(';'):
-                # Each part of the task's command is run one after
-                # the other, this way we can identify which part
-                # failed if appropriate
-
-                print "'%s' '%s'" % (task.target, command)
-                ret_code = system(command)
-                if ret_code != 0:
-                    raise RuntimeError("'%s' failed with code '%s'" %
-                                       (command, ret_code))
-            print "done '%s'" % task.target
-
-            # Launch all the task's dependencies in parrallel
-            group((run_task.s(child) for child in task.children))()
-
-    # The task was run at this point
-    with RED.lock(SLAVE_LOCK):
-        # Decrement the number of task to run
-        RED.decr(TASK_NUM)
-        if not int(RED.get(TASK_NUM)):
-            # There are no task to run anymore
-            # Set the end time
-            RED.set(END_TIME, time())
-            # Push something on the ``END_LIST`` so the master can return
-            RED.rpush(END_LIST, 0)
+        HISTORY.hincrby(CACHE_STATS, "misses")
+
+    # Time to actually run the task
+    start = time()
+    executor = get_executor()
+    if output is not None:
+        command = rewrite_command(command, target, output)
+    for part in command.split(';'):
+        # Each part of the task's command is run one after
+        # the other, this way we can identify which part
+        # failed if appropriate
+        if not part.strip():
+            continue
 
+        print "'%s' '%s'" % (target, part)
+        result = executor.run(part)
+        report['commands'].append(result.as_dict())
+        if result.exit_code != 0:
+            print result.output
+            report['exit_code'] = result.exit_code
+            raise RuntimeError("'%s' failed with code '%s'" %
+                               (part, result.exit_code))
+    print "done '%s'" % target
+    if CACHE is not None:
+        CACHE.store(key, output or target)
+    # Keep the duration for the weights of the next builds
+    HISTORY.hset(DURATIONS, target, time() - start)
+
+def _tasks_done(keys, targets):
+    """
+    Signals the master that the tasks of ``targets`` are done
+    """
+    # Decrement the number of task to run, the last one sets the
+    # end time and pushes something on the end list
+    COUNTERS.task_done(keys.task_num, keys.end_time, keys.end_list, time(),
+                       targets, keys.events)
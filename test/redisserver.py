@@ -0,0 +1,54 @@
+"""
+module starting a Redis server of its own for the tests of the Lua
+scripts
+"""
+
+import os
+import socket
+import subprocess
+import time
+import unittest
+from distutils.spawn import find_executable
+from redis import Redis
+from redis.exceptions import ConnectionError
+
+# The scripts are run by a Redis server of their own, if there is one
+REDIS_SERVER = find_executable('redis-server')
+
+@unittest.skipIf(REDIS_SERVER is None, 'redis-server is not installed')
+class RedisTestCase(unittest.TestCase):
+    """
+    Test case run against a Redis server started for it, emptied
+    before each test.
+
+    Attributes:
+       server(Popen): the Redis server.
+       red(Redis): the connection to the server.
+    """
+    @classmethod
+    def setUpClass(cls):
+        """Starts the Redis server."""
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        cls.server = subprocess.Popen([REDIS_SERVER, '--port', str(port),
+                                       '--save', '', '--appendonly', 'no'],
+                                      stdout=open(os.devnull, 'w'))
+        cls.red = Redis(port=port)
+        for _ in range(100):
+            try:
+                cls.red.ping()
+                break
+            except ConnectionError:
+                time.sleep(0.05)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stops the Redis server."""
+        cls.server.terminate()
+        cls.server.wait()
+
+    def setUp(self):
+        """Setup the test case."""
+        self.red.flushall()
@@ -0,0 +1,32 @@
+"""
+module to test the names of the Redis keys of the builds
+"""
+
+import sys
+import unittest
+
+sys.path.append('../src')
+
+from buildkeys import BuildKeys, new_build_id
+
+class BuildKeysTestCase(unittest.TestCase):
+    """
+    Test case for the build namespaces.
+    """
+    def test_builds_do_not_share_keys(self):
+        """ Test that two builds have no key in common."""
+        first = BuildKeys(new_build_id())
+        second = BuildKeys(new_build_id())
+        first_keys = set([first.start_time, first.end_time, first.task_num,
+                          first.end_list, first.plan, first.sem('premier')])
+        second_keys = set([second.start_time, second.end_time,
+                           second.task_num, second.end_list, second.plan,
+                           second.sem('premier')])
+        self.assertEquals(len(first_keys), 6)
+        self.assertFalse(first_keys & second_keys)
+
+    def test_keys_are_prefixed(self):
+        """ Test that every key starts with the build id."""
+        keys = BuildKeys('42')
+        self.assertTrue(keys.sem('list.txt').startswith('build:42:'))
+        self.assertNotEquals(keys.sem('list.txt'), keys.sem('list1.txt'))
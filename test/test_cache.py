@@ -0,0 +1,90 @@
+"""
+module to test the content addressed result cache
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.append('../src')
+
+from cache import ResultCache
+
+class ResultCacheTestCase(unittest.TestCase):
+    """
+    Test case for the result cache, stored in a temporary directory.
+    """
+    def setUp(self):
+        """Setup the test case: an input and a target built from it."""
+        self.directory = tempfile.mkdtemp()
+        self.cache = ResultCache(os.path.join(self.directory, 'cache'), 100)
+        self.source = self._write('premier.c', 'int main() {}')
+        self.target = self._write('premier', 'binary')
+
+    def tearDown(self):
+        """ Tear down the test case."""
+        shutil.rmtree(self.directory)
+
+    def _write(self, name, content):
+        """Writes ``content`` in the file ``name``, returns its path."""
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as stream:
+            stream.write(content)
+        return path
+
+    def test_key_depends_on_inputs(self):
+        """ Test that the key changes with the command or the inputs."""
+        key = self.cache.key('gcc premier.c', [self.source])
+        self.assertEquals(key, self.cache.key('gcc premier.c', [self.source]))
+        self.assertNotEquals(key, self.cache.key('gcc -O2 premier.c',
+                                                 [self.source]))
+        self._write('premier.c', 'int main() { return 1; }')
+        self.assertNotEquals(key, self.cache.key('gcc premier.c',
+                                                 [self.source]))
+
+    def test_hit_and_miss(self):
+        """ Test that a stored target is restored on a hit."""
+        key = self.cache.key('gcc premier.c', [self.source])
+        self.assertFalse(self.cache.fetch(key, self.target))
+        self.cache.store(key, self.target)
+        os.remove(self.target)
+        self.assertTrue(self.cache.fetch(key, self.target))
+        with open(self.target) as stream:
+            self.assertEquals(stream.read(), 'binary')
+        self.assertEquals((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_lru_eviction(self):
+        """ Test that the least recently used files are evicted."""
+        for index in range(3):
+            path = self._write('frame_%d.png' % index, 'x' * 40)
+            self.cache.store(str(index) * 40, path)
+            os.utime(self.cache._path(str(index) * 40),
+                     (index * 1000, index * 1000))
+        self.cache.evict()
+        self.assertTrue(self.cache.size() <= 100)
+        self.assertFalse(self.cache.fetch('0' * 40, self.target))
+        self.assertTrue(self.cache.fetch('2' * 40, self.target))
+
+    def test_running_size(self):
+        """ Test that the directory is only walked when the files stored
+            go over the maximum size."""
+        evictions = []
+        evict = self.cache.evict
+        def count_evict():
+            evictions.append(self.cache._size)
+            evict()
+        self.cache.evict = count_evict
+        for index in range(5):
+            path = self._write('frame_%d.png' % index, 'x' * 10)
+            self.cache.store(str(index) * 40, path)
+        # Read once, on the first store
+        self.assertEquals(evictions, [None])
+        self.assertEquals(self.cache._size, 50)
+        path = self._write('cube.mpg', 'x' * 60)
+        self.cache.store('5' * 40, path)
+        self.assertEquals(evictions, [None, 110])
+        self.assertTrue(self.cache.size() <= 100)
+        self.assertEquals(self.cache._size, self.cache.size())
+
@@ -0,0 +1,89 @@
+"""
+module to test the counters shared by the workers
+"""
+
+import json
+import sys
+import unittest
+
+sys.path.append('../src')
+
+import redisserver
+from buildkeys import BuildKeys
+from counters import Counters
+
+class CountersScriptsTestCase(redisserver.RedisTestCase):
+    """
+    Test case for the scripts of the counters, on a Redis server
+    started for the test case: list1.txt, list2.txt, list3.txt ->
+    list.txt.
+    """
+    def setUp(self):
+        """Setup the test case."""
+        redisserver.RedisTestCase.setUp(self)
+        self.counters = Counters(self.red, 60)
+        self.keys = BuildKeys('test')
+
+    def test_dependencies_done(self):
+        """ Test that the counter of a task reaches 0 once, for its last
+            dependency, even if the dependencies are counted again."""
+        sem = self.keys.sem('list.txt')
+        ready = [self.counters.dependencies_done(self.keys.stopped, [sem],
+                                                 [3])[0]
+                 for _ in range(6)]
+        self.assertEquals(ready, [False, False, True, False, False, False])
+
+    def test_dependencies_done_several(self):
+        """ Test that the counters of a message are updated together, a
+            task without dependencies being ready at once."""
+        sems = [self.keys.sem('list.txt'), self.keys.sem('premier')]
+        self.assertEquals(self.counters.dependencies_done(self.keys.stopped,
+                                                          sems, [2, 0]),
+                          [False, True])
+        self.assertEquals(self.counters.dependencies_done(self.keys.stopped,
+                                                          sems[:1], [2]),
+                          [True])
+
+    def test_dependencies_done_ttl(self):
+        """ Test that the counters expire with the build."""
+        sem = self.keys.sem('list.txt')
+        self.counters.dependencies_done(self.keys.stopped, [sem], [3])
+        self.assertTrue(0 < self.red.ttl(sem) <= 60)
+
+    def test_dependencies_done_stopped(self):
+        """ Test that no task is ready once the build is stopped."""
+        self.red.set(self.keys.stopped, 1)
+        sem = self.keys.sem('list.txt')
+        self.assertEquals(self.counters.dependencies_done(self.keys.stopped,
+                                                          [sem], [1]),
+                          [False])
+        self.assertIsNone(self.red.get(sem))
+
+    def test_task_done(self):
+        """ Test that the last tasks done end the build and signal the
+            master."""
+        keys = self.keys
+        self.red.set(keys.task_num, 4)
+        pubsub = self.red.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(keys.events)
+        pubsub.get_message(timeout=1.0)
+        self.assertFalse(self.counters.task_done(
+            keys.task_num, keys.end_time, keys.end_list, 10.0,
+            ['list1.txt', 'list2.txt', 'list3.txt'], keys.events))
+        self.assertIsNone(self.red.get(keys.end_time))
+        self.assertEquals(json.loads(pubsub.get_message(timeout=1.0)['data']),
+                          {'type': 'done', 'left': 1,
+                           'targets': ['list1.txt', 'list2.txt',
+                                       'list3.txt']})
+        self.assertTrue(self.counters.task_done(
+            keys.task_num, keys.end_time, keys.end_list, 20.0, ['list.txt'],
+            keys.events))
+        self.assertEquals(self.red.get(keys.task_num), '0')
+        self.assertEquals(float(self.red.get(keys.end_time)), 20.0)
+        self.assertEquals(self.red.llen(keys.end_list), 1)
+        for key in (keys.end_time, keys.end_list):
+            self.assertTrue(0 < self.red.ttl(key) <= 60)
+        pubsub.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+"""
+module to test the compressed sparse rows of the graphs
+"""
+
+import sys
+import unittest
+
+sys.path.append('../src')
+
+from csr import Adjacency
+
+class AdjacencyTestCase(unittest.TestCase):
+    """
+    Test case for the adjacency of a diamond: 0 -> 1, 2 -> 3.
+    """
+    def setUp(self):
+        """Setup the test case."""
+        self.dependencies = Adjacency.from_lists([[], [0], [0], [1, 2]])
+
+    def test_neighbours(self):
+        """ Test that the neighbours of each node are kept in order."""
+        self.assertEquals(len(self.dependencies), 4)
+        self.assertEquals([list(deps) for deps in self.dependencies],
+                          [[], [0], [0], [1, 2]])
+        self.assertRaises(IndexError, self.dependencies.__getitem__, 4)
+
+    def test_transposed(self):
+        """ Test that the transposed adjacency holds the children."""
+        self.assertEquals([list(children) for children
+                           in self.dependencies.transposed()],
+                          [[1, 2], [3], [3], []])
+
+    def test_round_trip(self):
+        """ Test that an adjacency is unchanged by its serialization."""
+        self.assertEquals(Adjacency.loads(self.dependencies.dumps()),
+                          self.dependencies)
+
+    def test_isolated(self):
+        """ Test that the nodes without neighbours are found."""
+        self.assertEquals(self.dependencies.isolated(), [0])
+        self.assertEquals(self.dependencies.transposed().isolated(), [3])
@@ -0,0 +1,66 @@
+"""
+module to test the dependency trees of the master
+"""
+
+import sys
+import tempfile
+import unittest
+
+sys.path.append('../src')
+
+from makeparse import Parser
+from master import DepTree
+
+class DepTreeTestCase(unittest.TestCase):
+    """
+    Test case for the dependency trees, whose tasks and dependencies
+    are each counted once.
+    """
+    def _tree(self, makefile, target):
+        """Returns the tree of ``target`` in the stream ``makefile``."""
+        parser = Parser()
+        parser.parse_makefile(makefile)
+        return DepTree(parser.get_task(target))
+
+    def test_premier(self):
+        """ Test that premier, shared by the 20 lists, is counted once."""
+        with open('makefiles/premier/Makefile') as makefile:
+            tree = self._tree(makefile, 'list.txt')
+        nodes = dict((node.target, node) for node in tree.nodes)
+        self.assertEquals(tree.nodes_num, 22)
+        self.assertEquals(len(tree.nodes), 22)
+        self.assertEquals([leaf.target for leaf in tree.leaves], ['premier'])
+        self.assertEquals(nodes['premier'].inputs, ['premier.c'])
+        children = nodes['premier'].children
+        self.assertEquals(len(children), 20)
+        self.assertEquals(len(set(children)), 20)
+        self.assertEquals(tree.in_degree[nodes['list.txt']], 20)
+        self.assertEquals(tree.nodes[-1].target, 'list.txt')
+
+    def test_duplicated_dependency(self):
+        """ Test that a dependency listed twice is counted once, in a
+            diamond: base -> left, right -> top."""
+        with tempfile.TemporaryFile() as makefile:
+            makefile.write('top: left right left\n\ttouch top\n\n'
+                           'left: base src.c src.c\n\ttouch left\n\n'
+                           'right: base base\n\ttouch right\n\n'
+                           'base:\n\ttouch base\n')
+            makefile.seek(0)
+            tree = self._tree(makefile, 'top')
+        nodes = dict((node.target, node) for node in tree.nodes)
+        self.assertEquals(tree.nodes_num, 4)
+        self.assertEquals([node.target for node in tree.nodes][::3],
+                          ['base', 'top'])
+        self.assertEquals([leaf.target for leaf in tree.leaves], ['base'])
+        self.assertEquals(nodes['top'].inputs, ['left', 'right'])
+        self.assertEquals(nodes['left'].inputs, ['base', 'src.c'])
+        self.assertEquals([dep.target for dep in nodes['right'].dependencies],
+                          ['base'])
+        self.assertEquals(tree.in_degree[nodes['top']], 2)
+        self.assertEquals(tree.in_degree[nodes['right']], 1)
+        self.assertEquals(sorted(child.target for child
+                                 in nodes['base'].children),
+                          ['left', 'right'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+"""
+module to test how the master follows a build from its events
+"""
+
+import sys
+import unittest
+
+sys.path.append('../src')
+
+from events import BuildMonitor, DONE, FAILED
+
+def failure(target):
+    """Returns the event of the failure of ``target``."""
+    return {'type': FAILED, 'target': target, 'worker': 'node1',
+            'exit_code': 1, 'error': 'failed'}
+
+class BuildMonitorTestCase(unittest.TestCase):
+    """
+    Test case for the progress of a build, on premier -> list1.txt,
+    list2.txt -> list.txt and an independent other.txt.
+    """
+    def setUp(self):
+        """Setup the test case."""
+        self.children = {'premier': ['list1.txt', 'list2.txt'],
+                         'list1.txt': ['list.txt'],
+                         'list2.txt': ['list.txt'],
+                         'list.txt': [], 'other.txt': []}
+
+    def test_done(self):
+        """ Test that the build is over once every task is done."""
+        monitor = BuildMonitor(self.children, 5, False)
+        self.assertFalse(monitor.handle({'type': DONE, 'left': 1}))
+        # Events may arrive out of order
+        self.assertFalse(monitor.handle({'type': DONE, 'left': 3,
+                                         'targets': ['premier']}))
+        self.assertEquals(monitor.done, 4)
+        self.assertEquals(monitor.finished, set(['premier']))
+        self.assertTrue(monitor.handle({'type': DONE, 'left': 0}))
+        self.assertEquals(monitor.exit_status(), 0)
+
+    def test_stop_on_failure(self):
+        """ Test that the first failure ends the build."""
+        monitor = BuildMonitor(self.children, 5, False)
+        self.assertTrue(monitor.handle(failure('list1.txt')))
+        self.assertEquals(monitor.exit_status(), 2)
+
+    def test_keep_going(self):
+        """ Test that the tasks not depending on a failed one are
+            waited for."""
+        monitor = BuildMonitor(self.children, 5, True)
+        self.assertFalse(monitor.handle(failure('list1.txt')))
+        self.assertEquals(monitor.skipped, set(['list.txt']))
+        self.assertEquals(monitor.left(), 3)
+        self.assertFalse(monitor.handle({'type': DONE, 'left': 3}))
+        self.assertTrue(monitor.handle({'type': DONE, 'left': 2}))
+        self.assertEquals(monitor.exit_status(), 2)
@@ -0,0 +1,89 @@
+"""
+module to test the execution of the commands
+"""
+
+import sys
+import unittest
+from threading import Timer
+from time import time
+
+sys.path.append('../src')
+
+from executor import Executor, OutputBuffer, split_command
+
+class ExecutorTestCase(unittest.TestCase):
+    """
+    Test case for the command executor.
+    """
+    def setUp(self):
+        """Setup the test case."""
+        self.executor = Executor(buffer_size=16)
+
+    def tearDown(self):
+        """ Tear down the test case."""
+        self.executor.close()
+
+    def test_split_command(self):
+        """ Test that only the commands needing a shell get one."""
+        self.assertEquals(split_command('gcc premier.c -o premier -lm'),
+                          ['gcc', 'premier.c', '-o', 'premier', '-lm'])
+        self.assertEquals(split_command("convert 'a b.png' cube.mpg"),
+                          ['convert', 'a b.png', 'cube.mpg'])
+        self.assertIsNone(split_command('./premier 2 10 > list1.txt'))
+        self.assertIsNone(split_command('cat list2.txt >> list.txt'))
+        self.assertIsNone(split_command('cd /tmp'))
+        self.assertIsNone(split_command('A=1 make'))
+        self.assertIsNone(split_command(': nothing to do'))
+        self.assertIsNone(split_command('command -v gcc'))
+
+    def test_program(self):
+        """ Test that a program is run without a shell."""
+        result = self.executor.run('basename /tmp/premier')
+        self.assertFalse(result.shell)
+        self.assertEquals(result.exit_code, 0)
+        self.assertEquals(result.output, 'premier\n')
+
+    def test_shell(self):
+        """ Test that the shell runs the commands in subshells."""
+        result = self.executor.run('cd / && echo done | tr a-z A-Z')
+        self.assertTrue(result.shell)
+        self.assertEquals(result.output, 'DONE\n')
+        self.assertEquals(self.executor.run('exit 3').exit_code, 3)
+        self.assertEquals(self.executor.run('echo $((1 + 1))').output, '2\n')
+        self.assertEquals(self.executor.run(': nothing').exit_code, 0)
+        self.assertEquals(self.executor.run('command echo done').output,
+                          'done\n')
+
+    def test_missing_program(self):
+        """ Test that a missing program fails like in a shell."""
+        self.assertEquals(self.executor.run('no-such-program').exit_code, 127)
+
+    def test_bounded_output(self):
+        """ Test that only the end of the output is kept."""
+        result = self.executor.run('seq 1000')
+        self.assertEquals(result.output_size, len(
+            ''.join('%d\n' % i for i in range(1, 1001))))
+        self.assertEquals(result.output, '97\n998\n999\n1000\n')
+
+    def test_kill(self):
+        """ Test that a command killed does not block the executor."""
+        for command in ('sleep 10', 'sleep 10 | cat'):
+            timer = Timer(0.2, self.executor.kill)
+            timer.start()
+            start = time()
+            self.assertNotEquals(self.executor.run(command).exit_code, 0)
+            self.assertLess(time() - start, 5)
+            timer.join()
+        self.assertEquals(self.executor.run('echo done').output, 'done\n')
+
+    def test_output_buffer(self):
+        """ Test that the buffer keeps the last bytes written."""
+        output = OutputBuffer(4)
+        for chunk in ('ab', 'cd', 'ef'):
+            output.write(chunk)
+        self.assertEquals(output.getvalue(), 'cdef')
+        self.assertEquals(output.size, 6)
+        output.write('ghijklmn')
+        self.assertEquals(output.getvalue(), 'klmn')
+        self.assertEquals(output._kept, 4)
+        self.assertEquals(output.size, 14)
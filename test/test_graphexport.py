@@ -0,0 +1,86 @@
+"""
+module to test the exports of the dependency graph
+"""
+
+import json
+import sys
+import tempfile
+import unittest
+from StringIO import StringIO
+from xml.dom.minidom import parseString
+
+sys.path.append('../src')
+
+from graphexport import GraphStyle, build_states, write_dot, write_json, \
+                        write_graphml
+from makeparse import Parser
+
+class GraphExportTestCase(unittest.TestCase):
+    """
+    Test case for the exports, on premier -> list1.txt, list2.txt ->
+    list.txt.
+    """
+    def setUp(self):
+        """Setup the test case."""
+        with tempfile.TemporaryFile() as makefile:
+            makefile.write('list.txt: list1.txt list2.txt\n'
+                           '\tcat list1.txt list2.txt > list.txt\n'
+                           'list1.txt: premier\n'
+                           '\t./premier 2 10 > list1.txt\n'
+                           'list2.txt: premier\n'
+                           '\t./premier 11 20 > list2.txt\n'
+                           'premier: premier.c\n'
+                           '\tgcc premier.c -o premier\n')
+            makefile.seek(0)
+            self.parser = Parser()
+            self.parser.parse_makefile(makefile)
+        self.style = GraphStyle({'premier': 'cached', 'list1.txt': 'built',
+                                 'list2.txt': 'failed'},
+                                {'premier': 2.0, 'list1.txt': 1.0})
+
+    def test_dot(self):
+        """ Test that the DOT export has every node and edge."""
+        dot = self.parser.get_dot_dependencies_tree()
+        self.assertTrue(dot.startswith('digraph G {\n'))
+        self.assertEquals(dot.count('color="green"'), 5)
+        self.assertEquals(dot.count(' -> '), 5)
+
+    def test_colored_dot(self):
+        """ Test that the nodes are colored by state and duration."""
+        stream = StringIO()
+        write_dot(self.parser.get_tasks(), stream, self.style)
+        dot = stream.getvalue()
+        self.assertEquals(dot.count('color="red"'), 1)
+        self.assertEquals(dot.count('color="grey"'), 2)
+        self.assertTrue('fillcolor="0.000 1.000 1.000"' in dot)
+        self.assertTrue('fillcolor="0.000 0.500 1.000"' in dot)
+
+    def test_json(self):
+        """ Test that the JSON export is an adjacency list."""
+        stream = StringIO()
+        write_json(self.parser.get_tasks(), stream, self.style)
+        nodes = json.loads(stream.getvalue())['nodes']
+        by_target = dict((node['target'], node) for node in nodes)
+        self.assertEquals(len(nodes), 5)
+        self.assertEquals(len(by_target['list.txt']['dependencies']), 2)
+        self.assertEquals(by_target['premier']['state'], 'cached')
+        self.assertEquals(by_target['premier']['duration'], 2.0)
+
+    def test_graphml(self):
+        """ Test that the GraphML export is well formed."""
+        stream = StringIO()
+        write_graphml(self.parser.get_tasks(), stream, self.style)
+        document = parseString(stream.getvalue())
+        self.assertEquals(len(document.getElementsByTagName('node')), 5)
+        self.assertEquals(len(document.getElementsByTagName('edge')), 5)
+
+    def test_build_states(self):
+        """ Test the states read from the traces of a build."""
+        records = [{'target': 'a', 'exit_code': 0, 'finished': 1,
+                    'cached': False},
+                   {'target': 'b', 'exit_code': 0, 'finished': 1,
+                    'cached': True},
+                   {'target': 'c', 'exit_code': 2, 'finished': None,
+                    'cached': False}]
+        self.assertEquals(build_states(records),
+                          {'a': 'built', 'b': 'cached', 'c': 'failed'})
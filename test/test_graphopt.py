@@ -0,0 +1,67 @@
+"""
+module to test the simplifications of the dependency graph
+"""
+
+import sys
+import tempfile
+import unittest
+
+sys.path.append('../src')
+
+from graphopt import collapse_recipeless, transitive_reduction
+from makeparse import Parser
+
+class GraphoptTestCase(unittest.TestCase):
+    """
+    Test case for the collapse of the targets without recipe and the
+    transitive reduction.
+    """
+    def _parse(self, content):
+        """Parses ``content`` as a Makefile, returns the parser."""
+        with tempfile.TemporaryFile() as makefile:
+            makefile.write(content)
+            makefile.seek(0)
+            parser = Parser()
+            parser.parse_makefile(makefile)
+        return parser
+
+    def test_collapse_recurse(self):
+        """ Test that the groups of frames of the recursive blender
+            Makefile are removed."""
+        parser = Parser()
+        with open('makefiles/blender_2.49/Makefile-recurse') as makefile:
+            parser.parse_makefile(makefile)
+        root = parser.get_task('cube.mpg')
+        self.assertEquals(collapse_recipeless(root), (14, 14))
+        self.assertEquals([dep.target for dep in root.dependencies],
+                          ['frame_%d.png' % i for i in range(1, 114)])
+
+    def test_collapse_nested(self):
+        """ Test that nested and shared groups are replaced by their
+            dependencies, once each."""
+        parser = self._parse('all: group1 group2\n\n'
+                             'group1: a group3\n\n'
+                             'group2: group3 c\n\n'
+                             'group3: b\n\n'
+                             'a:\n\ttouch a\n\n'
+                             'b:\n\ttouch b\n\n'
+                             'c: b\n\ttouch c\n\n')
+        root = parser.get_task('all')
+        self.assertEquals(collapse_recipeless(root), (3, 4))
+        self.assertEquals([dep.target for dep in root.dependencies],
+                          ['a', 'b', 'c'])
+        self.assertIsNone(root.command)
+
+    def test_transitive_reduction(self):
+        """ Test that only the dependencies implied by another one are
+            dropped."""
+        parser = self._parse('d: a b c\n\ttouch d\n\n'
+                             'c: b\n\ttouch c\n\n'
+                             'b: a\n\ttouch b\n\n'
+                             'a:\n\ttouch a\n\n'
+                             'e: a\n\ttouch e\n\n')
+        nodes = [parser.get_task(target) for target in 'abcde']
+        self.assertEquals(transitive_reduction(nodes), 2)
+        self.assertEquals([[dep.target for dep in node.dependencies]
+                           for node in nodes],
+                          [[], ['a'], ['b'], ['c'], ['a']])
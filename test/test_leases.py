@@ -0,0 +1,132 @@
+"""
+module to test the leases of the tasks
+"""
+
+import sys
+import time
+import unittest
+
+sys.path.append('../src')
+
+import redisserver
+from buildkeys import BuildKeys
+from leases import expired_leases, parse_lease, task_timeout, Leases
+
+class LeasesTestCase(unittest.TestCase):
+    """
+    Test case for the leases of the tasks.
+    """
+    def test_parse_lease(self):
+        """ Test that a lease is split into its fields."""
+        self.assertEquals(parse_lease('1 1000.5 node1:42'),
+                          (1, 1000.5, 'node1:42'))
+        self.assertEquals(parse_lease('2 1000 -'), (2, 1000.0, '-'))
+
+    def test_expired_leases(self):
+        """ Test that only the expired leases of a worker are taken
+            back."""
+        leases = {'list1.txt': '0 90 node1:42', 'list2.txt': '0 110 node2:7',
+                  'list3.txt': '1 50 node3:8', 'premier': '1 50 -'}
+        self.assertEquals(expired_leases(leases, 100),
+                          [('list1.txt', '0 90 node1:42'),
+                           ('list3.txt', '1 50 node3:8')])
+        self.assertEquals(expired_leases({}, 100), [])
+
+    def test_task_timeout(self):
+        """ Test that the time limit follows the expected duration."""
+        self.assertIsNone(task_timeout(10.0, None, 60))
+        self.assertEquals(task_timeout(10.0, 10, 60), 100.0)
+        self.assertEquals(task_timeout(1.0, 10, 60), 60)
+        self.assertIsNone(task_timeout(None, 10, 60))
+
+class LeasesScriptsTestCase(redisserver.RedisTestCase):
+    """
+    Test case for the scripts of the leases, on a Redis server started
+    for the test case.
+    """
+    def setUp(self):
+        """Setup the test case."""
+        redisserver.RedisTestCase.setUp(self)
+        self.leases = Leases(self.red, 60, 30)
+        self.keys = BuildKeys('test')
+
+    def _lease(self, target):
+        """Returns the lease of ``target``, parsed, None if it has
+           none."""
+        lease = self.leases.load(self.keys).get(target)
+        return None if lease is None else parse_lease(lease)
+
+    def test_acquire(self):
+        """ Test that a first attempt takes a lease only once."""
+        self.assertEquals(self.leases.acquire(self.keys, ['a', 'b'], 'w1', 0),
+                          [True, True])
+        self.assertEquals(self.leases.acquire(self.keys, ['a', 'c'], 'w2', 0),
+                          [False, True])
+        # Delivered twice to the same worker
+        self.assertEquals(self.leases.acquire(self.keys, ['a'], 'w1', 0),
+                          [False])
+        self.assertEquals(self._lease('a')[2], 'w1')
+        self.assertEquals(self.leases.acquire(self.keys, ['a'], 'w1', 1),
+                          [False])
+
+    def test_renew(self):
+        """ Test that only the owner renews a lease."""
+        self.leases.acquire(self.keys, ['a'], 'w1', 0)
+        expires = self._lease('a')[1]
+        time.sleep(0.01)
+        self.assertEquals(self.leases.renew(self.keys, ['a', 'b'], 'w1'),
+                          [True, False])
+        self.assertTrue(self._lease('a')[1] > expires)
+        self.assertEquals(self.leases.renew(self.keys, ['a'], 'w2'),
+                          [False])
+        self.leases.give_back(self.keys, 'a', 'w1')
+        self.assertEquals(self._lease('a'), (0, 0.0, 'w1'))
+
+    def test_complete(self):
+        """ Test that a task is completed once, by the owner of its
+            lease."""
+        self.leases.acquire(self.keys, ['a'], 'w1', 0)
+        self.assertFalse(self.leases.complete(self.keys, 'a', 'w2'))
+        self.assertTrue(self.leases.complete(self.keys, 'a', 'w1'))
+        self.assertFalse(self.leases.complete(self.keys, 'a', 'w1'))
+        self.assertIsNone(self._lease('a'))
+
+    def test_reclaim(self):
+        """ Test that an expired lease is taken back once, for the next
+            attempt only, until no attempt is left."""
+        self.leases.acquire(self.keys, ['a'], 'w1', 0)
+        lease = self.leases.load(self.keys)['a']
+        self.assertEquals(self.leases.reclaim(self.keys, 'a', lease, 3), 1)
+        # The master read the lease before it changed
+        self.assertEquals(self.leases.reclaim(self.keys, 'a', lease, 3), 0)
+        self.assertEquals(self._lease('a')[::2], (1, '-'))
+        # The lost worker comes back
+        self.assertEquals(self.leases.renew(self.keys, ['a'], 'w1'),
+                          [False])
+        self.assertFalse(self.leases.complete(self.keys, 'a', 'w1'))
+        self.assertEquals(self.leases.acquire(self.keys, ['a'], 'w2', 0),
+                          [False])
+        self.assertEquals(self.leases.acquire(self.keys, ['a'], 'w2', 1),
+                          [True])
+        self.assertEquals(self.leases.acquire(self.keys, ['a'], 'w3', 1),
+                          [False])
+        lease = self.leases.load(self.keys)['a']
+        self.assertEquals(self.leases.reclaim(self.keys, 'a', lease, 3), 2)
+        self.leases.acquire(self.keys, ['a'], 'w3', 2)
+        lease = self.leases.load(self.keys)['a']
+        self.assertEquals(self.leases.reclaim(self.keys, 'a', lease, 3), -1)
+        self.assertIsNone(self._lease('a'))
+
+    def test_requeue(self):
+        """ Test that a task lost in a host queue is sent again once,
+            when it is ready and was not started."""
+        self.leases.routed(self.keys, ['a', 'b'], 'node1')
+        self.assertFalse(self.leases.requeue(self.keys, 'a', ['dep']))
+        self.red.hset(self.keys.outputs, 'dep', '10 node1')
+        self.assertTrue(self.leases.requeue(self.keys, 'a', ['dep']))
+        self.assertEquals(self._lease('a')[::2], (1, '-'))
+        self.assertFalse(self.leases.requeue(self.keys, 'a', ['dep']))
+        # Started on its host before it was lost
+        self.leases.acquire(self.keys, ['b'], 'w1', 0)
+        self.assertFalse(self.leases.requeue(self.keys, 'b', []))
+        self.assertEquals(self.leases.load_routed(self.keys), {})
@@ -0,0 +1,76 @@
+"""
+module to test the backend running the tasks on this host
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from argparse import Namespace
+
+sys.path.append('../src')
+
+from localbackend import LocalBackend
+from makeparse import Parser
+from master import DepTree
+
+class LocalBackendTestCase(unittest.TestCase):
+    """
+    Test case for the local backend, on c -> a, b -> all.
+    """
+    def setUp(self):
+        """Setup the test case."""
+        self.directory = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.directory)
+
+    def tearDown(self):
+        """ Tear down the test case."""
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+
+    def _build(self, content, target, keep_going=False, needs=None):
+        """Builds ``target`` of the Makefile ``content``, the tasks
+           needing the resources of ``needs``, returns the exit
+           status."""
+        with tempfile.TemporaryFile() as makefile:
+            makefile.write(content)
+            makefile.seek(0)
+            parser = Parser()
+            parser.parse_makefile(makefile)
+        tree = DepTree(parser.get_task(target))
+        for node in tree.nodes:
+            node.priority = 0
+            node.needs = (needs or {}).get(node.target)
+        backend = LocalBackend(Namespace(jobs=2, keep_going=keep_going))
+        return backend.run(tree, list(tree.leaves), 0)
+
+    def test_build(self):
+        """ Test that every task is run after its dependencies."""
+        self.assertEquals(self._build('all: a b\n\tcat a b > all\n\n'
+                                      'a: c\n\tcp c a\n\n'
+                                      'b: c\n\tcp c b\n\n'
+                                      'c:\n\techo c > c\n\n', 'all'), 0)
+        with open('all') as stream:
+            self.assertEquals(stream.read(), 'c\nc\n')
+
+    def test_failure(self):
+        """ Test that the tasks depending on a failed one are not
+            run."""
+        self.assertEquals(self._build('all: a b\n\ttouch all\n\n'
+                                      'a:\n\texit 3\n\n'
+                                      'b:\n\ttouch b\n\n', 'all', True), 2)
+        self.assertTrue(os.path.exists('b'))
+        self.assertFalse(os.path.exists('all'))
+
+    def test_resources(self):
+        """ Test that the tasks sharing a single token are run one after
+            the other."""
+        lock = '\tmkdir lock && sleep 0.2 && rmdir lock && touch %s\n\n'
+        self.assertEquals(self._build('all: a b\n\ttouch all\n\n'
+                                      'a:\n' + lock % 'a' +
+                                      'b:\n' + lock % 'b', 'all',
+                                      needs={'a': {'license': 1},
+                                             'b': {'license': 1}}), 0)
+        self.assertTrue(os.path.exists('all'))
@@ -0,0 +1,44 @@
+"""
+module to test the choice of the host a task is sent to
+"""
+
+import sys
+import unittest
+
+sys.path.append('../src')
+
+from locality import choose_host, local_queue, parse_output
+
+class LocalityTestCase(unittest.TestCase):
+    """
+    Test case for the locality aware dispatch.
+    """
+    def test_parse_output(self):
+        """ Test that host names may contain spaces."""
+        self.assertEquals(parse_output('1024 node 1'), (1024, 'node 1'))
+
+    def test_most_bytes_wins(self):
+        """ Test that the host which built most bytes is chosen."""
+        outputs = ['10 node1', '10 node1', '15 node2', None]
+        self.assertEquals(choose_host(outputs, {}, 4), 'node1')
+
+    def test_ties_are_deterministic(self):
+        """ Test that ties are broken by host name."""
+        self.assertEquals(choose_host(['5 node2', '5 node1'], {}, 4),
+                          'node1')
+
+    def test_no_output_built(self):
+        """ Test that a task of source files goes to the shared queue."""
+        self.assertEquals(choose_host([None, None], {}, 4), None)
+
+    def test_busy_host(self):
+        """ Test that a busy host is skipped for the shared queue."""
+        self.assertEquals(choose_host(['5 node1'], {'node1': 4}, 4), None)
+        self.assertEquals(choose_host(['5 node1'], {'node1': 3}, 4),
+                          'node1')
+
+    def test_local_queue(self):
+        """ Test that the queue of a host is a priority queue."""
+        queue = local_queue('node1')
+        self.assertEquals(queue.name, 'dmake.node1')
+        self.assertEquals(queue.queue_arguments, {'x-max-priority': 10})
@@ -0,0 +1,87 @@
+"""
+module to test the Makefile parser on small Makefiles
+"""
+
+import pickle
+import sys
+import tempfile
+import unittest
+
+sys.path.append('../src')
+
+from makeparse import Parser, ParseError
+
+class MakeparseTestCase(unittest.TestCase):
+    """
+    Test case for the parsing rules of makeparse.Parser.
+    """
+    def _parse(self, content):
+        """Parses ``content`` as a Makefile, returns the parser."""
+        with tempfile.TemporaryFile() as makefile:
+            makefile.write(content)
+            makefile.seek(0)
+            parser = Parser()
+            parser.parse_makefile(makefile)
+        return parser
+
+    def test_comments_and_empty_lines(self):
+        """ Test that comments and empty lines are skipped."""
+        parser = self._parse('# all the lists\n\nlist.txt: list1.txt\n'
+                             '\tcp list1.txt list.txt\n\n'
+                             '# the first list\nlist1.txt:\n'
+                             '\t./premier 2 10 > list1.txt\n')
+        task = parser.get_task('')
+        self.assertEquals(task.target, 'list.txt')
+        self.assertEquals(task.command, 'cp list1.txt list.txt')
+        self.assertEquals(parser.get_task('list1.txt').command,
+                          './premier 2 10 > list1.txt')
+
+    def test_target_without_command(self):
+        """ Test that a target may have no command."""
+        parser = self._parse('part1: frame_1.png frame_2.png\n'
+                             'frame_1.png:\n\tblender -f 1\n')
+        task = parser.get_task('part1')
+        self.assertIsNone(task.command)
+        self.assertEquals([dep.target for dep in task.dependencies],
+                          ['frame_1.png', 'frame_2.png'])
+        self.assertTrue(task.dependencies[1].is_file_dependency())
+
+    def test_errors(self):
+        """ Test that malformed Makefiles are rejected."""
+        self.assertRaises(ParseError, self._parse, '')
+        self.assertRaises(ParseError, self._parse, '# only a comment\n')
+        self.assertRaises(ParseError, self._parse, 'premier premier.c\n')
+        self.assertRaises(ParseError, self._parse, '\tgcc premier.c\n')
+        self.assertRaises(ParseError, self._parse,
+                          'premier:\n\tgcc premier.c\n\tstrip premier\n')
+        self.assertRaises(ParseError, self._parse, ': premier.c\n')
+        self.assertRaises(ParseError, self._parse, 'a:\nb:\na:\n')
+        self.assertRaises(ParseError, self._parse, 'a: b\nb: a\n')
+
+    def test_long_cycle(self):
+        """ Test that cycles of any length are reported with their
+            path."""
+        try:
+            self._parse('all: a\na: b\n\tcp b a\nb: c premier.c\n'
+                        '\tcp c b\nc: a\n\tcp a c\n')
+        except ParseError as error:
+            self.assertTrue('a -> b -> c -> a' in str(error))
+        else:
+            self.fail('Cycle not detected')
+
+    def test_shared_dependencies_are_not_cycles(self):
+        """ Test that a diamond is not a cycle."""
+        parser = self._parse('list.txt: list1.txt list2.txt\n'
+                             'list1.txt: premier\nlist2.txt: premier\n'
+                             'premier: premier.c\n')
+        self.assertEquals(parser.get_task('').target, 'list.txt')
+
+    def test_tasks_are_pickled(self):
+        """ Test that the tasks survive pickling, as Celery sends them."""
+        parser = self._parse('list.txt: list1.txt\n\tcp list1.txt list.txt\n'
+                             'list1.txt: premier\n\t./premier > list1.txt\n')
+        for protocol in (0, 2):
+            task = pickle.loads(pickle.dumps(parser.get_task(''), protocol))
+            self.assertEquals(task.command, 'cp list1.txt list.txt')
+            self.assertEquals(task.dependencies[0].dependencies[0].target,
+                              'premier')
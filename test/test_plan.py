@@ -0,0 +1,56 @@
+"""
+module to test the compact build plans
+"""
+
+import sys
+import unittest
+
+sys.path.append('../src')
+
+from plan import BuildPlan, PlanError
+
+class PlanTestCase(unittest.TestCase):
+    """
+    Test case for the BuildPlan serialization.
+    """
+    def setUp(self):
+        """Setup the test case: a diamond shaped plan."""
+        self.plan = BuildPlan(['premier', 'list1.txt', 'list2.txt',
+                               'list.txt'],
+                              ['gcc premier.c -o premier -lm',
+                               './premier 2 10 > list1.txt',
+                               './premier 11 20 > list2.txt',
+                               'cat list1.txt list2.txt > list.txt'],
+                              [[], [0], [0], [1, 2]],
+                              [[1, 2], [3], [3], []],
+                              durations=[0.5, 0.01, 0.01, None])
+
+    def test_leaves(self):
+        """ Test that the tasks without dependencies are the leaves."""
+        self.assertEquals(self.plan.leaves, [0])
+        self.assertEquals(len(self.plan), 4)
+
+    def test_round_trip(self):
+        """ Test that a plan is unchanged by its serialization."""
+        plan = BuildPlan.loads(self.plan.dumps())
+        self.assertEquals(plan.targets, self.plan.targets)
+        self.assertEquals(plan.commands, self.plan.commands)
+        self.assertEquals(plan.dependencies, self.plan.dependencies)
+        self.assertEquals(plan.children, self.plan.children)
+        self.assertEquals(plan.durations, self.plan.durations)
+
+    def test_task_views(self):
+        """ Test that the tasks of a plan read like parsed tasks."""
+        task = self.plan.task(3)
+        self.assertEquals(task.target, 'list.txt')
+        self.assertEquals([dep.target for dep in task.dependencies],
+                          ['list1.txt', 'list2.txt'])
+        self.assertEquals([child.target for child
+                           in self.plan.task(0).children],
+                          ['list1.txt', 'list2.txt'])
+        self.assertEquals(task.duration, None)
+        self.assertFalse(task.is_file_dependency())
+
+    def test_malformed_plan(self):
+        """ Test that reading something else than a plan fails."""
+        self.assertRaises(PlanError, BuildPlan.loads, 'list.txt')
@@ -0,0 +1,68 @@
+"""
+module to test the plan cache of the master
+"""
+
+import shutil
+import sys
+import tempfile
+import unittest
+from StringIO import StringIO
+
+sys.path.append('../src')
+
+from makeparse import Parser
+from master import DepTree
+from plan import BuildPlan
+from plancache import PlanCache, plan_key
+
+class PlanCacheTestCase(unittest.TestCase):
+    """
+    Test case for the plan cache, on the premier Makefile.
+    """
+    def setUp(self):
+        """Setup the test case."""
+        self.directory = tempfile.mkdtemp()
+        self.cache = PlanCache(self.directory, max_plans=2)
+        parser = Parser()
+        with open('makefiles/premier/Makefile') as makefile:
+            parser.parse_makefile(makefile)
+        self.tree = DepTree(parser.get_task('list.txt'))
+
+    def tearDown(self):
+        """ Tear down the test case."""
+        shutil.rmtree(self.directory)
+
+    def test_plan_key(self):
+        """ Test that the key changes with the Makefile, the target and
+            the reduction."""
+        keys = set([plan_key(StringIO('a: b\n'), 'a', False),
+                    plan_key(StringIO('a: c\n'), 'a', False),
+                    plan_key(StringIO('a: b\n'), '', False),
+                    plan_key(StringIO('a: b\n'), 'a', True)])
+        self.assertEquals(len(keys), 4)
+
+    def test_round_trip(self):
+        """ Test that a stored tree is read back as it was built."""
+        self.assertIsNone(self.cache.load('key'))
+        self.cache.store('key', BuildPlan.from_tree(self.tree))
+        tree = DepTree.from_plan(self.cache.load('key'))
+        self.assertEquals(tree.nodes_num, self.tree.nodes_num)
+        self.assertEquals([node.target for node in tree.nodes],
+                          [node.target for node in self.tree.nodes])
+        self.assertEquals(set(leaf.target for leaf in tree.leaves),
+                          set(leaf.target for leaf in self.tree.leaves))
+        for node, expected in zip(tree.nodes, self.tree.nodes):
+            self.assertEquals(node.command, expected.command)
+            self.assertEquals(node.inputs, expected.inputs)
+            self.assertEquals(tree.in_degree[node],
+                              self.tree.in_degree[expected])
+            self.assertEquals([child.target for child in node.children],
+                              [child.target for child in expected.children])
+
+    def test_eviction(self):
+        """ Test that only the last plans used are kept."""
+        plan = BuildPlan.from_tree(self.tree)
+        for key in ('a', 'b', 'c'):
+            self.cache.store(key, plan)
+        self.assertEquals(len([key for key in ('a', 'b', 'c')
+                               if self.cache.load(key) is not None]), 2)
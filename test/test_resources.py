@@ -0,0 +1,86 @@
+"""
+module to test the placement of the tasks according to their resources
+"""
+
+import sys
+import unittest
+from StringIO import StringIO
+
+sys.path.append('../src')
+
+from resources import choose_worker, fits, live_capacities, parse_amount, \
+                      parse_resources, task_needs
+
+class ResourcesTestCase(unittest.TestCase):
+    """
+    Test case for the resources of the tasks and the hosts.
+    """
+    def test_parse_amount(self):
+        """ Test that the amounts are read with their unit."""
+        self.assertEquals(parse_amount('8'), 8)
+        self.assertEquals(parse_amount('2G'), 2 * 1024 ** 3)
+        self.assertEquals(parse_amount('512k'), 512 * 1024)
+        self.assertRaises(ValueError, parse_amount, '2 cores')
+
+    def test_parse_resources(self):
+        """ Test that the rules of a side file are read in order."""
+        rules = parse_resources(StringIO('# blender\n'
+                                         'frame_*.png: cores=8 memory=2G\n'
+                                         '\n'
+                                         'cube.mpg out.*: license=1 # ffmpeg\n'
+                                         'list*.txt:\n'))
+        self.assertEquals(rules, [(['frame_*.png'],
+                                   {'cores': 8, 'memory': 2 * 1024 ** 3}),
+                                  (['cube.mpg', 'out.*'], {'license': 1}),
+                                  (['list*.txt'], {})])
+
+    def test_task_needs(self):
+        """ Test that the first rule matching a target applies."""
+        rules = [(['list*.txt'], {}), (['*.txt'], {'cores': 2}),
+                 (['cube.mpg', 'out.*'], {'license': 1})]
+        self.assertEquals(task_needs('out.avi', rules), {'license': 1})
+        self.assertEquals(task_needs('a.txt', rules), {'cores': 2})
+        self.assertEquals(task_needs('list1.txt', rules), None)
+        self.assertEquals(task_needs('frame_1.png', rules), None)
+
+    def test_fits(self):
+        """ Test that the needs fit besides what is used."""
+        capacity = {'cores': 8, 'license': 1}
+        self.assertTrue(fits({'cores': 4}, capacity, {'cores': 4}))
+        self.assertFalse(fits({'cores': 4}, capacity, {'cores': 5}))
+        self.assertFalse(fits({'gpu': 1}, capacity, {}))
+
+    def test_choose_worker(self):
+        """ Test that the host left with the fewest free cores is
+            chosen, and an idle one if the needs fit nowhere now."""
+        capacities = {'a': {'cores': 8}, 'b': {'cores': 4},
+                      'c': {'cores': 16, 'license': 1}}
+        self.assertEquals(choose_worker({'cores': 4}, capacities, {}), 'b')
+        self.assertEquals(choose_worker({'cores': 4}, capacities,
+                                        {'b': {'cores': 2}}), 'a')
+        self.assertEquals(choose_worker({'license': 1}, capacities,
+                                        {'c': {'license': 1,
+                                               'cores': 4}}), 'c')
+        self.assertEquals(choose_worker({'cores': 8},
+                                        {'a': {'cores': 8},
+                                         'b': {'cores': 8}},
+                                        {'a': {'cores': 2},
+                                         'b': {'cores': 1}}), 'b')
+        self.assertEquals(choose_worker({'cores': 32}, capacities, {}),
+                          None)
+
+    def test_live_capacities(self):
+        """ Test that the hosts not seen for a while are left out."""
+        capacities = {'a': {'cores': 8}, 'b': {'cores': 4},
+                      'c': {'cores': 16}}
+        self.assertEquals(live_capacities(capacities,
+                                          {'a': 95.0, 'b': 20.0},
+                                          100.0, 60),
+                          {'a': {'cores': 8}})
+
+    def test_premier(self):
+        """ Test the side file of the premier Makefiles."""
+        with open('makefiles/premier/resources') as stream:
+            rules = parse_resources(stream)
+        self.assertEquals(task_needs('list.txt', rules), None)
+        self.assertEquals(task_needs('list3.txt', rules), {'cores': 1})
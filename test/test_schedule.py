@@ -0,0 +1,96 @@
+"""
+module to test the critical path weights and priorities
+"""
+
+import sys
+import unittest
+
+sys.path.append('../src')
+
+from makeparse import Task
+from schedule import compute_weights, compute_priorities, \
+                     estimate_durations, make_batches
+
+class ChainTree(object):
+    """
+    A tree with a chain of three tasks and a short task, all
+    dependencies of the root.
+    """
+    def __init__(self):
+        self.nodes = []
+        for node_id, target in enumerate(['a', 'b', 'c', 'short', 'root']):
+            task = Task(node_id)
+            task.target = target
+            self.nodes.append(task)
+        a, b, c, short, root = self.nodes
+        a.children = [b]
+        b.children = [c]
+        c.children = [root]
+        short.children = [root]
+
+class ScheduleTestCase(unittest.TestCase):
+    """
+    Test case for the critical path weights.
+    """
+    def setUp(self):
+        """Setup the test case."""
+        self.tree = ChainTree()
+
+    def test_weights_without_durations(self):
+        """ Test that unknown tasks last 1 second."""
+        weights = compute_weights(self.tree, {})
+        targets = dict((node.target, weight)
+                       for node, weight in weights.items())
+        self.assertEquals(targets, {'a': 4, 'b': 3, 'c': 2,
+                                    'short': 2, 'root': 1})
+
+    def test_weights_with_durations(self):
+        """ Test that the known durations are used, and their mean
+            for the unknown tasks."""
+        weights = compute_weights(self.tree, {'short': 10.0, 'root': 2.0})
+        targets = dict((node.target, weight)
+                       for node, weight in weights.items())
+        self.assertEquals(targets['short'], 12.0)
+        self.assertEquals(targets['a'], 20.0)
+
+    def test_critical_path_first(self):
+        """ Test that the head of the longest chain has the highest
+            priority, and equal weights equal priorities."""
+        priorities = compute_priorities(compute_weights(self.tree, {}))
+        targets = dict((node.target, priority)
+                       for node, priority in priorities.items())
+        self.assertEquals(max(priorities.values()), targets['a'])
+        self.assertEquals(targets['c'], targets['short'])
+        self.assertTrue(targets['root'] < targets['c'] < targets['a'])
+
+    def test_estimated_durations(self):
+        """ Test that unknown durations are the mean of the known ones."""
+        expected = estimate_durations(self.tree, {'a': 1.0, 'b': 3.0})
+        targets = dict((node.target, duration)
+                       for node, duration in expected.items())
+        self.assertEquals(targets, {'a': 1.0, 'b': 3.0, 'c': 2.0,
+                                    'short': 2.0, 'root': 2.0})
+
+class BatchTestCase(unittest.TestCase):
+    """
+    Test case for the batches of tiny tasks.
+    """
+    def test_long_tasks_alone(self):
+        """ Test that long and unknown tasks are sent alone."""
+        self.assertEquals(make_batches([1.0, None, 0.01, 0.01], 0.1, 8, 1.0),
+                          [[0], [1], [2, 3]])
+
+    def test_batch_size(self):
+        """ Test that a batch holds at most ``max_size`` tasks."""
+        self.assertEquals(make_batches([0.01] * 5, 0.1, 2, 1.0),
+                          [[0, 1], [2, 3], [4]])
+
+    def test_batch_time(self):
+        """ Test that a batch lasts at most ``max_time`` seconds."""
+        self.assertEquals(make_batches([0.1, 0.1, 0.1], 0.1, 8, 0.25),
+                          [[0, 1], [2]])
+
+    def test_disabled(self):
+        """ Test that batches of one task disable the batching."""
+        self.assertEquals(make_batches([0.01, 0.01], 0.1, 1, 1.0),
+                          [[0], [1]])
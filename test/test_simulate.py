@@ -0,0 +1,83 @@
+"""
+module to test the simulator of the builds
+"""
+
+import sys
+import tempfile
+import unittest
+from StringIO import StringIO
+
+sys.path.append('../src')
+
+from makeparse import Parser
+from master import DepTree
+from simulate import Simulator, read_durations, COUNT_TRIPS, DONE_TRIPS
+
+# all depends on a chain c -> b -> a and on four short tasks
+MAKEFILE = ('all: a s1 s2 s3 s4\n\ttouch all\n\n'
+            'a: b\n\ttouch a\n\n'
+            'b: c\n\ttouch b\n\n'
+            'c:\n\ttouch c\n\n'
+            's1:\n\ttouch s1\n\n'
+            's2:\n\ttouch s2\n\n'
+            's3:\n\ttouch s3\n\n'
+            's4:\n\ttouch s4\n\n')
+
+DURATIONS = {'all': 1.0, 'a': 2.0, 'b': 2.0, 'c': 2.0, 's1': 0.01,
+             's2': 0.01, 's3': 0.01, 's4': 0.01}
+
+class SimulatorTestCase(unittest.TestCase):
+    """
+    Test case for the simulator, on a chain and short tasks.
+    """
+    def _simulator(self, policy, dispatch=0.0, redis=0.0):
+        """Returns the simulator of MAKEFILE."""
+        with tempfile.TemporaryFile() as makefile:
+            makefile.write(MAKEFILE)
+            makefile.seek(0)
+            parser = Parser()
+            parser.parse_makefile(makefile)
+        return Simulator(DepTree(parser.get_task('all')), DURATIONS, policy,
+                         dispatch, redis)
+
+    def test_sequential(self):
+        """ Test that a single worker runs the commands one after the
+            other."""
+        for policy in ('fanout', 'batch', 'local', 'fifo'):
+            simulator = self._simulator(policy)
+            self.assertAlmostEqual(simulator.run(1), 7.04)
+            self.assertAlmostEqual(simulator.sequential_time(), 7.04)
+
+    def test_critical_path(self):
+        """ Test that enough workers only wait for the chain."""
+        self.assertAlmostEqual(self._simulator('fanout').run(8), 7.0)
+        # The short tasks run along the chain on a second worker
+        self.assertAlmostEqual(self._simulator('batch').run(2), 7.0)
+
+    def test_priorities(self):
+        """ Test that the chain starts first."""
+        self.assertAlmostEqual(self._simulator('fanout').run(2), 7.0)
+
+    def test_latencies(self):
+        """ Test that the messages and the round trips to Redis are
+            counted on the chain, and that keeping the child saves the
+            messages."""
+        dispatch = 0.1
+        redis = 0.01
+        step = dispatch + (COUNT_TRIPS + DONE_TRIPS) * redis
+        self.assertAlmostEqual(self._simulator('fanout', dispatch,
+                                               redis).run(8), 7.0 + 4 * step)
+        local = self._simulator('local', dispatch, redis).run(8)
+        self.assertAlmostEqual(local, 7.0 + 4 * step - 3 * dispatch)
+
+    def test_read_durations(self):
+        """ Test that the durations are read from the CSV of the traces,
+            without the cached, failed and unfinished tasks."""
+        durations = read_durations(StringIO(
+            'target,worker,queue_wait,counter_wait,command,dispatch,'
+            'exit_code,cached\n'
+            'a,w1,0.1,0.0,2.5,0.0,0,0\n'
+            'b,w1,0.1,0.0,0.0,0.0,0,1\n'
+            'c,w2,0.1,0.0,0.000000,0.0,2,0\n'
+            'd,w2,0.1,0.0,0.000000,0.0,,0\n'))
+        self.assertEquals(durations, {'a': 2.5})
@@ -0,0 +1,86 @@
+"""
+module to test the backup copies of the tasks lagging behind
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.append('../src')
+
+from makeparse import Task
+from speculation import is_waiting, publish_output, remove_output, \
+                        rewrite_command, stragglers, temporary_output
+
+class SpeculationTestCase(unittest.TestCase):
+    """
+    Test case for the backup copies of the tasks.
+    """
+    def setUp(self):
+        """Setup the test case."""
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """ Tear down the test case."""
+        shutil.rmtree(self.directory)
+
+    def test_temporary_output(self):
+        """ Test that each copy writes a file of its own next to the
+            target."""
+        output = temporary_output('frames/1.png', 'node1:42')
+        self.assertEquals(os.path.dirname(output), 'frames')
+        self.assertNotEquals(output,
+                             temporary_output('frames/1.png', 'node2:42'))
+
+    def test_rewrite_command(self):
+        """ Test that only the target itself is replaced."""
+        self.assertEquals(rewrite_command('cat list1.txt > list.txt; '
+                                          'cat list2.txt >> list.txt',
+                                          'list.txt', 'list.txt.tmp'),
+                          'cat list1.txt > list.txt.tmp; '
+                          'cat list2.txt >> list.txt.tmp')
+        self.assertEquals(rewrite_command('gcc premier.c -o premier -lm',
+                                          'premier', 'premier.tmp'),
+                          'gcc premier.c -o premier.tmp -lm')
+        self.assertIsNone(rewrite_command('./render.sh', 'frame.png',
+                                          'frame.png.tmp'))
+
+    def test_stragglers(self):
+        """ Test that only the tasks running far beyond their duration
+            are copied, the latest first."""
+        # 'e' was never built, it is missing from the history
+        started = {'a': 0.0, 'b': 80.0, 'c': 0.0, 'd': 0.0, 'e': 0.0}
+        durations = {'a': 20.0, 'b': 10.0, 'c': 1.0, 'd': None}
+        self.assertEquals(stragglers(started, durations, 100.0, 3, 30),
+                          ['c', 'a'])
+        self.assertEquals(stragglers(started, durations, 100.0, 20, 30),
+                          ['c'])
+
+    def test_is_waiting(self):
+        """ Test that the workers are idle once the ready tasks all
+            run, even if tasks are left: f1, f2 -> video."""
+        nodes = {}
+        for index, target in enumerate(('f1', 'f2', 'video')):
+            nodes[target] = Task(index)
+            nodes[target].target = target
+        nodes['video'].dependencies = [nodes['f1'], nodes['f2']]
+        self.assertTrue(is_waiting(nodes, set(), set(['f1'])))
+        self.assertFalse(is_waiting(nodes, set(['f1']), set(['f2'])))
+        self.assertTrue(is_waiting(nodes, set(['f1', 'f2']), set()))
+
+    def test_publish_output(self):
+        """ Test that the output of the copy which won becomes the
+            target, and the other one is removed."""
+        target = os.path.join(self.directory, 'list.txt')
+        winner = temporary_output(target, 'node1:1')
+        loser = temporary_output(target, 'node2:1')
+        for output in (winner, loser):
+            with open(output, 'w') as stream:
+                stream.write(output)
+        publish_output(winner, target)
+        remove_output(loser)
+        with open(target) as stream:
+            self.assertEquals(stream.read(), winner)
+        self.assertEquals(os.listdir(self.directory), ['list.txt'])
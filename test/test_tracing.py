@@ -0,0 +1,68 @@
+"""
+module to test the reports built from the traces of a build
+"""
+
+import json
+import sys
+import unittest
+from StringIO import StringIO
+
+sys.path.append('../src')
+
+from tracing import critical_path, worker_utilization, \
+                    scheduling_overhead, write_chrome_trace, write_csv
+
+def make_record(target, worker, pid, parent, times):
+    """Returns a record, ``times`` holds enqueued, started, counted,
+       finished and dispatched."""
+    record = {'target': target, 'worker': worker, 'pid': pid,
+              'parent': parent, 'exit_code': 0, 'cached': False}
+    for field, value in zip(('enqueued', 'started', 'counted', 'finished',
+                             'dispatched'), times):
+        record[field] = value
+    return record
+
+class TracingTestCase(unittest.TestCase):
+    """
+    Test case for the reports of the traces, on premier -> list1.txt,
+    list2.txt -> list.txt with two workers of one process.
+    """
+    def setUp(self):
+        """Setup the test case."""
+        self.records = [
+            make_record('premier', 'node1', 1, None, (0, 1, 1, 3, 3)),
+            make_record('list1.txt', 'node1', 1, 'premier', (3, 3, 3, 5, 5)),
+            make_record('list2.txt', 'node2', 2, 'premier', (3, 4, 4, 8, 8)),
+            make_record('list.txt', 'node2', 2, 'list2.txt',
+                        (8, 8, 8, 9, 10)),
+        ]
+
+    def test_critical_path(self):
+        """ Test that the critical path follows the last dependencies."""
+        self.assertEquals([record['target']
+                           for record in critical_path(self.records)],
+                          ['premier', 'list2.txt', 'list.txt'])
+
+    def test_worker_utilization(self):
+        """ Test the share of the build spent in commands per worker."""
+        utilization = worker_utilization(self.records)
+        self.assertAlmostEquals(utilization['node1'], 4.0 / 9)
+        self.assertAlmostEquals(utilization['node2'], 5.0 / 9)
+
+    def test_scheduling_overhead(self):
+        """ Test the mean overhead per task."""
+        overhead = scheduling_overhead(self.records)
+        self.assertAlmostEquals(overhead['queue_wait'], 2.0 / 4)
+        self.assertAlmostEquals(overhead['dispatch'], 1.0 / 4)
+        self.assertAlmostEquals(overhead['counter_wait'], 0)
+
+    def test_exports(self):
+        """ Test that the exports have an entry per task."""
+        stream = StringIO()
+        write_chrome_trace(self.records, stream)
+        events = json.loads(stream.getvalue())['traceEvents']
+        self.assertEquals(len([event for event in events
+                               if event['cat'] == 'command']), 4)
+        stream = StringIO()
+        write_csv(self.records, stream)
+        self.assertEquals(len(stream.getvalue().splitlines()), 5)
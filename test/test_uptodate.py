@@ -0,0 +1,130 @@
+"""
+module to test the detection of the targets to build again
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.append('../src')
+
+from argparse import Namespace
+from uptodate import HashChecker, MtimeChecker, file_hash
+
+class MtimeCheckerTestCase(unittest.TestCase):
+    """
+    Test case for the modification time comparisons.
+    """
+    def setUp(self):
+        """Setup the test case: premier.c older than premier."""
+        self.directory = tempfile.mkdtemp()
+        self.source = os.path.join(self.directory, 'premier.c')
+        self.target = os.path.join(self.directory, 'premier')
+        for path in (self.source, self.target):
+            with open(path, 'w') as stream:
+                stream.write(path)
+        os.utime(self.source, (1000, 1000))
+        os.utime(self.target, (2000, 2000))
+
+    def tearDown(self):
+        """ Tear down the test case."""
+        shutil.rmtree(self.directory)
+
+    def test_newer_target(self):
+        """ Test that a target newer than its inputs is up to date."""
+        checker = MtimeChecker()
+        self.assertTrue(checker.is_up_to_date(self.target, [self.source]))
+
+    def test_older_target(self):
+        """ Test that a target older than one of its inputs is not."""
+        os.utime(self.source, (3000, 3000))
+        checker = MtimeChecker()
+        self.assertFalse(checker.is_up_to_date(self.target, [self.source]))
+
+    def test_missing_files(self):
+        """ Test that a missing target or input is never up to date."""
+        checker = MtimeChecker()
+        missing = os.path.join(self.directory, 'missing')
+        self.assertFalse(checker.is_up_to_date(missing, [self.source]))
+        self.assertFalse(checker.is_up_to_date(self.target, [missing]))
+
+    def test_file_hash(self):
+        """ Test that the hash depends on the content only."""
+        self.assertEquals(file_hash(self.source), file_hash(self.source))
+        self.assertNotEquals(file_hash(self.source), file_hash(self.target))
+        self.assertIsNone(file_hash(os.path.join(self.directory, 'missing')))
+
+class Hashes(object):
+    """
+    The hashes of the Redis database a HashChecker needs, in memory.
+
+    Attributes:
+       hashes(dict(str, dict)): the fields of each hash.
+    """
+    def __init__(self):
+        self.hashes = {}
+
+    def hget(self, name, key):
+        """Returns the field ``key`` of the hash ``name``."""
+        return self.hashes.get(name, {}).get(key)
+
+    def hmset(self, name, mapping):
+        """Sets the fields of ``mapping`` in the hash ``name``."""
+        self.hashes.setdefault(name, {}).update(mapping)
+
+class HashCheckerTestCase(unittest.TestCase):
+    """
+    Test case for the content comparisons, on premier.c -> premier.
+    """
+    def setUp(self):
+        """Setup the test case: premier built from premier.c."""
+        self.directory = tempfile.mkdtemp()
+        self.source = os.path.join(self.directory, 'premier.c')
+        self.target = os.path.join(self.directory, 'premier')
+        for path in (self.source, self.target):
+            with open(path, 'w') as stream:
+                stream.write(path)
+        self.checker = HashChecker(Hashes())
+        self.tree = Namespace(nodes=[Namespace(target=self.target,
+                                               inputs=[self.source])])
+
+    def tearDown(self):
+        """ Tear down the test case."""
+        shutil.rmtree(self.directory)
+
+    def test_never_built(self):
+        """ Test that a target whose hashes were not recorded is built
+            again."""
+        self.assertFalse(self.checker.is_up_to_date(self.target,
+                                                    [self.source]))
+
+    def test_same_content(self):
+        """ Test that a target is up to date while its inputs keep their
+            content, even touched."""
+        self.checker.record(self.tree)
+        os.utime(self.source, (3000, 3000))
+        os.utime(self.target, (2000, 2000))
+        self.assertTrue(self.checker.is_up_to_date(self.target,
+                                                   [self.source]))
+
+    def test_changed_content(self):
+        """ Test that a target is not up to date once the content of an
+            input changed, even if it is older."""
+        self.checker.record(self.tree)
+        with open(self.source, 'w') as stream:
+            stream.write('int main() { return 0; }')
+        os.utime(self.source, (1000, 1000))
+        os.utime(self.target, (2000, 2000))
+        self.assertFalse(self.checker.is_up_to_date(self.target,
+                                                    [self.source]))
+
+    def test_changed_inputs(self):
+        """ Test that a target whose inputs changed, or which is
+            missing, is not up to date."""
+        self.checker.record(self.tree)
+        self.assertFalse(self.checker.is_up_to_date(self.target, []))
+        os.remove(self.target)
+        self.assertFalse(self.checker.is_up_to_date(self.target,
+                                                    [self.source]))
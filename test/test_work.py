@@ -0,0 +1,294 @@
+"""
+module to test how the workers run the tasks
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.append('../src')
+
+import work
+from buildkeys import BuildKeys
+from resources import NOT_READY, READY, WAIT
+from work import Job
+
+class Counters(object):
+    """
+    The dependency counters of the workers, in memory.
+
+    Attributes:
+       left(dict(str, int)): the dependencies left of each task.
+       done(list(str)): the targets counted as done.
+    """
+    def __init__(self):
+        self.left = {}
+        self.done = []
+
+    def dependencies_done(self, stopped, sem_names, dependencies_nums):
+        """Decrements the counters, as the Lua script does."""
+        ready = []
+        for sem_name, num in zip(sem_names, dependencies_nums):
+            self.left[sem_name] = self.left.get(sem_name, num or 1) - 1
+            ready.append(self.left[sem_name] == 0)
+        return ready
+
+    def task_done(self, task_num, end_time, end_list, now, targets,
+                  channel):
+        """Records the ``targets`` done."""
+        self.done.extend(targets)
+        return False
+
+class Leases(object):
+    """
+    The leases of the tasks, in memory.
+
+    Attributes:
+       owners(dict(str, str)): the owner of each lease.
+       completed(list(str)): the targets whose lease was dropped.
+    """
+    def __init__(self):
+        self.owners = {}
+        self.completed = []
+
+    def acquire(self, keys, targets, owner, attempt):
+        """Takes the leases nobody has."""
+        taken = []
+        for target in targets:
+            taken.append(target not in self.owners)
+            self.owners.setdefault(target, owner)
+        return taken
+
+    def renew(self, keys, targets, owner):
+        """Renews the leases of ``owner``."""
+        return [self.owners.get(target) == owner for target in targets]
+
+    def complete(self, keys, target, owner):
+        """Drops the lease of ``target`` if ``owner`` holds it."""
+        if self.owners.get(target) != owner:
+            return False
+        del self.owners[target]
+        self.completed.append(target)
+        return True
+
+class Resources(object):
+    """
+    The resources of the hosts, answering ``status`` to every task.
+
+    Attributes:
+       status(int): what ``admit`` returns.
+       released(list(dict)): the resources released.
+    """
+    def __init__(self, status):
+        self.status = status
+        self.released = []
+
+    def admit(self, keys, host, target, dependencies_num, needs, capacity):
+        """Returns ``status``."""
+        return self.status
+
+    def release(self, host, needs):
+        """Records the ``needs`` released."""
+        self.released.append(needs)
+
+class Recorder(object):
+    """
+    Records the calls of the methods of the other shared objects: the
+    locality, the traces, the events and the history.
+
+    Attributes:
+       calls(list(tuple)): the name and the arguments of each call.
+    """
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        def call(*args):
+            self.calls.append((name,) + args)
+            if name == 'output_done':
+                return 0, 0
+        return call
+
+    def called(self, name):
+        """Returns the arguments of the calls of ``name``."""
+        return [call[1:] for call in self.calls if call[0] == name]
+
+class WorkerTestCase(unittest.TestCase):
+    """
+    Base of the test cases of the tasks run by a worker, with the
+    shared objects in memory.
+    """
+    SHARED = ('COUNTERS', 'LEASES', 'RESOURCES', 'LOCALITIES', 'TRACER',
+              'EVENTS', 'HISTORY')
+
+    def setUp(self):
+        """Setup the test case: the shared objects are replaced."""
+        self.directory = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.directory)
+        self.shared = dict((name, getattr(work, name))
+                           for name in self.SHARED)
+        self.recorder = Recorder()
+        work.COUNTERS = self.counters = Counters()
+        work.LEASES = self.leases = Leases()
+        work.RESOURCES = self.resources = Resources(READY)
+        work.LOCALITIES = work.TRACER = work.EVENTS = work.HISTORY = \
+            self.recorder
+        self.keys = BuildKeys('build')
+        # The targets whose children were sent
+        self.dispatched = []
+
+    def tearDown(self):
+        """ Tear down the test case."""
+        for name, shared in self.shared.items():
+            setattr(work, name, shared)
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+
+    def job(self, target, command='true', deps_num=0, needs=None):
+        """Returns the job of ``target``, recording its dispatch."""
+        def dispatch():
+            self.dispatched.append(target)
+        return Job(target, deps_num, command, [], needs or {}, dispatch)
+
+class ExecuteTestCase(WorkerTestCase):
+    """
+    Test case for the tasks run by a worker.
+    """
+    def test_success(self):
+        """ Test that a task run launches its children and is done."""
+        reports = work._execute(self.keys, [self.job('a', 'touch a')], 0.0,
+                                None, None)
+        self.assertEquals([report['target'] for report in reports], ['a'])
+        self.assertEquals(reports[0]['exit_code'], 0)
+        self.assertTrue(os.path.isfile('a'))
+        self.assertEquals(self.dispatched, ['a'])
+        self.assertEquals(self.leases.completed, ['a'])
+        self.assertEquals(self.counters.done, ['a'])
+        self.assertEquals(len(self.recorder.called('record')), 1)
+        self.assertEquals(self.recorder.called('failed'), [])
+
+    def test_failure(self):
+        """ Test that a failed task is reported, the other tasks of the
+            message still run."""
+        self.assertRaises(RuntimeError, work._execute, self.keys,
+                          [self.job('a', 'false'), self.job('b')], 0.0,
+                          None, None)
+        self.assertEquals([failed[1] for failed
+                           in self.recorder.called('failed')], ['a'])
+        self.assertEquals(self.dispatched, ['b'])
+        self.assertEquals(self.counters.done, ['b'])
+        self.assertEquals(self.leases.completed, ['a', 'b'])
+
+    def test_dependency_done(self):
+        """ Test that a task only runs once its last dependency is done:
+            list1.txt, list2.txt -> list.txt."""
+        job = self.job('list.txt', deps_num=2)
+        self.assertEquals(work._execute(self.keys, [job], 0.0, 'list1.txt',
+                                        None), [])
+        self.assertEquals(self.dispatched, [])
+        self.assertEquals(self.leases.owners, {})
+        reports = work._execute(self.keys, [job], 0.0, 'list2.txt', None)
+        self.assertEquals([report['parent'] for report in reports],
+                          ['list2.txt'])
+        self.assertEquals(self.dispatched, ['list.txt'])
+        # Sent again for whatever reason, it is not run twice
+        self.assertEquals(work._execute(self.keys, [job], 0.0, 'list2.txt',
+                                        None), [])
+
+    def test_refused_admission(self):
+        """ Test that a task whose resources are busy waits, untouched,
+            and that the resources of a task run are released."""
+        needs = {'cores': 4}
+        self.resources.status = WAIT
+        self.assertRaises(work._Waiting, work._execute, self.keys,
+                          [self.job('frame1', needs=needs)], 0.0, None,
+                          None)
+        self.assertEquals(self.leases.owners, {})
+        self.resources.status = NOT_READY
+        self.assertEquals(work._execute(self.keys,
+                                        [self.job('frame1', needs=needs)],
+                                        0.0, None, None), [])
+        self.assertEquals(self.dispatched, [])
+        self.resources.status = READY
+        work._execute(self.keys, [self.job('frame1', needs=needs)], 0.0,
+                      None, None)
+        self.assertEquals(self.dispatched, ['frame1'])
+        self.assertEquals(self.resources.released, [needs])
+
+class LocalChildrenTestCase(WorkerTestCase):
+    """
+    Test case for the child a worker keeps and runs itself, on the chain
+    premier -> list1.txt -> list.txt.
+    """
+    def setUp(self):
+        """Setup the test case."""
+        WorkerTestCase.setUp(self)
+        self.local_children = work.LOCAL_CHILDREN
+        work.LOCAL_CHILDREN = True
+
+    def tearDown(self):
+        """ Tear down the test case."""
+        work.LOCAL_CHILDREN = self.local_children
+        WorkerTestCase.tearDown(self)
+
+    def chain(self, targets, deps_nums):
+        """Returns the job of the first of ``targets``, each one keeping
+           the next one, which has ``deps_nums`` dependencies."""
+        kept = None
+        for target, deps_num in reversed(zip(targets, deps_nums)):
+            kept = self.keeping(self.job(target, deps_num=deps_num), kept)
+        return kept
+
+    def keeping(self, job, kept):
+        """Returns ``job`` keeping the job ``kept``."""
+        def dispatch():
+            self.dispatched.append(job.target)
+            return kept
+        return job._replace(dispatch=dispatch)
+
+    def test_keep_child(self):
+        """ Test that the child with the highest priority is kept, unless
+            it needs resources."""
+        needs = {'list1.txt': {'cores': 4}}
+        self.assertEquals(work._keep_child(['list1.txt', 'list2.txt'],
+                                           lambda child: None),
+                          ('list1.txt', ['list2.txt']))
+        self.assertEquals(work._keep_child(['list1.txt', 'list2.txt'],
+                                           needs.get),
+                          (None, ['list1.txt', 'list2.txt']))
+        self.assertEquals(work._keep_child([], needs.get), (None, []))
+        work.LOCAL_CHILDREN = False
+        self.assertEquals(work._keep_child(['list1.txt', 'list2.txt'],
+                                           lambda child: None),
+                          (None, ['list1.txt', 'list2.txt']))
+
+    def test_kept_chain(self):
+        """ Test that the kept children run in the same process, one
+            after the other, and are counted as done together."""
+        job = self.chain(['premier', 'list1.txt', 'list.txt'], [0, 1, 1])
+        reports = work._execute(self.keys, [job], 0.0, None, None)
+        self.assertEquals([(report['target'], report['parent'])
+                           for report in reports],
+                          [('premier', None), ('list1.txt', 'premier'),
+                           ('list.txt', 'list1.txt')])
+        self.assertEquals(self.dispatched,
+                          ['premier', 'list1.txt', 'list.txt'])
+        self.assertEquals(self.counters.done,
+                          ['premier', 'list1.txt', 'list.txt'])
+        self.assertEquals(self.leases.owners, {})
+
+    def test_kept_child_not_ready(self):
+        """ Test that a kept child waiting for another dependency is left
+            to the worker finishing it."""
+        job = self.chain(['list1.txt', 'list.txt'], [1, 20])
+        reports = work._execute(self.keys, [job], 0.0, None, None)
+        self.assertEquals([report['target'] for report in reports],
+                          ['list1.txt'])
+        self.assertEquals(self.counters.left[self.keys.sem('list.txt')], 19)
+        self.assertEquals(self.leases.owners, {})
+
+if __name__ == '__main__':
+    unittest.main()